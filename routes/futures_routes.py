@@ -5,6 +5,8 @@ from typing import List, Optional, Dict, Any, Generator
 from services.futures_analyzer_service import FuturesAnalyzerService
 from services.futures_service_async import FuturesServiceAsync
 from utils.logger import get_logger
+from utils.metrics import instrument_stream
+from utils.disconnect import cancel_on_disconnect
 from web_server import verify_token  # 导入验证令牌函数
 import json
 
@@ -24,6 +26,8 @@ class AnalyzeFuturesRequest(BaseModel):
     api_key: Optional[str] = None
     api_model: Optional[str] = None
     api_timeout: Optional[str] = None
+    # 批量分析时是否在流末尾输出汇总排名消息
+    scan_summary: bool = False
 
 # 搜索期货代码
 @router.get("/search")
@@ -69,7 +73,7 @@ async def get_main_contracts(username: str = Depends(verify_token)):
 
 # AI分析期货
 @router.post("/analyze")
-async def analyze_futures(request: AnalyzeFuturesRequest, username: str = Depends(verify_token)):
+async def analyze_futures(request: AnalyzeFuturesRequest, http_request: Request, username: str = Depends(verify_token)):
     try:
         logger.info("开始处理期货分析请求")
         futures_codes = request.futures_codes
@@ -137,7 +141,8 @@ async def analyze_futures(request: AnalyzeFuturesRequest, username: str = Depend
                 async for chunk in custom_analyzer.scan_futures(
                     [code.strip() for code in futures_codes], 
                     min_score=0, 
-                    stream=True
+                    stream=True,
+                    summary=request.scan_summary
                 ):
                     chunk_count += 1
                     yield chunk + '\n'
@@ -145,7 +150,7 @@ async def analyze_futures(request: AnalyzeFuturesRequest, username: str = Depend
                 logger.info(f"批量流式分析期货完成，共发送 {chunk_count} 个块")
         
         logger.info("成功创建期货流式响应生成器")
-        return StreamingResponse(generate_stream(), media_type='application/json')
+        return StreamingResponse(instrument_stream(cancel_on_disconnect(http_request, generate_stream(), 'analyze'), 'analyze', 'FUTURES'), media_type='application/json')
             
     except Exception as e:
         error_msg = f"分析期货时出错: {str(e)}"
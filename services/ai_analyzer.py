@@ -1,17 +1,32 @@
 import pandas as pd
 import os
 import json
-import httpx
+import orjson
+import asyncio
 import re
+import time
 from typing import AsyncGenerator
 from dotenv import load_dotenv
 from utils.logger import get_logger
 from utils.api_utils import APIUtils
+from utils.http_client import get_http_client_pool
+from services.llm_result_cache import LLMResultCache, get_llm_result_cache
+from utils.metrics import get_metrics, STAGE_LLM_TTFT, STAGE_LLM_TOTAL
+from utils.sse_decoder import iter_chat_stream, EVENT_ERROR
 from datetime import datetime
 
 # 获取日志器
 logger = get_logger()
 
+
+class _ChatStreamState:
+    """一次流式请求中收到的内容片段和是否出错"""
+
+    def __init__(self):
+        self.fragments = []
+        self.failed = False
+
+
 class AIAnalyzer:
     """
     异步AI分析服务
@@ -37,6 +52,9 @@ class AIAnalyzer:
         self.API_MODEL = custom_api_model or os.getenv('API_MODEL', 'gpt-3.5-turbo')
         self.API_TIMEOUT = int(custom_api_timeout or os.getenv('API_TIMEOUT', 60))
         
+        # AI分析结果缓存（禁用时为None）
+        self.result_cache = get_llm_result_cache()
+        
         logger.debug(f"初始化AIAnalyzer: API_URL={self.API_URL}, API_MODEL={self.API_MODEL}, API_KEY={'已提供' if self.API_KEY else '未提供'}, API_TIMEOUT={self.API_TIMEOUT}")
     
     async def get_ai_analysis(self, df: pd.DataFrame, stock_code: str, market_type: str = 'A', stream: bool = False) -> AsyncGenerator[str, None]:
@@ -190,26 +208,45 @@ class AIAnalyzer:
             analysis_date = datetime.now().strftime("%Y-%m-%d")
             
             # 异步请求API
-            async with httpx.AsyncClient(timeout=self.API_TIMEOUT) as client:
-                # 记录请求
-                logger.debug(f"发送AI请求: URL={api_url}, MODEL={self.API_MODEL}, STREAM={stream}")
-                
-                # 先发送技术指标数据
-                yield json.dumps({
-                    "stock_code": stock_code,
-                    "status": "analyzing",
-                    "rsi": rsi,
-                    "price": price,
-                    "price_change": price_change,
-                    "ma_trend": ma_trend,
-                    "macd_signal": macd_signal_type,
-                    "volume_status": volume_status,
-                    "analysis_date": analysis_date
-                })
-                
-                if stream:
-                    # 流式响应处理
-                    async with client.stream("POST", api_url, json=request_data, headers=headers) as response:
+            client = get_http_client_pool().get_client(api_url)
+            
+            # 记录请求
+            logger.debug(f"发送AI请求: URL={api_url}, MODEL={self.API_MODEL}, STREAM={stream}")
+            
+            # 先发送技术指标数据
+            yield json.dumps({
+                "stock_code": stock_code,
+                "status": "analyzing",
+                "rsi": rsi,
+                "price": price,
+                "price_change": price_change,
+                "ma_trend": ma_trend,
+                "macd_signal": macd_signal_type,
+                "volume_status": volume_status,
+                "analysis_date": analysis_date
+            })
+            
+            # 查询分析结果缓存，命中时回放缓存内容而不再请求API
+            cache_key = LLMResultCache.make_key(api_url, self.API_MODEL, prompt)
+            cached_fragments = await self.result_cache.get(cache_key) if self.result_cache else None
+            if cached_fragments is not None:
+                logger.info(f"AI分析结果缓存命中: {stock_code}")
+            
+            if stream:
+                # 流式响应处理
+                if cached_fragments is not None:
+                    # 按原内容片段回放缓存结果，客户端收到的数据块与实时流一致
+                    buffer = ''.join(cached_fragments)
+                    for content in cached_fragments:
+                        yield json.dumps({
+                            "stock_code": stock_code,
+                            "ai_analysis_chunk": content,
+                            "status": "analyzing"
+                        })
+                else:
+                    llm_started = time.perf_counter()
+                    async with get_metrics().track_in_flight('llm_stream'), \
+                            client.stream("POST", api_url, json=request_data, headers=headers, timeout=self.API_TIMEOUT) as response:
                         if response.status_code != 200:
                             error_text = await response.aread()
                             error_data = json.loads(error_text)
@@ -221,123 +258,56 @@ class AIAnalyzer:
                                 "status": "error"
                             })
                             return
-                            
-                        # 处理流式响应
-                        buffer = ""
-                        collected_messages = []
-                        chunk_count = 0
                         
-                        async for chunk in response.aiter_text():
-                            if chunk:
-                                # 分割多行响应（处理某些API可能在一个chunk中返回多行）
-                                lines = chunk.strip().split('\n')
-                                for line in lines:
-                                    line = line.strip()
-                                    if not line:
-                                        continue
-                                        
-                                    # 处理以data:开头的行
-                                    if line.startswith("data: "):
-                                        line = line[6:]  # 去除"data: "前缀
-                                     
-                                    if line == "[DONE]":
-                                        logger.debug("收到流结束标记 [DONE]")
-                                        continue
-                                        
-                                    try:
-                                        # 处理特殊错误情况
-                                        if "error" in line.lower():
-                                            error_msg = line
-                                            try:
-                                                error_data = json.loads(line)
-                                                error_msg = error_data.get("error", line)
-                                            except:
-                                                pass
-                                            
-                                            logger.error(f"流式响应中收到错误: {error_msg}")
-                                            yield json.dumps({
-                                                "stock_code": stock_code,
-                                                "error": f"流式响应错误: {error_msg}",
-                                                "status": "error"
-                                            })
-                                            continue
-                                        
-                                        # 尝试解析JSON
-                                        chunk_data = json.loads(line)
-                                        
-                                        # 检查是否有finish_reason
-                                        finish_reason = chunk_data.get("choices", [{}])[0].get("finish_reason")
-                                        if finish_reason == "stop":
-                                            logger.debug("收到finish_reason=stop，流结束")
-                                            continue
-                                        
-                                        # 获取delta内容
-                                        delta = chunk_data.get("choices", [{}])[0].get("delta", {})
-                                        
-                                        # 检查delta是否为空对象
-                                        if not delta or delta == {}:
-                                            logger.debug("收到空的delta对象，跳过")
-                                            continue
-                                        
-                                        content = delta.get("content", "")
-                                        
-                                        if content:
-                                            chunk_count += 1
-                                            buffer += content
-                                            collected_messages.append(content)
-                                            
-                                            # 直接发送每个内容片段，不累积
-                                            yield json.dumps({
-                                                "stock_code": stock_code,
-                                                "ai_analysis_chunk": content,
-                                                "status": "analyzing"
-                                            })
-                                    except json.JSONDecodeError:
-                                        # 记录解析错误并尝试恢复
-                                        logger.error(f"JSON解析错误，块内容: {line}")
-                                        
-                                        # 如果是特定错误模式，处理它
-                                        if "streaming failed after retries" in line.lower():
-                                            logger.error("检测到流式传输失败")
-                                            yield json.dumps({
-                                                "stock_code": stock_code,
-                                                "error": "流式传输失败，请稍后重试",
-                                                "status": "error"
-                                            })
-                                            return
-                                        continue
-                        
-                        logger.info(f"AI流式处理完成，共收到 {chunk_count} 个内容片段，总长度: {len(buffer)}")
-                        
-                        # 如果buffer不为空且不以换行符结束，发送一个换行符
-                        if buffer and not buffer.endswith('\n'):
-                            logger.debug("发送换行符")
-                            yield json.dumps({
-                                "stock_code": stock_code,
-                                "ai_analysis_chunk": "\n",
-                                "status": "analyzing"
-                            })
-                        
-                        # 完整的分析内容
-                        full_content = buffer
-                        
-                        # 尝试从分析内容中提取投资建议
-                        recommendation = self._extract_recommendation(full_content)
-                        
-                        # 计算分析评分
-                        score = self._calculate_analysis_score(full_content, technical_summary)
-                        
-                        # 发送完成状态和评分、建议
-                        yield json.dumps({
-                            "stock_code": stock_code,
-                            "status": "completed",
-                            "score": score,
-                            "recommendation": recommendation
-                        })
-                else:
-                    # 非流式响应处理
-                    response = await client.post(api_url, json=request_data, headers=headers)
+                        # 处理流式响应
+                        state = _ChatStreamState()
+                        async for message in self._relay_chat_stream(response, 'stock_code', stock_code, market_type, llm_started, state):
+                            yield message
+                        stream_failed = state.failed
+                        collected_messages = state.fragments
+                        buffer = ''.join(collected_messages)
+                        chunk_count = len(collected_messages)
+                    
+                    get_metrics().observe_stage(STAGE_LLM_TOTAL, time.perf_counter() - llm_started, market_type)
+                    logger.info(f"AI流式处理完成，共收到 {chunk_count} 个内容片段，总长度: {len(buffer)}")
                     
+                    # 完整且无错误的结果写入缓存
+                    if self.result_cache and not stream_failed:
+                        await self.result_cache.put(cache_key, collected_messages)
+                
+                # 如果buffer不为空且不以换行符结束，发送一个换行符
+                if buffer and not buffer.endswith('\n'):
+                    logger.debug("发送换行符")
+                    yield json.dumps({
+                        "stock_code": stock_code,
+                        "ai_analysis_chunk": "\n",
+                        "status": "analyzing"
+                    })
+                
+                # 完整的分析内容
+                full_content = buffer
+                
+                # 尝试从分析内容中提取投资建议
+                recommendation = self._extract_recommendation(full_content)
+                
+                # 计算分析评分
+                score = self._calculate_analysis_score(full_content, technical_summary)
+                
+                # 发送完成状态和评分、建议
+                yield json.dumps({
+                    "stock_code": stock_code,
+                    "status": "completed",
+                    "score": score,
+                    "recommendation": recommendation
+                })
+            else:
+                # 非流式响应处理
+                if cached_fragments is not None:
+                    analysis_text = ''.join(cached_fragments)
+                else:
+                    with get_metrics().time_stage(STAGE_LLM_TOTAL, market_type):
+                        response = await client.post(api_url, json=request_data, headers=headers, timeout=self.API_TIMEOUT)
+                
                     if response.status_code != 200:
                         error_data = response.json()
                         error_message = error_data.get('error', {}).get('message', '未知错误')
@@ -348,32 +318,35 @@ class AIAnalyzer:
                             "status": "error"
                         })
                         return
-                    
+                
                     response_data = response.json()
                     analysis_text = response_data.get("choices", [{}])[0].get("message", {}).get("content", "")
                     
-                    # 尝试从分析内容中提取投资建议
-                    recommendation = self._extract_recommendation(analysis_text)
-                    
-                    # 计算分析评分
-                    score = self._calculate_analysis_score(analysis_text, technical_summary)
-                    
-                    # 发送完整的分析结果
-                    yield json.dumps({
-                        "stock_code": stock_code,
-                        "status": "completed",
-                        "analysis": analysis_text,
-                        "score": score,
-                        "recommendation": recommendation,
-                        "rsi": rsi,
-                        "price": price,
-                        "price_change": price_change,
-                        "ma_trend": ma_trend,
-                        "macd_signal": macd_signal_type,
-                        "volume_status": volume_status,
-                        "analysis_date": analysis_date
-                    })
-                    
+                    if self.result_cache and analysis_text:
+                        await self.result_cache.put(cache_key, [analysis_text])
+                
+                # 尝试从分析内容中提取投资建议
+                recommendation = self._extract_recommendation(analysis_text)
+                
+                # 计算分析评分
+                score = self._calculate_analysis_score(analysis_text, technical_summary)
+                
+                # 发送完整的分析结果
+                yield json.dumps({
+                    "stock_code": stock_code,
+                    "status": "completed",
+                    "analysis": analysis_text,
+                    "score": score,
+                    "recommendation": recommendation,
+                    "rsi": rsi,
+                    "price": price,
+                    "price_change": price_change,
+                    "ma_trend": ma_trend,
+                    "macd_signal": macd_signal_type,
+                    "volume_status": volume_status,
+                    "analysis_date": analysis_date
+                })
+                
         except Exception as e:
             logger.error(f"AI分析出错: {str(e)}", exc_info=True)
             yield json.dumps({
@@ -482,28 +455,47 @@ class AIAnalyzer:
             analysis_date = datetime.now().strftime("%Y-%m-%d")
             
             # 异步请求API
-            async with httpx.AsyncClient(timeout=self.API_TIMEOUT) as client:
-                # 记录请求
-                logger.debug(f"发送期货AI请求: URL={api_url}, MODEL={self.API_MODEL}, STREAM={stream}")
-                
-                # 先发送技术指标数据
-                yield json.dumps({
-                    "futures_code": futures_code,
-                    "status": "analyzing",
-                    "rsi": rsi,
-                    "price": price,
-                    "price_change": price_change,
-                    "ma_trend": ma_trend,
-                    "macd_signal": macd_signal_type,
-                    "volume_status": volume_status,
-                    "open_interest": open_interest,
-                    "open_interest_status": open_interest_status,
-                    "analysis_date": analysis_date
-                })
-                
-                if stream:
-                    # 流式响应处理
-                    async with client.stream("POST", api_url, json=request_data, headers=headers) as response:
+            client = get_http_client_pool().get_client(api_url)
+            
+            # 记录请求
+            logger.debug(f"发送期货AI请求: URL={api_url}, MODEL={self.API_MODEL}, STREAM={stream}")
+            
+            # 先发送技术指标数据
+            yield json.dumps({
+                "futures_code": futures_code,
+                "status": "analyzing",
+                "rsi": rsi,
+                "price": price,
+                "price_change": price_change,
+                "ma_trend": ma_trend,
+                "macd_signal": macd_signal_type,
+                "volume_status": volume_status,
+                "open_interest": open_interest,
+                "open_interest_status": open_interest_status,
+                "analysis_date": analysis_date
+            })
+            
+            # 查询分析结果缓存，命中时回放缓存内容而不再请求API
+            cache_key = LLMResultCache.make_key(api_url, self.API_MODEL, prompt)
+            cached_fragments = await self.result_cache.get(cache_key) if self.result_cache else None
+            if cached_fragments is not None:
+                logger.info(f"AI分析结果缓存命中: {futures_code}")
+            
+            if stream:
+                # 流式响应处理
+                if cached_fragments is not None:
+                    # 按原内容片段回放缓存结果，客户端收到的数据块与实时流一致
+                    buffer = ''.join(cached_fragments)
+                    for content in cached_fragments:
+                        yield json.dumps({
+                            "futures_code": futures_code,
+                            "ai_analysis_chunk": content,
+                            "status": "analyzing"
+                        })
+                else:
+                    llm_started = time.perf_counter()
+                    async with get_metrics().track_in_flight('llm_stream'), \
+                            client.stream("POST", api_url, json=request_data, headers=headers, timeout=self.API_TIMEOUT) as response:
                         if response.status_code != 200:
                             error_text = await response.aread()
                             error_data = json.loads(error_text)
@@ -515,123 +507,56 @@ class AIAnalyzer:
                                 "status": "error"
                             })
                             return
-                            
-                        # 处理流式响应
-                        buffer = ""
-                        collected_messages = []
-                        chunk_count = 0
-                        
-                        async for chunk in response.aiter_text():
-                            if chunk:
-                                # 分割多行响应（处理某些API可能在一个chunk中返回多行）
-                                lines = chunk.strip().split('\n')
-                                for line in lines:
-                                    line = line.strip()
-                                    if not line:
-                                        continue
-                                        
-                                    # 处理以data:开头的行
-                                    if line.startswith("data: "):
-                                        line = line[6:]  # 去除"data: "前缀
-                                     
-                                    if line == "[DONE]":
-                                        logger.debug("收到流结束标记 [DONE]")
-                                        continue
-                                        
-                                    try:
-                                        # 处理特殊错误情况
-                                        if "error" in line.lower():
-                                            error_msg = line
-                                            try:
-                                                error_data = json.loads(line)
-                                                error_msg = error_data.get("error", line)
-                                            except:
-                                                pass
-                                            
-                                            logger.error(f"流式响应中收到错误: {error_msg}")
-                                            yield json.dumps({
-                                                "futures_code": futures_code,
-                                                "error": f"流式响应错误: {error_msg}",
-                                                "status": "error"
-                                            })
-                                            continue
-                                        
-                                        # 尝试解析JSON
-                                        chunk_data = json.loads(line)
-                                        
-                                        # 检查是否有finish_reason
-                                        finish_reason = chunk_data.get("choices", [{}])[0].get("finish_reason")
-                                        if finish_reason == "stop":
-                                            logger.debug("收到finish_reason=stop，流结束")
-                                            continue
-                                        
-                                        # 获取delta内容
-                                        delta = chunk_data.get("choices", [{}])[0].get("delta", {})
-                                        
-                                        # 检查delta是否为空对象
-                                        if not delta or delta == {}:
-                                            logger.debug("收到空的delta对象，跳过")
-                                            continue
-                                        
-                                        content = delta.get("content", "")
-                                        
-                                        if content:
-                                            chunk_count += 1
-                                            buffer += content
-                                            collected_messages.append(content)
-                                            
-                                            # 直接发送每个内容片段，不累积
-                                            yield json.dumps({
-                                                "futures_code": futures_code,
-                                                "ai_analysis_chunk": content,
-                                                "status": "analyzing"
-                                            })
-                                    except json.JSONDecodeError:
-                                        # 记录解析错误并尝试恢复
-                                        logger.error(f"JSON解析错误，块内容: {line}")
-                                        
-                                        # 如果是特定错误模式，处理它
-                                        if "streaming failed after retries" in line.lower():
-                                            logger.error("检测到流式传输失败")
-                                            yield json.dumps({
-                                                "futures_code": futures_code,
-                                                "error": "流式传输失败，请稍后重试",
-                                                "status": "error"
-                                            })
-                                            return
-                                        continue
-                        
-                        logger.info(f"期货AI流式处理完成，共收到 {chunk_count} 个内容片段，总长度: {len(buffer)}")
                         
-                        # 如果buffer不为空且不以换行符结束，发送一个换行符
-                        if buffer and not buffer.endswith('\n'):
-                            logger.debug("发送换行符")
-                            yield json.dumps({
-                                "futures_code": futures_code,
-                                "ai_analysis_chunk": "\n",
-                                "status": "analyzing"
-                            })
-                        
-                        # 完整的分析内容
-                        full_content = buffer
-                        
-                        # 尝试从分析内容中提取投资建议
-                        recommendation = self._extract_futures_recommendation(full_content)
-                        
-                        # 计算分析评分
-                        score = self._calculate_futures_analysis_score(full_content, technical_summary)
-                        
-                        # 发送完成状态和评分、建议
-                        yield json.dumps({
-                            "futures_code": futures_code,
-                            "status": "completed",
-                            "score": score,
-                            "recommendation": recommendation
-                        })
-                else:
-                    # 非流式响应处理
-                    response = await client.post(api_url, json=request_data, headers=headers)
+                        # 处理流式响应
+                        state = _ChatStreamState()
+                        async for message in self._relay_chat_stream(response, 'futures_code', futures_code, 'FUTURES', llm_started, state):
+                            yield message
+                        stream_failed = state.failed
+                        collected_messages = state.fragments
+                        buffer = ''.join(collected_messages)
+                        chunk_count = len(collected_messages)
+                    
+                    get_metrics().observe_stage(STAGE_LLM_TOTAL, time.perf_counter() - llm_started, 'FUTURES')
+                    logger.info(f"期货AI流式处理完成，共收到 {chunk_count} 个内容片段，总长度: {len(buffer)}")
                     
+                    # 完整且无错误的结果写入缓存
+                    if self.result_cache and not stream_failed:
+                        await self.result_cache.put(cache_key, collected_messages)
+                
+                # 如果buffer不为空且不以换行符结束，发送一个换行符
+                if buffer and not buffer.endswith('\n'):
+                    logger.debug("发送换行符")
+                    yield json.dumps({
+                        "futures_code": futures_code,
+                        "ai_analysis_chunk": "\n",
+                        "status": "analyzing"
+                    })
+                
+                # 完整的分析内容
+                full_content = buffer
+                
+                # 尝试从分析内容中提取投资建议
+                recommendation = self._extract_futures_recommendation(full_content)
+                
+                # 计算分析评分
+                score = self._calculate_futures_analysis_score(full_content, technical_summary)
+                
+                # 发送完成状态和评分、建议
+                yield json.dumps({
+                    "futures_code": futures_code,
+                    "status": "completed",
+                    "score": score,
+                    "recommendation": recommendation
+                })
+            else:
+                # 非流式响应处理
+                if cached_fragments is not None:
+                    analysis_text = ''.join(cached_fragments)
+                else:
+                    with get_metrics().time_stage(STAGE_LLM_TOTAL, 'FUTURES'):
+                        response = await client.post(api_url, json=request_data, headers=headers, timeout=self.API_TIMEOUT)
+                
                     if response.status_code != 200:
                         error_data = response.json()
                         error_message = error_data.get('error', {}).get('message', '未知错误')
@@ -642,34 +567,37 @@ class AIAnalyzer:
                             "status": "error"
                         })
                         return
-                    
+                
                     response_data = response.json()
                     analysis_text = response_data.get("choices", [{}])[0].get("message", {}).get("content", "")
                     
-                    # 尝试从分析内容中提取投资建议
-                    recommendation = self._extract_futures_recommendation(analysis_text)
-                    
-                    # 计算分析评分
-                    score = self._calculate_futures_analysis_score(analysis_text, technical_summary)
-                    
-                    # 发送完整的分析结果
-                    yield json.dumps({
-                        "futures_code": futures_code,
-                        "status": "completed",
-                        "analysis": analysis_text,
-                        "score": score,
-                        "recommendation": recommendation,
-                        "rsi": rsi,
-                        "price": price,
-                        "price_change": price_change,
-                        "ma_trend": ma_trend,
-                        "macd_signal": macd_signal_type,
-                        "volume_status": volume_status,
-                        "open_interest": open_interest,
-                        "open_interest_status": open_interest_status,
-                        "analysis_date": analysis_date
-                    })
-                    
+                    if self.result_cache and analysis_text:
+                        await self.result_cache.put(cache_key, [analysis_text])
+                
+                # 尝试从分析内容中提取投资建议
+                recommendation = self._extract_futures_recommendation(analysis_text)
+                
+                # 计算分析评分
+                score = self._calculate_futures_analysis_score(analysis_text, technical_summary)
+                
+                # 发送完整的分析结果
+                yield json.dumps({
+                    "futures_code": futures_code,
+                    "status": "completed",
+                    "analysis": analysis_text,
+                    "score": score,
+                    "recommendation": recommendation,
+                    "rsi": rsi,
+                    "price": price,
+                    "price_change": price_change,
+                    "ma_trend": ma_trend,
+                    "macd_signal": macd_signal_type,
+                    "volume_status": volume_status,
+                    "open_interest": open_interest,
+                    "open_interest_status": open_interest_status,
+                    "analysis_date": analysis_date
+                })
+                
         except Exception as e:
             logger.error(f"期货AI分析出错: {str(e)}", exc_info=True)
             yield json.dumps({
@@ -678,6 +606,48 @@ class AIAnalyzer:
                 "status": "error"
             })
     
+    async def _relay_chat_stream(self, response, code_field: str, code: str, market: str, started: float,
+                                 state: _ChatStreamState) -> AsyncGenerator[str, None]:
+        """
+        把LLM的SSE流转换为发给客户端的NDJSON消息，股票和期货分析共用
+        
+        Args:
+            response: httpx流式响应
+            code_field: 消息中代码的字段名
+            code: 股票或期货代码
+            market: 市场类型，用于耗时指标
+            started: 发起请求的时间（perf_counter），用于统计首个内容块的耗时
+            state: 记录收到的内容片段和错误状态
+            
+        Returns:
+            异步生成器，产出NDJSON消息
+        """
+        # 每个内容片段只序列化内容本身，消息的其余部分预先拼好
+        prefix = f'{{"{code_field}": {json.dumps(code)}, "ai_analysis_chunk": '
+        
+        try:
+            async for kind, text in iter_chat_stream(response.aiter_bytes()):
+                if kind == EVENT_ERROR:
+                    logger.error(f"流式响应中收到错误: {text}")
+                    state.failed = True
+                    yield json.dumps({
+                        code_field: code,
+                        "error": f"流式响应错误: {text}",
+                        "status": "error"
+                    })
+                    continue
+                
+                if not state.fragments:
+                    get_metrics().observe_stage(STAGE_LLM_TTFT, time.perf_counter() - started, market)
+                state.fragments.append(text)
+                yield prefix + orjson.dumps(text).decode() + ', "status": "analyzing"}'
+        except (asyncio.CancelledError, GeneratorExit):
+            # 客户端断开导致流式请求被中断，退出后httpx会关闭连接，LLM不再继续生成
+            state.failed = True
+            get_metrics().count_cancelled('llm_stream')
+            logger.info(f"AI流式分析已取消: {code}, 已收到 {len(state.fragments)} 个内容片段")
+            raise
+    
     def _extract_recommendation(self, analysis_text: str) -> str:
         """从分析文本中提取投资建议"""
         # 查找投资建议部分
@@ -0,0 +1,569 @@
+import os
+import re
+import time
+import zlib
+import random
+import threading
+import importlib.util
+from functools import lru_cache
+import numpy as np
+import pandas as pd
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional
+from utils.logger import get_logger
+
+# 获取日志器
+logger = get_logger()
+
+# 项目根目录
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 数据源接口：各服务使用的akshare函数
+DATA_SOURCE_FUNCTIONS = (
+    'stock_zh_a_hist',
+    'stock_hk_daily',
+    'stock_us_daily',
+    'fund_etf_hist_sina',
+    'fund_etf_hist_em',
+    'fund_lof_hist_em',
+    'futures_main_sina',
+    'futures_zh_daily',
+    'stock_zh_a_spot_em',
+    'stock_hk_spot_em',
+    'fund_etf_spot_em',
+    'fund_lof_spot_em',
+    'stock_us_spot_em',
+    'futures_zh_spot',
+    'tool_trade_date_hist_sina',
+)
+
+# 回放文件中需要按字符串读取的代码列（CSV会丢失前导0）
+CODE_COLUMNS = ('代码', '股票代码', 'symbol')
+
+# 合成行情的起点，同一代码在任意日期的价格与请求的日期范围无关
+SYNTHETIC_EPOCH = pd.Timestamp('2015-01-01')
+
+# 合成期货合约：交易所 -> [(品种代码, 名称)]
+SYNTHETIC_FUTURES = {
+    'shfe': [('cu', '沪铜'), ('al', '沪铝'), ('au', '沪金'), ('ag', '沪银'), ('rb', '螺纹钢'), ('ru', '橡胶')],
+    'dce': [('m', '豆粕'), ('y', '豆油'), ('p', '棕榈油'), ('i', '铁矿石'), ('j', '焦炭'), ('pp', '聚丙烯')],
+    'czce': [('SR', '白糖'), ('CF', '棉花'), ('TA', 'PTA'), ('MA', '甲醇'), ('FG', '玻璃'), ('AP', '苹果')],
+    'cffex': [('IF', '沪深300股指'), ('IC', '中证500股指'), ('IH', '上证50股指'), ('T', '十年期国债')],
+}
+
+
+def _replay_key(args: tuple, kwargs: Dict[str, Any]) -> str:
+    """由调用参数得到回放文件名：优先使用symbol参数，无参数的行情列表为_default"""
+    key = kwargs.get('symbol', args[0] if args else None)
+    if key is None or key == '':
+        return '_default'
+    return re.sub(r'[^0-9A-Za-z._-]', '_', str(key))
+
+
+@lru_cache(maxsize=8)
+def _business_days(end: pd.Timestamp) -> pd.DatetimeIndex:
+    """SYNTHETIC_EPOCH到end之间的工作日（合成每个代码都要用到，按结束日期缓存）"""
+    days = pd.date_range(SYNTHETIC_EPOCH, end, freq='D')
+    return days[days.dayofweek < 5]
+
+
+def _to_timestamp(value: Optional[str], default: pd.Timestamp) -> pd.Timestamp:
+    """解析YYYYMMDD或YYYY-MM-DD格式的日期"""
+    if not value:
+        return default
+    value = str(value).replace('-', '')
+    return pd.to_datetime(value, format='%Y%m%d')
+
+
+class DataSource:
+    """
+    行情数据源接口
+    提供与akshare同名同参的函数（见DATA_SOURCE_FUNCTIONS），返回与akshare相同结构的DataFrame，
+    各数据提供者通过上游网关调用，不关心数据来自网络还是本地回放
+    """
+
+    name = 'base'
+
+    def stats(self) -> Dict[str, Any]:
+        """获取数据源统计信息"""
+        return {'name': self.name}
+
+
+class AkshareDataSource(DataSource):
+    """通过akshare请求真实上游"""
+
+    name = 'akshare'
+
+    def __getattr__(self, func_name: str) -> Callable[..., Any]:
+        if func_name not in DATA_SOURCE_FUNCTIONS:
+            raise AttributeError(func_name)
+        import akshare as ak
+        return getattr(ak, func_name)
+
+
+class ReplayDataSource(DataSource):
+    """
+    离线回放数据源
+    从本地目录 <函数名>/<代码>.parquet|csv 读取录制的行情，历史K线按请求的日期范围截取；
+    没有录制文件时可生成确定性的合成数据。支持注入人为延迟和随机故障，用于在无网络的机器上压测完整流程
+    """
+
+    name = 'replay'
+
+    def __init__(self, base_dir: Optional[str] = None, latency_ms: Optional[float] = None,
+                 jitter_ms: Optional[float] = None, failure_rate: Optional[float] = None,
+                 synthetic: Optional[bool] = None, universe_size: Optional[int] = None,
+                 seed: Optional[int] = None):
+        """
+        初始化回放数据源
+
+        Args:
+            base_dir: 回放文件目录，默认为环境变量REPLAY_DIR或项目下的data/replay
+            latency_ms: 每次调用的人为延迟（毫秒），默认为环境变量REPLAY_LATENCY_MS（默认0）
+            jitter_ms: 延迟的随机抖动幅度（毫秒），默认为环境变量REPLAY_JITTER_MS（默认0）
+            failure_rate: 每次调用抛出ConnectionError的概率，默认为环境变量REPLAY_FAILURE_RATE（默认0）
+            synthetic: 没有录制文件时是否生成合成数据，默认为环境变量REPLAY_SYNTHETIC（默认true）
+            universe_size: 合成行情列表的代码数，默认为环境变量REPLAY_UNIVERSE_SIZE（默认200）
+            seed: 合成数据和故障注入的随机种子，默认为环境变量REPLAY_SEED（默认0）
+        """
+        self.base_dir = base_dir or os.getenv('REPLAY_DIR') or os.path.join(PROJECT_ROOT, 'data', 'replay')
+        if latency_ms is None:
+            latency_ms = float(os.getenv('REPLAY_LATENCY_MS') or 0)
+        if jitter_ms is None:
+            jitter_ms = float(os.getenv('REPLAY_JITTER_MS') or 0)
+        if failure_rate is None:
+            failure_rate = float(os.getenv('REPLAY_FAILURE_RATE') or 0)
+        if synthetic is None:
+            synthetic = os.getenv('REPLAY_SYNTHETIC', 'true').lower() == 'true'
+        if universe_size is None:
+            universe_size = int(os.getenv('REPLAY_UNIVERSE_SIZE') or 200)
+        if seed is None:
+            seed = int(os.getenv('REPLAY_SEED') or 0)
+
+        self.latency = latency_ms / 1000
+        self.jitter = jitter_ms / 1000
+        self.failure_rate = failure_rate
+        self.synthetic = synthetic
+        self.universe_size = universe_size
+        self.seed = seed
+
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        # 已读取的回放文件：路径 -> (修改时间, DataFrame)
+        self._frames: Dict[str, tuple] = {}
+
+        # 统计计数
+        self.calls = 0
+        self.file_hits = 0
+        self.synthetic_hits = 0
+        self.injected_failures = 0
+
+        logger.info(f"使用离线回放数据源: 目录={self.base_dir}, 延迟={latency_ms}±{jitter_ms}ms, "
+                    f"故障率={failure_rate}, 合成数据={'开启' if synthetic else '关闭'}")
+
+    # ---------- 调用入口 ----------
+
+    def _serve(self, func_name: str, args: tuple, kwargs: Dict[str, Any],
+               synthesize: Callable[[], pd.DataFrame],
+               date_column: Optional[str] = None) -> pd.DataFrame:
+        """
+        处理一次回放调用：注入延迟和故障，读取录制文件或生成合成数据
+
+        Args:
+            func_name: akshare函数名
+            args, kwargs: 调用参数
+            synthesize: 没有录制文件时生成合成数据的函数
+            date_column: 历史K线的日期列，录制数据按start_date/end_date截取
+
+        Returns:
+            与akshare结构相同的DataFrame（副本，调用方可以修改）
+        """
+        with self._lock:
+            self.calls += 1
+            delay = self.latency + (self._random.uniform(-self.jitter, self.jitter) if self.jitter else 0.0)
+            fail = self.failure_rate > 0 and self._random.random() < self.failure_rate
+        if delay > 0:
+            time.sleep(delay)
+        if fail:
+            with self._lock:
+                self.injected_failures += 1
+            raise ConnectionError(f"回放数据源注入的故障: {func_name}")
+
+        key = _replay_key(args, kwargs)
+        df = self._read(func_name, key)
+        if df is not None:
+            with self._lock:
+                self.file_hits += 1
+            if date_column is not None and date_column in df.columns:
+                dates = pd.to_datetime(df[date_column])
+                start = _to_timestamp(kwargs.get('start_date'), dates.min())
+                end = _to_timestamp(kwargs.get('end_date'), dates.max())
+                df = df[(dates >= start) & (dates <= end)]
+            return df.reset_index(drop=True)
+
+        if not self.synthetic:
+            raise FileNotFoundError(f"没有回放数据: {func_name}/{key}")
+        with self._lock:
+            self.synthetic_hits += 1
+        return synthesize()
+
+    def _read(self, func_name: str, key: str) -> Optional[pd.DataFrame]:
+        """读取录制文件（按修改时间缓存），不存在时返回None"""
+        for ext in ('parquet', 'csv'):
+            path = os.path.join(self.base_dir, func_name, f"{key}.{ext}")
+            if not os.path.exists(path):
+                continue
+
+            mtime = os.path.getmtime(path)
+            # 网关的多个线程会同时调用，查找、解析和写入缓存都在锁内完成，同一文件只解析一次
+            with self._lock:
+                cached = self._frames.get(path)
+                if cached is None or cached[0] != mtime:
+                    if ext == 'parquet':
+                        df = pd.read_parquet(path)
+                    else:
+                        df = pd.read_csv(path, dtype={col: str for col in CODE_COLUMNS})
+                    cached = (mtime, df)
+                    self._frames[path] = cached
+            return cached[1].copy()
+        return None
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'name': self.name,
+                'base_dir': self.base_dir,
+                'calls': self.calls,
+                'file_hits': self.file_hits,
+                'synthetic_hits': self.synthetic_hits,
+                'injected_failures': self.injected_failures
+            }
+
+    # ---------- 合成数据 ----------
+
+    def _rng(self, symbol: str) -> np.random.Generator:
+        """每个代码独立且确定的随机数发生器"""
+        return np.random.default_rng([zlib.crc32(str(symbol).encode()), self.seed])
+
+    def _bars(self, symbol: str, start_date: Optional[str] = None, end_date: Optional[str] = None,
+              default_days: int = 365) -> pd.DataFrame:
+        """
+        生成合成日K线（工作日，几何随机游走）
+        价格序列从SYNTHETIC_EPOCH开始生成后再截取，同一代码同一日期的数据总是相同
+
+        Returns:
+            列为date/open/high/low/close/volume/amount的DataFrame
+        """
+        today = pd.Timestamp(datetime.now().date())
+        end = min(_to_timestamp(end_date, today), today)
+        start = _to_timestamp(start_date, end - timedelta(days=default_days))
+        dates = _business_days(end)
+
+        rng = self._rng(symbol)
+        n = len(dates)
+        base = 5 + rng.random() * 95
+        returns = rng.normal(0.0001, 0.015, n)
+        close = base * np.exp(np.cumsum(returns))
+        open_ = close * np.exp(rng.normal(0, 0.005, n))
+        high = np.maximum(open_, close) * (1 + np.abs(rng.normal(0, 0.01, n)))
+        low = np.minimum(open_, close) * (1 - np.abs(rng.normal(0, 0.01, n)))
+        volume = np.round(rng.lognormal(13, 0.5, n))
+
+        df = pd.DataFrame({
+            'date': dates,
+            'open': open_.round(2),
+            'high': high.round(2),
+            'low': low.round(2),
+            'close': close.round(2),
+            'volume': volume,
+            'amount': (volume * close).round(2)
+        })
+        return df[df['date'] >= start].reset_index(drop=True)
+
+    def _universe(self, market: str) -> List[str]:
+        """合成行情列表的代码"""
+        if market == 'A':
+            prefixes = (600000, 1, 300001, 688001)
+            return [f"{prefixes[i % 4] + i // 4:06d}" for i in range(self.universe_size)]
+        if market == 'ETF':
+            return [f"{510000 + i:06d}" for i in range(self.universe_size)]
+        if market == 'LOF':
+            return [f"{160000 + i:06d}" for i in range(self.universe_size)]
+        if market == 'HK':
+            return [f"{i + 1:05d}" for i in range(self.universe_size)]
+        return [f"105.SYN{i:04d}" for i in range(self.universe_size)]
+
+    def _quotes(self, codes: List[str]) -> pd.DataFrame:
+        """由各代码合成K线的最后两根得到行情快照的公共字段"""
+        rows = []
+        for code in codes:
+            bars = self._bars(code, default_days=10)
+            last, prev = bars.iloc[-1], bars.iloc[-2]
+            change = last['close'] - prev['close']
+            rows.append({
+                '最新价': last['close'],
+                '涨跌额': round(change, 2),
+                '涨跌幅': round(change / prev['close'] * 100, 2),
+                '成交量': last['volume'],
+                '成交额': last['amount'],
+                '振幅': round((last['high'] - last['low']) / prev['close'] * 100, 2),
+                '最高': last['high'],
+                '最低': last['low'],
+                '今开': last['open'],
+                '昨收': prev['close'],
+                '换手率': round(self._rng(code).random() * 5, 2),
+                '总市值': round(last['close'] * 1e9, 2),
+                '流通市值': round(last['close'] * 8e8, 2)
+            })
+        return pd.DataFrame(rows)
+
+    def _spot_list(self, market: str, name_prefix: str) -> pd.DataFrame:
+        codes = self._universe(market)
+        quotes = self._quotes(codes)
+        quotes.insert(0, '序号', range(1, len(codes) + 1))
+        quotes.insert(1, '代码', codes)
+        quotes.insert(2, '名称', [f"{name_prefix}{i:04d}" for i in range(len(codes))])
+        return quotes
+
+    # ---------- 历史K线 ----------
+
+    def stock_zh_a_hist(self, *args: Any, **kwargs: Any) -> pd.DataFrame:
+        def synthesize():
+            symbol = kwargs.get('symbol', args[0] if args else '')
+            bars = self._bars(symbol, kwargs.get('start_date'), kwargs.get('end_date'))
+            prev_close = bars['close'].shift(1).fillna(bars['open'])
+            return pd.DataFrame({
+                '日期': bars['date'].dt.strftime('%Y-%m-%d'),
+                '股票代码': symbol,
+                '开盘': bars['open'],
+                '收盘': bars['close'],
+                '最高': bars['high'],
+                '最低': bars['low'],
+                '成交量': bars['volume'],
+                '成交额': bars['amount'],
+                '振幅': ((bars['high'] - bars['low']) / prev_close * 100).round(2),
+                '涨跌幅': ((bars['close'] - prev_close) / prev_close * 100).round(2),
+                '涨跌额': (bars['close'] - prev_close).round(2),
+                '换手率': self._rng(symbol).random(len(bars)).round(2)
+            })
+        return self._serve('stock_zh_a_hist', args, kwargs, synthesize, date_column='日期')
+
+    def _daily(self, func_name: str, args: tuple, kwargs: Dict[str, Any]) -> pd.DataFrame:
+        """港股、美股日K线：akshare返回全部历史，不截取日期"""
+        def synthesize():
+            symbol = kwargs.get('symbol', args[0] if args else '')
+            bars = self._bars(symbol, default_days=3 * 365)
+            return bars[['date', 'open', 'high', 'low', 'close', 'volume']]
+        return self._serve(func_name, args, kwargs, synthesize)
+
+    def stock_hk_daily(self, *args: Any, **kwargs: Any) -> pd.DataFrame:
+        return self._daily('stock_hk_daily', args, kwargs)
+
+    def stock_us_daily(self, *args: Any, **kwargs: Any) -> pd.DataFrame:
+        return self._daily('stock_us_daily', args, kwargs)
+
+    def fund_etf_hist_sina(self, *args: Any, **kwargs: Any) -> pd.DataFrame:
+        def synthesize():
+            symbol = kwargs.get('symbol', args[0] if args else '')
+            bars = self._bars(symbol, kwargs.get('start_date'), kwargs.get('end_date'))
+            return bars[['date', 'open', 'high', 'low', 'close', 'volume', 'amount']]
+        return self._serve('fund_etf_hist_sina', args, kwargs, synthesize, date_column='date')
+
+    def _fund_hist_em(self, func_name: str, args: tuple, kwargs: Dict[str, Any]) -> pd.DataFrame:
+        """东方财富ETF/LOF历史行情：成交量单位为手"""
+        def synthesize():
+            symbol = kwargs.get('symbol', args[0] if args else '')
+            bars = self._bars(symbol, kwargs.get('start_date'), kwargs.get('end_date'))
+            return pd.DataFrame({
+                '日期': bars['date'].dt.strftime('%Y-%m-%d'),
+                '开盘': bars['open'],
+                '收盘': bars['close'],
+                '最高': bars['high'],
+                '最低': bars['low'],
+                '成交量': (bars['volume'] / 100).round(),
+                '成交额': bars['amount']
+            })
+        return self._serve(func_name, args, kwargs, synthesize, date_column='日期')
+
+    def fund_etf_hist_em(self, *args: Any, **kwargs: Any) -> pd.DataFrame:
+        return self._fund_hist_em('fund_etf_hist_em', args, kwargs)
+
+    def fund_lof_hist_em(self, *args: Any, **kwargs: Any) -> pd.DataFrame:
+        return self._fund_hist_em('fund_lof_hist_em', args, kwargs)
+
+    def futures_main_sina(self, *args: Any, **kwargs: Any) -> pd.DataFrame:
+        symbol = kwargs.get('symbol', args[0] if args else None)
+
+        def synthesize():
+            if symbol is None:
+                # 不带参数时返回主力合约列表
+                contracts = [(f"{code}0", f"{name}连续") for items in SYNTHETIC_FUTURES.values()
+                             for code, name in items]
+                return pd.DataFrame(contracts, columns=['symbol', 'name'])
+
+            bars = self._bars(symbol, kwargs.get('start_date'), kwargs.get('end_date'))
+            return pd.DataFrame({
+                '日期': bars['date'].dt.strftime('%Y-%m-%d'),
+                '开盘价': bars['open'],
+                '最高价': bars['high'],
+                '最低价': bars['low'],
+                '收盘价': bars['close'],
+                '成交量': bars['volume'],
+                '持仓量': (bars['volume'] * 2).round(),
+                '动态结算价': bars['close']
+            })
+        return self._serve('futures_main_sina', args, kwargs, synthesize,
+                           date_column=None if symbol is None else '日期')
+
+    def futures_zh_daily(self, *args: Any, **kwargs: Any) -> pd.DataFrame:
+        def synthesize():
+            symbol = kwargs.get('symbol', args[0] if args else '')
+            bars = self._bars(symbol)
+            return pd.DataFrame({
+                'date': bars['date'].dt.strftime('%Y-%m-%d'),
+                'open': bars['open'],
+                'high': bars['high'],
+                'low': bars['low'],
+                'close': bars['close'],
+                'volume': bars['volume'],
+                'hold': (bars['volume'] * 2).round(),
+                'settle': bars['close']
+            })
+        return self._serve('futures_zh_daily', args, kwargs, synthesize)
+
+    # ---------- 行情列表 ----------
+
+    def stock_zh_a_spot_em(self, *args: Any, **kwargs: Any) -> pd.DataFrame:
+        return self._serve('stock_zh_a_spot_em', args, kwargs,
+                           lambda: self._spot_list('A', '合成股票'))
+
+    def stock_hk_spot_em(self, *args: Any, **kwargs: Any) -> pd.DataFrame:
+        return self._serve('stock_hk_spot_em', args, kwargs,
+                           lambda: self._spot_list('HK', '合成港股'))
+
+    def _fund_spot(self, func_name: str, market: str, args: tuple, kwargs: Dict[str, Any]) -> pd.DataFrame:
+        def synthesize():
+            df = self._spot_list(market, f"合成{market}")
+            df = df.rename(columns={'今开': '开盘价', '最高': '最高价', '最低': '最低价', '昨收': '昨收价'})
+            df['基金折价率'] = self._rng(market).normal(0, 0.5, len(df)).round(2)
+            return df
+        return self._serve(func_name, args, kwargs, synthesize)
+
+    def fund_etf_spot_em(self, *args: Any, **kwargs: Any) -> pd.DataFrame:
+        return self._fund_spot('fund_etf_spot_em', 'ETF', args, kwargs)
+
+    def fund_lof_spot_em(self, *args: Any, **kwargs: Any) -> pd.DataFrame:
+        return self._fund_spot('fund_lof_spot_em', 'LOF', args, kwargs)
+
+    def stock_us_spot_em(self, *args: Any, **kwargs: Any) -> pd.DataFrame:
+        def synthesize():
+            df = self._spot_list('US', 'Synthetic Corp ')
+            df = df.rename(columns={'今开': '开盘价', '最高': '最高价', '最低': '最低价', '昨收': '昨收价'})
+            df['市盈率'] = self._rng('US').uniform(5, 60, len(df)).round(2)
+            return df
+        return self._serve('stock_us_spot_em', args, kwargs, synthesize)
+
+    def futures_zh_spot(self, *args: Any, **kwargs: Any) -> pd.DataFrame:
+        def synthesize():
+            exchange = str(kwargs.get('symbol', args[0] if args else 'shfe')).lower()
+            month = (datetime.now() + timedelta(days=60)).strftime('%y%m')
+            contracts = SYNTHETIC_FUTURES.get(exchange, [])
+            codes = [f"{code}{month}" for code, _ in contracts]
+            df = self._quotes(codes)
+            df = df.rename(columns={'今开': '开盘价', '最高': '最高价', '最低': '最低价', '昨收': '昨收价'})
+            df.insert(0, '代码', codes)
+            df.insert(1, '名称', [f"{name}{month}" for _, name in contracts])
+            df['持仓量'] = (df['成交量'] * 2).round()
+            df['昨结算'] = df['昨收价']
+            df['今结算'] = df['最新价']
+            return df[['代码', '名称', '最新价', '涨跌额', '涨跌幅', '成交量', '成交额', '持仓量',
+                       '开盘价', '最高价', '最低价', '昨收价', '昨结算', '今结算']]
+        return self._serve('futures_zh_spot', args, kwargs, synthesize)
+
+    # ---------- 交易日历 ----------
+
+    def tool_trade_date_hist_sina(self, *args: Any, **kwargs: Any) -> pd.DataFrame:
+        def synthesize():
+            # 合成行情只有周末休市，日历覆盖到当年年底
+            days = _business_days(pd.Timestamp(datetime.now().year, 12, 31))
+            return pd.DataFrame({'trade_date': days.date})
+        return self._serve('tool_trade_date_hist_sina', args, kwargs, synthesize)
+
+
+class RecordingDataSource(AkshareDataSource):
+    """
+    录制数据源
+    请求真实上游的同时把返回结果按回放目录结构保存，之后可用ReplayDataSource离线回放
+    """
+
+    name = 'record'
+
+    def __init__(self, base_dir: Optional[str] = None):
+        """
+        Args:
+            base_dir: 录制文件目录，默认为环境变量REPLAY_DIR或项目下的data/replay
+        """
+        self.base_dir = base_dir or os.getenv('REPLAY_DIR') or os.path.join(PROJECT_ROOT, 'data', 'replay')
+        self.use_parquet = importlib.util.find_spec('pyarrow') is not None
+        self.recorded = 0
+        logger.info(f"录制上游数据到: {self.base_dir}")
+
+    def __getattr__(self, func_name: str) -> Callable[..., Any]:
+        func = super().__getattr__(func_name)
+
+        def record(*args: Any, **kwargs: Any) -> pd.DataFrame:
+            df = func(*args, **kwargs)
+            try:
+                self._save(func_name, _replay_key(args, kwargs), df)
+            except Exception as e:
+                logger.warning(f"录制上游数据失败 {func_name}: {str(e)}")
+            return df
+
+        record.__name__ = func_name
+        return record
+
+    def _save(self, func_name: str, key: str, df: pd.DataFrame) -> None:
+        """原子写入录制文件"""
+        if not isinstance(df, pd.DataFrame) or df.empty:
+            return
+        directory = os.path.join(self.base_dir, func_name)
+        os.makedirs(directory, exist_ok=True)
+        ext = 'parquet' if self.use_parquet else 'csv'
+        path = os.path.join(directory, f"{key}.{ext}")
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        if self.use_parquet:
+            df.to_parquet(tmp_path, index=False)
+        else:
+            df.to_csv(tmp_path, index=False)
+        os.replace(tmp_path, path)
+        self.recorded += 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {'name': self.name, 'base_dir': self.base_dir, 'recorded': self.recorded}
+
+
+# 进程级单例
+_data_source: Optional[DataSource] = None
+_data_source_guard = threading.Lock()
+
+
+def get_data_source() -> DataSource:
+    """
+    获取进程级行情数据源
+    由环境变量DATA_SOURCE选择：akshare（默认）、replay（离线回放）或record（请求上游并录制）
+    """
+    global _data_source
+
+    if _data_source is None:
+        with _data_source_guard:
+            if _data_source is None:
+                kind = os.getenv('DATA_SOURCE', 'akshare').lower()
+                if kind == 'replay':
+                    _data_source = ReplayDataSource()
+                elif kind == 'record':
+                    _data_source = RecordingDataSource()
+                else:
+                    if kind != 'akshare':
+                        logger.warning(f"未知的数据源类型: {kind}，使用akshare")
+                    _data_source = AkshareDataSource()
+    return _data_source
@@ -1,8 +1,10 @@
-import asyncio
 import pandas as pd
 from typing import List, Dict, Any, Optional
 from utils.logger import get_logger
-from datetime import datetime, timedelta
+from utils.upstream_gateway import get_upstream_gateway, SOURCE_EM
+from services.data_source import get_data_source
+from services.snapshot_cache import get_snapshot_cache
+from services.search_index import SearchIndex
 
 # 获取日志器
 logger = get_logger()
@@ -17,11 +19,11 @@ class FundServiceAsync:
         """初始化异步基金服务"""
         logger.debug("初始化FundServiceAsync")
         
-        # 添加缓存
-        self._etf_cache = None
-        self._lof_cache = None
-        self._cache_timestamp = None
-        self._cache_duration = timedelta(minutes=30)  # 缓存30分钟
+        # ETF和LOF行情快照各自独立刷新，过期后在后台刷新
+        self._snapshots = {
+            'ETF': get_snapshot_cache('fund_etf_spot', self._get_etf_data, index_builder=self._build_search_index),
+            'LOF': get_snapshot_cache('fund_lof_spot', self._get_lof_data, index_builder=self._build_search_index)
+        }
     
     async def search_funds(self, keyword: str, market_type: str = 'ETF') -> List[Dict[str, Any]]:
         """
@@ -37,28 +39,10 @@ class FundServiceAsync:
         try:
             logger.info(f"异步搜索基金: {keyword}, 类型: {market_type}")
             
-            # 获取基金数据
-            df = await self._get_funds_data(market_type)
-            
-            # 模糊匹配搜索（同时匹配代码和名称）
-            mask = (df['name'].str.contains(keyword, case=False, na=False) | 
-                   df['symbol'].str.contains(keyword, case=False, na=False))
-            results = df[mask]
-            
-            # 格式化返回结果并处理 NaN 值
-            formatted_results = []
-            for _, row in results.iterrows():
-                formatted_results.append({
-                    'name': row['name'] if pd.notna(row['name']) else '',
-                    'symbol': str(row['symbol']) if pd.notna(row['symbol']) else '',
-                    'price': float(row['price']) if pd.notna(row['price']) else 0.0,
-                    'volume': float(row['volume']) if pd.notna(row['volume']) else 0.0,
-                    'market_value': float(row['market_value']) if pd.notna(row['market_value']) else 0.0,
-                    'total_value': float(row['total_value']) if pd.notna(row['total_value']) else 0.0,
-                })
-                # 限制只返回前10个结果
-                if len(formatted_results) >= 10:
-                    break
+            # 在基于行情快照预先构建的索引中查找（同时匹配代码、名称和拼音首字母），返回排名前10的结果
+            snapshot = self._snapshots['ETF' if market_type == 'ETF' else 'LOF']
+            index = await snapshot.get_index()
+            formatted_results = index.search(keyword, limit=10)
             
             logger.info(f"基金搜索完成，找到 {len(formatted_results)} 个匹配项（限制显示前10个）")
             return formatted_results
@@ -69,9 +53,33 @@ class FundServiceAsync:
             logger.exception(e)
             raise Exception(error_msg)
     
+    def _build_search_index(self, df: pd.DataFrame) -> SearchIndex:
+        """
+        基于基金行情快照构建搜索索引（在线程池中与快照一同构建）
+        
+        Args:
+            df: 基金行情快照
+            
+        Returns:
+            搜索索引
+        """
+        return SearchIndex(df, self._format_search_result)
+    
+    @staticmethod
+    def _format_search_result(row: Dict[str, Any]) -> Dict[str, Any]:
+        """格式化单条搜索结果并处理 NaN 值"""
+        return {
+            'name': row['name'] if pd.notna(row['name']) else '',
+            'symbol': str(row['symbol']) if pd.notna(row['symbol']) else '',
+            'price': float(row['price']) if pd.notna(row['price']) else 0.0,
+            'volume': float(row['volume']) if pd.notna(row['volume']) else 0.0,
+            'market_value': float(row['market_value']) if pd.notna(row['market_value']) else 0.0,
+            'total_value': float(row['total_value']) if pd.notna(row['total_value']) else 0.0,
+        }
+    
     async def _get_funds_data(self, market_type: str = 'ETF') -> pd.DataFrame:
         """
-        异步获取基金数据，支持缓存
+        异步获取基金数据，优先使用行情快照
         
         Args:
             market_type: 市场类型，'ETF'或'LOF'
@@ -79,34 +87,9 @@ class FundServiceAsync:
         Returns:
             包含基金数据的DataFrame
         """
-        # 检查缓存是否有效
-        now = datetime.now()
-        cache_valid = (
-            self._cache_timestamp is not None and 
-            (now - self._cache_timestamp) < self._cache_duration
-        )
-        
-        if market_type == 'ETF' and cache_valid and self._etf_cache is not None:
-            logger.debug("使用ETF缓存数据")
-            return self._etf_cache
-        elif market_type == 'LOF' and cache_valid and self._lof_cache is not None:
-            logger.debug("使用LOF缓存数据")
-            return self._lof_cache
-        
-        # 缓存无效，重新获取数据
         try:
-            logger.debug(f"从API获取{market_type}数据")
-            
-            # 使用线程池执行同步的akshare调用
-            if market_type == 'ETF':
-                df = await asyncio.to_thread(self._get_etf_data)
-                self._etf_cache = df
-            else:
-                df = await asyncio.to_thread(self._get_lof_data)
-                self._lof_cache = df
-                
-            self._cache_timestamp = now
-            return df
+            snapshot = self._snapshots['ETF' if market_type == 'ETF' else 'LOF']
+            return await snapshot.get()
             
         except Exception as e:
             logger.error(f"获取{market_type}数据失败: {str(e)}")
@@ -120,11 +103,11 @@ class FundServiceAsync:
         Returns:
             包含ETF数据的DataFrame
         """
-        import akshare as ak
+        data_source = get_data_source()
         
         try:
             # 获取ETF基金数据
-            df = ak.fund_etf_spot_em()
+            df = get_upstream_gateway().call(SOURCE_EM, data_source.fund_etf_spot_em)
             
             # 转换列名
             df = df.rename(columns={
@@ -153,11 +136,11 @@ class FundServiceAsync:
         Returns:
             包含LOF数据的DataFrame
         """
-        import akshare as ak
+        data_source = get_data_source()
         
         try:
             # 获取LOF基金数据
-            df = ak.fund_lof_spot_em()
+            df = get_upstream_gateway().call(SOURCE_EM, data_source.fund_lof_spot_em)
             
             # 转换列名
             df = df.rename(columns={
@@ -1,11 +1,16 @@
+import os
 import json
+import pandas as pd
 from datetime import datetime
 from typing import List, Dict, Any, Optional, AsyncGenerator
 from utils.logger import get_logger
+from utils.stream_merge import merge_async_streams
 from services.futures_data_provider import FuturesDataProvider
 from services.futures_technical_indicator import FuturesTechnicalIndicator
 from services.futures_scorer import FuturesScorer
 from services.ai_analyzer import AIAnalyzer
+from services.score_table import get_score_table_store
+from utils.metrics import get_metrics, STAGE_INDICATORS, STAGE_SCORING
 
 # 获取日志器
 logger = get_logger()
@@ -37,6 +42,10 @@ class FuturesAnalyzerService:
             custom_api_timeout=custom_api_timeout
         )
         
+        # 批量扫描时AI分析的数量和并发度
+        self.ai_top_n = int(os.getenv('SCAN_AI_TOP_N', 5))
+        self.ai_concurrency = int(os.getenv('SCAN_AI_CONCURRENCY', 5))
+        
         logger.info("初始化FuturesAnalyzerService完成")
     
     async def analyze_futures(self, futures_code: str, stream: bool = False) -> AsyncGenerator[str, None]:
@@ -53,6 +62,19 @@ class FuturesAnalyzerService:
         try:
             logger.info(f"开始分析期货: {futures_code}")
             
+            # 盘后优先使用收盘后预先计算的评分表，命中时直接输出基本分析结果，不再实时评分；
+            # K线和技术指标仍需作为AI分析的输入
+            basic_result = None
+            store = get_score_table_store()
+            precomputed = store.lookup_current('FUTURES', [futures_code], 'futures_code') if store else {}
+            if futures_code in precomputed:
+                basic_result = {
+                    **precomputed[futures_code],
+                    "analysis_date": datetime.now().strftime('%Y-%m-%d'),
+                    "ai_analysis": ""
+                }
+                yield json.dumps(basic_result)
+            
             # 获取期货数据
             df = await self.data_provider.get_futures_data(futures_code)
             
@@ -79,92 +101,16 @@ class FuturesAnalyzerService:
                 return
             
             # 计算技术指标
-            df_with_indicators = self.indicator.calculate_futures_indicators(df)
-            
-            # 计算评分
-            score = self.scorer.calculate_score(df_with_indicators)
-            recommendation = self.scorer.get_recommendation(score)
-            
-            # 获取最新数据
-            latest_data = df_with_indicators.iloc[-1]
-            previous_data = df_with_indicators.iloc[-2] if len(df_with_indicators) > 1 else latest_data
-            
-            # 价格变动绝对值
-            price_change_value = latest_data['Close'] - previous_data['Close']
-            
-            # 计算涨跌幅
-            change_percent = (price_change_value / previous_data['Close']) * 100 if previous_data['Close'] != 0 else 0
-            
-            # 确定MA趋势
-            ma_short = latest_data.get('MA5', 0)
-            ma_medium = latest_data.get('MA20', 0)
-            ma_long = latest_data.get('MA60', 0)
-            
-            if ma_short > ma_medium > ma_long:
-                ma_trend = "UP"
-            elif ma_short < ma_medium < ma_long:
-                ma_trend = "DOWN"
-            else:
-                ma_trend = "FLAT"
-                
-            # 确定MACD信号
-            macd = latest_data.get('MACD', 0)
-            signal = latest_data.get('Signal', 0)
+            with get_metrics().time_stage(STAGE_INDICATORS, 'FUTURES'):
+                df_with_indicators = await self.indicator.calculate_futures_indicators_async(df, futures_code)
             
-            if macd > signal:
-                macd_signal = "BUY"
-            elif macd < signal:
-                macd_signal = "SELL"
-            else:
-                macd_signal = "HOLD"
+            # 盘后评分表中没有该代码时实时计算评分
+            if basic_result is None:
+                basic_result = self._build_analysis_result(futures_code, df_with_indicators)
                 
-            # 确定成交量状态
-            volume = latest_data.get('Volume', 0)
-            volume_ma = latest_data.get('Volume_MA', 0)
-            
-            if volume > volume_ma * 1.5:
-                volume_status = "HIGH"
-            elif volume < volume_ma * 0.5:
-                volume_status = "LOW"
-            else:
-                volume_status = "NORMAL"
-            
-            # 确定持仓量状态
-            open_interest = latest_data.get('OpenInterest', 0)
-            open_interest_ma = latest_data.get('OI_MA', 0)
-            
-            if open_interest > open_interest_ma * 1.2:
-                open_interest_status = "HIGH"
-            elif open_interest < open_interest_ma * 0.8:
-                open_interest_status = "LOW"
-            else:
-                open_interest_status = "NORMAL"
-                
-            # 当前分析日期
-            analysis_date = datetime.now().strftime('%Y-%m-%d')
-            
-            # 生成基本分析结果
-            basic_result = {
-                "futures_code": futures_code,
-                "analysis_date": analysis_date,
-                "score": score,
-                "price": latest_data['Close'],
-                "price_change_value": price_change_value,  # 价格变动绝对值
-                "change_percent": change_percent,  # 涨跌幅百分比
-                "ma_trend": ma_trend,
-                "rsi": latest_data.get('RSI', 0),
-                "macd_signal": macd_signal,
-                "volume_status": volume_status,
-                "open_interest": open_interest,
-                "open_interest_status": open_interest_status,
-                "volatility": latest_data.get('VolatilityStd', 0),
-                "recommendation": recommendation,
-                "ai_analysis": ""
-            }
-            
-            # 输出基本分析结果
-            logger.info(f"基本分析结果: {json.dumps(basic_result)}")
-            yield json.dumps(basic_result)
+                # 输出基本分析结果
+                logger.info(f"基本分析结果: {json.dumps(basic_result)}")
+                yield json.dumps(basic_result)
             
             # 使用AI进行深入分析
             async for analysis_chunk in self.ai_analyzer.get_futures_analysis(df_with_indicators, futures_code, stream):
@@ -178,7 +124,102 @@ class FuturesAnalyzerService:
             logger.exception(e)
             yield json.dumps({"error": error_msg})
     
-    async def scan_futures(self, futures_codes: List[str], min_score: int = 0, stream: bool = False) -> AsyncGenerator[str, None]:
+    def _build_analysis_result(self, futures_code: str, df: pd.DataFrame) -> Dict[str, Any]:
+        """
+        实时计算单个期货的评分并生成基本分析结果
+        
+        Args:
+            futures_code: 期货代码
+            df: 包含技术指标的DataFrame
+            
+        Returns:
+            基本分析结果字典
+        """
+        # 计算评分
+        with get_metrics().time_stage(STAGE_SCORING, 'FUTURES'):
+            score = self.scorer.calculate_score(df)
+            recommendation = self.scorer.get_recommendation(score)
+        
+        # 获取最新数据
+        latest_data = df.iloc[-1]
+        previous_data = df.iloc[-2] if len(df) > 1 else latest_data
+        
+        # 价格变动绝对值
+        price_change_value = latest_data['Close'] - previous_data['Close']
+        
+        # 计算涨跌幅
+        change_percent = (price_change_value / previous_data['Close']) * 100 if previous_data['Close'] != 0 else 0
+        
+        # 确定MA趋势
+        ma_short = latest_data.get('MA5', 0)
+        ma_medium = latest_data.get('MA20', 0)
+        ma_long = latest_data.get('MA60', 0)
+        
+        if ma_short > ma_medium > ma_long:
+            ma_trend = "UP"
+        elif ma_short < ma_medium < ma_long:
+            ma_trend = "DOWN"
+        else:
+            ma_trend = "FLAT"
+        
+        # 确定MACD信号
+        macd = latest_data.get('MACD', 0)
+        signal = latest_data.get('Signal', 0)
+        
+        if macd > signal:
+            macd_signal = "BUY"
+        elif macd < signal:
+            macd_signal = "SELL"
+        else:
+            macd_signal = "HOLD"
+        
+        # 确定成交量状态
+        volume = latest_data.get('Volume', 0)
+        volume_ma = latest_data.get('Volume_MA', 0)
+        
+        if volume > volume_ma * 1.5:
+            volume_status = "HIGH"
+        elif volume < volume_ma * 0.5:
+            volume_status = "LOW"
+        else:
+            volume_status = "NORMAL"
+        
+        # 确定持仓量状态
+        open_interest = latest_data.get('OpenInterest', 0)
+        open_interest_ma = latest_data.get('OI_MA', 0)
+        
+        if open_interest > open_interest_ma * 1.2:
+            open_interest_status = "HIGH"
+        elif open_interest < open_interest_ma * 0.8:
+            open_interest_status = "LOW"
+        else:
+            open_interest_status = "NORMAL"
+        
+        # 当前分析日期
+        analysis_date = datetime.now().strftime('%Y-%m-%d')
+        
+        # 生成基本分析结果
+        return {
+            "futures_code": futures_code,
+            "analysis_date": analysis_date,
+            "score": score,
+            "price": latest_data['Close'],
+            "price_change_value": price_change_value,  # 价格变动绝对值
+            "change_percent": change_percent,  # 涨跌幅百分比
+            "ma_trend": ma_trend,
+            "rsi": latest_data.get('RSI', 0),
+            "macd_signal": macd_signal,
+            "volume_status": volume_status,
+            "open_interest": open_interest,
+            "open_interest_status": open_interest_status,
+            "volatility": latest_data.get('VolatilityStd', 0),
+            "recommendation": recommendation,
+            "ai_analysis": ""
+        }
+    
+    async def scan_futures(self, futures_codes: List[str], min_score: int = 0, stream: bool = False,
+                           ai_top_n: int = None, ai_concurrency: int = None,
+                           summary: bool = False) -> AsyncGenerator[str, None]:
         """
         批量扫描期货
         
@@ -186,6 +227,9 @@ class FuturesAnalyzerService:
             futures_codes: 期货代码列表
             min_score: 最低评分阈值
             stream: 是否使用流式响应
+            ai_top_n: 进行AI分析的最高评分数量，默认为环境变量SCAN_AI_TOP_N（默认5）
+            ai_concurrency: AI分析的最大并发数，默认为环境变量SCAN_AI_CONCURRENCY（默认5）
+            summary: 是否在全部评分后输出汇总排名消息，默认不输出（旧版前端按单个代码解析流式消息）
             
         Returns:
             异步生成器，生成扫描结果的JSON字符串
@@ -200,68 +244,96 @@ class FuturesAnalyzerService:
                 "min_score": min_score
             })
             
-            # 批量获取期货数据
-            futures_data_dict = await self.data_provider.get_multiple_futures_data(futures_codes)
+            # 盘后优先使用收盘后预先计算的评分表，只对表中没有的代码实时计算
+            store = get_score_table_store()
+            precomputed = store.lookup_current('FUTURES', futures_codes, 'futures_code') if store else {}
+            live_codes = [code for code in futures_codes if code not in precomputed]
             
-            # 计算技术指标
+            results = []
             futures_with_indicators = {}
-            for code, df in futures_data_dict.items():
-                try:
-                    futures_with_indicators[code] = self.indicator.calculate_futures_indicators(df)
-                except Exception as e:
-                    logger.error(f"计算 {code} 技术指标时出错: {str(e)}")
-                    # 发送错误状态
-                    yield json.dumps({
-                        "futures_code": code,
-                        "error": f"计算技术指标时出错: {str(e)}",
-                        "status": "error"
-                    })
             
-            # 评分期货
-            results = self.scorer.batch_score_futures(futures_with_indicators)
+            # 预计算的评分无需获取数据，直接输出
+            for code, row in precomputed.items():
+                score = int(row['score'])
+                results.append((code, score, row['recommendation']))
+                message = dict(row)
+                message["status"] = "completed" if score < min_score else "waiting"
+                yield json.dumps(message)
             
-            # 过滤低于最低评分的期货
-            filtered_results = [r for r in results if r[1] >= min_score]
-            
-            # 为每个期货发送基本评分和推荐信息
-            for code, score, rec in results:
-                df = futures_with_indicators.get(code)
-                if df is not None and len(df) > 0:
-                    # 获取最新数据
-                    latest_data = df.iloc[-1]
-                    previous_data = df.iloc[-2] if len(df) > 1 else latest_data
+            # 逐个获取期货数据，每个期货的数据一到达就计算指标和评分并立即输出，不必等待最慢的请求
+            if live_codes:
+                async for code, df in self.data_provider.iter_multiple_futures_data(live_codes):
+                    if df is None:
+                        yield json.dumps({
+                            "futures_code": code,
+                            "error": f"获取期货 {code} 数据失败",
+                            "status": "error"
+                        })
+                        continue
+                    
+                    # 计算技术指标
+                    try:
+                        with get_metrics().time_stage(STAGE_INDICATORS, 'FUTURES'):
+                            df = await self.indicator.calculate_futures_indicators_async(df, code)
+                    except Exception as e:
+                        logger.error(f"计算 {code} 技术指标时出错: {str(e)}")
+                        # 发送错误状态
+                        yield json.dumps({
+                            "futures_code": code,
+                            "error": f"计算技术指标时出错: {str(e)}",
+                            "status": "error"
+                        })
+                        continue
+                    
+                    if df is None or len(df) == 0:
+                        continue
                     
-                    # 价格变动绝对值
-                    price_change_value = latest_data['Close'] - previous_data['Close']
+                    # 评分期货
+                    with get_metrics().time_stage(STAGE_SCORING, 'FUTURES'):
+                        score = self.scorer.calculate_score(df)
+                        rec = self.scorer.get_recommendation(score)
                     
-                    # 计算涨跌幅
-                    change_percent = (price_change_value / previous_data['Close']) * 100 if previous_data['Close'] != 0 else 0
+                    futures_with_indicators[code] = df
+                    results.append((code, score, rec))
                     
                     # 发送期货基本信息和评分
-                    yield json.dumps({
-                        "futures_code": code,
-                        "score": score,
-                        "recommendation": rec,
-                        "price": float(latest_data.get('Close', 0)),
-                        "price_change_value": float(price_change_value),  # 价格变动绝对值
-                        "change_percent": float(change_percent),  # 涨跌幅百分比
-                        "rsi": float(latest_data.get('RSI', 0)) if 'RSI' in latest_data else None,
-                        "ma_trend": "UP" if latest_data.get('MA5', 0) > latest_data.get('MA20', 0) else "DOWN",
-                        "macd_signal": "BUY" if latest_data.get('MACD', 0) > latest_data.get('Signal', 0) else "SELL",
-                        "volume_status": "HIGH" if latest_data.get('Volume', 0) > latest_data.get('Volume_MA', 0) * 1.5 else ("LOW" if latest_data.get('Volume', 0) < latest_data.get('Volume_MA', 0) * 0.5 else "NORMAL"),
-                        "open_interest": float(latest_data.get('OpenInterest', 0)) if 'OpenInterest' in latest_data else None,
-                        "volatility": float(latest_data.get('VolatilityStd', 0)) if 'VolatilityStd' in latest_data else None,
-                        "status": "completed" if score < min_score else "waiting"
-                    })
+                    message = self._build_score_message(code, df, score, rec)
+                    message["status"] = "completed" if score < min_score else "waiting"
+                    yield json.dumps(message)
+            
+            # 全部结果到齐后按评分重新排序，调用方要求时输出汇总排名
+            results.sort(key=lambda x: x[1], reverse=True)
+            if summary:
+                yield json.dumps({
+                    "scan_summary": True,
+                    "ranking": [
+                        {"futures_code": code, "score": score, "recommendation": rec}
+                        for code, score, rec in results
+                    ]
+                })
+            
+            # 过滤低于最低评分的期货
+            filtered_results = [r for r in results if r[1] >= min_score]
             
             # 如果需要进一步分析，对评分较高的期货进行AI分析
             if stream and filtered_results:
-                # 只分析前5个评分最高的期货，避免分析过多导致前端卡顿
-                top_futures = filtered_results[:5]
+                # 只分析评分最高的前N个期货，多个AI流以有限并发同时进行，按futures_code标记的数据块交错输出
+                top_n = self.ai_top_n if ai_top_n is None else ai_top_n
+                concurrency = self.ai_concurrency if ai_concurrency is None else ai_concurrency
+                top_futures = filtered_results[:top_n]
+                
+                # 评分来自预计算表的期货仍需K线和指标作为AI分析的输入
+                missing_codes = [code for code, _, _ in top_futures if code not in futures_with_indicators]
+                if missing_codes:
+                    missing_data = await self.data_provider.get_multiple_futures_data(missing_codes)
+                    for code, df in missing_data.items():
+                        try:
+                            futures_with_indicators[code] = await self.indicator.calculate_futures_indicators_async(df, code)
+                        except Exception as e:
+                            logger.error(f"计算 {code} 技术指标失败，跳过AI分析: {str(e)}")
                 
-                for futures_code, score, _ in top_futures:
-                    df = futures_with_indicators.get(futures_code)
-                    if df is not None:
+                def make_analysis_stream(futures_code, df):
+                    async def analysis_stream():
                         # 输出正在分析的期货信息
                         yield json.dumps({
                             "futures_code": futures_code,
@@ -271,6 +343,17 @@ class FuturesAnalyzerService:
                         # AI分析
                         async for analysis_chunk in self.ai_analyzer.get_futures_analysis(df, futures_code, stream):
                             yield analysis_chunk
+                    return analysis_stream
+                
+                analysis_streams = [
+                    make_analysis_stream(futures_code, futures_with_indicators[futures_code])
+                    for futures_code, _, _ in top_futures
+                    if futures_with_indicators.get(futures_code) is not None
+                ]
+                
+                logger.info(f"开始AI分析评分最高的 {len(analysis_streams)} 个期货, 并发数: {concurrency}")
+                async for analysis_chunk in merge_async_streams(analysis_streams, concurrency):
+                    yield analysis_chunk
             
             # 输出扫描完成信息
             yield json.dumps({
@@ -285,4 +368,72 @@ class FuturesAnalyzerService:
             error_msg = f"批量扫描期货时出错: {str(e)}"
             logger.error(error_msg)
             logger.exception(e)
-            yield json.dumps({"error": error_msg})
\ No newline at end of file
+            yield json.dumps({"error": error_msg})
+    
+    def _build_score_message(self, code: str, df, score: int, rec: str) -> Dict[str, Any]:
+        """
+        生成单个期货的评分消息（不含状态字段），实时扫描和收盘后评分表共用
+        
+        Args:
+            code: 期货代码
+            df: 包含技术指标的DataFrame
+            score: 评分
+            rec: 推荐
+            
+        Returns:
+            评分消息字典
+        """
+        # 获取最新数据
+        latest_data = df.iloc[-1]
+        previous_data = df.iloc[-2] if len(df) > 1 else latest_data
+        
+        # 价格变动绝对值
+        price_change_value = latest_data['Close'] - previous_data['Close']
+        
+        # 计算涨跌幅
+        change_percent = (price_change_value / previous_data['Close']) * 100 if previous_data['Close'] != 0 else 0
+        
+        return {
+            "futures_code": code,
+            "score": score,
+            "recommendation": rec,
+            "price": float(latest_data.get('Close', 0)),
+            "price_change_value": float(price_change_value),  # 价格变动绝对值
+            "change_percent": float(change_percent),  # 涨跌幅百分比
+            "rsi": float(latest_data.get('RSI', 0)) if 'RSI' in latest_data else None,
+            "ma_trend": "UP" if latest_data.get('MA5', 0) > latest_data.get('MA20', 0) else "DOWN",
+            "macd_signal": "BUY" if latest_data.get('MACD', 0) > latest_data.get('Signal', 0) else "SELL",
+            "volume_status": "HIGH" if latest_data.get('Volume', 0) > latest_data.get('Volume_MA', 0) * 1.5 else ("LOW" if latest_data.get('Volume', 0) < latest_data.get('Volume_MA', 0) * 0.5 else "NORMAL"),
+            "open_interest": float(latest_data.get('OpenInterest', 0)) if 'OpenInterest' in latest_data else None,
+            "volatility": float(latest_data.get('VolatilityStd', 0)) if 'VolatilityStd' in latest_data else None
+        }
+    
+    async def build_score_table(self, futures_codes: List[str]) -> pd.DataFrame:
+        """
+        计算一组期货的评分表（供收盘后调度任务使用）
+        
+        Args:
+            futures_codes: 期货代码列表
+            
+        Returns:
+            以期货代码为索引的评分表
+        """
+        futures_data_dict = await self.data_provider.get_multiple_futures_data(futures_codes)
+        
+        futures_with_indicators = {}
+        for code, df in futures_data_dict.items():
+            try:
+                futures_with_indicators[code] = await self.indicator.calculate_futures_indicators_async(df, code)
+            except Exception as e:
+                logger.warning(f"计算 {code} 技术指标失败，不计入评分表: {str(e)}")
+        
+        rows = []
+        for code, score, rec in self.scorer.batch_score_futures(futures_with_indicators):
+            message = self._build_score_message(code, futures_with_indicators[code], score, rec)
+            message["bar_date"] = str(futures_with_indicators[code].index[-1])[:10]
+            rows.append(message)
+        
+        table = pd.DataFrame(rows)
+        if not table.empty:
+            table = table.set_index('futures_code')
+        return table
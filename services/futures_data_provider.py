@@ -1,8 +1,13 @@
+import time
 import pandas as pd
 from datetime import datetime, timedelta
 import asyncio
-from typing import Dict, List, Optional, Tuple, Any
+from typing import Dict, List, Optional, Tuple, Any, AsyncGenerator
 from utils.logger import get_logger
+from utils.upstream_gateway import get_upstream_gateway, SOURCE_EM, SOURCE_SINA
+from services.data_source import get_data_source
+from utils.metrics import get_metrics, STAGE_UPSTREAM_FETCH, STAGE_NORMALIZATION
+from utils.singleflight import SingleFlight
 
 # 获取日志器
 logger = get_logger()
@@ -13,6 +18,9 @@ class FuturesDataProvider:
     负责获取期货产品的历史数据
     """
     
+    # 进程级请求合并器：并发请求同一合约和日期区间时只发起一次上游调用
+    _single_flight = SingleFlight("futures_data")
+    
     def __init__(self):
         """初始化数据提供者服务"""
         logger.debug("初始化FuturesDataProvider")
@@ -31,12 +39,23 @@ class FuturesDataProvider:
         Returns:
             包含历史数据的DataFrame
         """
-        # 使用线程池执行同步的akshare调用
-        return await asyncio.to_thread(
-            self._get_futures_data_sync, 
-            futures_code, 
-            start_date, 
-            end_date
+        # 先确定默认日期，保证相同请求得到相同的合并键
+        if start_date is None:
+            start_date = (datetime.now() - timedelta(days=365)).strftime('%Y%m%d')
+        if end_date is None:
+            end_date = datetime.now().strftime('%Y%m%d')
+        start_date = start_date.replace('-', '')
+        end_date = end_date.replace('-', '')
+        
+        # 在上游网关线程池中执行同步的akshare调用，并发的相同请求共享同一次调用
+        return await self._single_flight.do(
+            (futures_code, start_date, end_date),
+            lambda: get_upstream_gateway().run(
+                self._get_futures_data_sync, 
+                futures_code, 
+                start_date, 
+                end_date
+            )
         )
     
     def _get_futures_data_sync(self, futures_code: str, 
@@ -46,7 +65,7 @@ class FuturesDataProvider:
         同步获取期货数据的实现
         将被异步方法调用
         """
-        import akshare as ak
+        data_source = get_data_source()
         
         if start_date is None:
             start_date = (datetime.now() - timedelta(days=365)).strftime('%Y%m%d')
@@ -59,6 +78,7 @@ class FuturesDataProvider:
         if isinstance(end_date, str) and '-' in end_date:
             end_date = end_date.replace('-', '')
             
+        started = time.perf_counter()
         try:
             logger.debug(f"获取期货数据: {futures_code}")
             
@@ -75,26 +95,29 @@ class FuturesDataProvider:
                 logger.debug(f"获取主力连续合约数据: {futures_code}")
                 try:
                     # 尝试使用新浪财经API获取主力连续合约数据
-                    df = ak.futures_main_sina(symbol=futures_code[:-2], start_date=start_date, end_date=end_date)
+                    df = get_upstream_gateway().fetch(SOURCE_SINA, data_source.futures_main_sina, symbol=futures_code[:-2], start_date=start_date, end_date=end_date)
                 except Exception as e:
                     logger.warning(f"使用新浪财经API获取主力连续合约数据失败: {str(e)}，尝试使用其他API")
                     # 尝试使用其他API
-                    df = ak.futures_zh_daily(symbol=futures_code)
+                    df = get_upstream_gateway().fetch(SOURCE_SINA, data_source.futures_zh_daily, symbol=futures_code)
             else:
                 # 获取普通合约
                 logger.debug(f"获取普通合约数据: {futures_code}, 交易所: {exchange}")
                 
                 if exchange == "SHFE":  # 上海期货交易所
-                    df = ak.futures_zh_daily(symbol=futures_code)
+                    df = get_upstream_gateway().fetch(SOURCE_SINA, data_source.futures_zh_daily, symbol=futures_code)
                 elif exchange == "DCE":  # 大连商品交易所
-                    df = ak.futures_zh_daily(symbol=futures_code)
+                    df = get_upstream_gateway().fetch(SOURCE_SINA, data_source.futures_zh_daily, symbol=futures_code)
                 elif exchange == "CZCE":  # 郑州商品交易所
-                    df = ak.futures_zh_daily(symbol=futures_code)
+                    df = get_upstream_gateway().fetch(SOURCE_SINA, data_source.futures_zh_daily, symbol=futures_code)
                 elif exchange == "CFFEX":  # 中国金融期货交易所
-                    df = ak.futures_zh_daily(symbol=futures_code)
+                    df = get_upstream_gateway().fetch(SOURCE_SINA, data_source.futures_zh_daily, symbol=futures_code)
                 else:
                     # 默认使用通用API
-                    df = ak.futures_zh_daily(symbol=futures_code)
+                    df = get_upstream_gateway().fetch(SOURCE_SINA, data_source.futures_zh_daily, symbol=futures_code)
+            
+            fetched = time.perf_counter()
+            get_metrics().observe_stage(STAGE_UPSTREAM_FETCH, fetched - started, 'FUTURES')
             
             # 标准化列名
             # 根据实际数据结构调整列名映射
@@ -172,6 +195,7 @@ class FuturesDataProvider:
                 logger.warning(f"数据中缺少Amount列，使用0值填充")
                 df['Amount'] = 0.0
             
+            get_metrics().observe_stage(STAGE_NORMALIZATION, time.perf_counter() - fetched, 'FUTURES')
             logger.info(f"成功获取期货数据 {futures_code}, 数据点数: {len(df)}")
             return df
             
@@ -219,7 +243,7 @@ class FuturesDataProvider:
     async def get_multiple_futures_data(self, futures_codes: List[str], 
                                       start_date: Optional[str] = None, 
                                       end_date: Optional[str] = None,
-                                      max_concurrency: int = 5) -> Dict[str, pd.DataFrame]:
+                                      max_concurrency: Optional[int] = None) -> Dict[str, pd.DataFrame]:
         """
         异步批量获取多个期货数据
         
@@ -227,16 +251,43 @@ class FuturesDataProvider:
             futures_codes: 期货代码列表
             start_date: 开始日期，格式YYYYMMDD
             end_date: 结束日期，格式YYYYMMDD
-            max_concurrency: 最大并发数，默认为5
+            max_concurrency: 固定的最大并发数，默认为None，使用数据源的自适应并发上限
             
         Returns:
             字典，键为期货代码，值为对应的DataFrame
         """
-        # 使用信号量控制并发数
-        semaphore = asyncio.Semaphore(max_concurrency)
+        results = {}
+        async for code, df in self.iter_multiple_futures_data(futures_codes, start_date, end_date, max_concurrency=max_concurrency):
+            if df is not None:
+                results[code] = df
+        
+        # 按传入顺序构建结果字典，过滤掉失败的请求
+        return {code: results[code] for code in futures_codes if code in results}
+    
+    async def iter_multiple_futures_data(self, futures_codes: List[str], 
+                                       start_date: Optional[str] = None, 
+                                       end_date: Optional[str] = None,
+                                       max_concurrency: Optional[int] = None) -> AsyncGenerator[Tuple[str, Optional[pd.DataFrame]], None]:
+        """
+        异步批量获取多个期货数据，按完成顺序逐个产出，不必等待最慢的请求
         
-        async def get_with_semaphore(code):
-            async with semaphore:
+        Args:
+            futures_codes: 期货代码列表
+            start_date: 开始日期，格式YYYYMMDD
+            end_date: 结束日期，格式YYYYMMDD
+            max_concurrency: 固定的最大并发数，默认为None，使用数据源的自适应并发上限
+            
+        Returns:
+            异步生成器，产出(代码, DataFrame)，获取时抛出异常的代码DataFrame为None
+        """
+        # 未指定固定并发数时按数据源的自适应并发上限控制，上游调用的成败和耗时会实时调整上限
+        if max_concurrency is None:
+            limiter = get_upstream_gateway().limiter(SOURCE_SINA)
+        else:
+            limiter = asyncio.Semaphore(max_concurrency)
+        
+        async def get_with_limit(code):
+            async with limiter:
                 try:
                     return code, await self.get_futures_data(code, start_date, end_date)
                 except Exception as e:
@@ -244,13 +295,16 @@ class FuturesDataProvider:
                     return code, None
         
         # 创建异步任务
-        tasks = [get_with_semaphore(code) for code in futures_codes]
+        tasks = [asyncio.ensure_future(get_with_limit(code)) for code in futures_codes]
         
-        # 等待所有任务完成
-        results = await asyncio.gather(*tasks)
-        
-        # 构建结果字典，过滤掉失败的请求
-        return {code: df for code, df in results if df is not None}
+        try:
+            for future in asyncio.as_completed(tasks):
+                yield await future
+        finally:
+            # 消费方提前结束时取消尚未完成的请求
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
     
     async def get_basis_data(self, futures_code: str, spot_code: str, 
                            start_date: Optional[str] = None, 
@@ -283,10 +337,8 @@ class FuturesDataProvider:
             
             # 获取现货数据
             # 这里假设现货代码是A股代码，实际使用时可能需要根据不同的现货类型调用不同的API
-            import akshare as ak
-            
-            # 使用线程池执行同步的akshare调用
-            spot_df = await asyncio.to_thread(
+            # 在上游网关线程池中执行同步的akshare调用
+            spot_df = await get_upstream_gateway().run(
                 self._get_spot_data_sync, 
                 spot_code, 
                 start_date, 
@@ -350,13 +402,13 @@ class FuturesDataProvider:
         Returns:
             包含现货数据的DataFrame
         """
-        import akshare as ak
+        data_source = get_data_source()
         
         try:
             logger.debug(f"获取现货数据: {spot_code}")
             
             # 这里假设现货代码是A股代码，实际使用时可能需要根据不同的现货类型调用不同的API
-            df = ak.stock_zh_a_hist(
+            df = get_upstream_gateway().fetch(SOURCE_EM, data_source.stock_zh_a_hist,
                 symbol=spot_code,
                 start_date=start_date,
                 end_date=end_date,
@@ -12,6 +12,13 @@ class FuturesScorer:
     负责根据技术指标评估期货的交易机会
     """
     
+    # 向量化评分涉及的列，标的之间列集合不同时分组评分，保证"列是否存在"的判断与逐个评分一致
+    SCORE_COLUMNS = [
+        'Close', 'MA5', 'MA20', 'MA60', 'MACD', 'Signal', 'Histogram', 'RSI', 'Momentum',
+        'VolatilityStd', 'BB_Upper', 'BB_Lower', 'BB_Middle', 'ATR',
+        'Volume', 'Volume_MA', 'PVT', 'OpenInterest', 'OI_MA', 'OI_Volume_Ratio'
+    ]
+    
     def __init__(self, weights: Optional[Dict[str, float]] = None):
         """
         初始化期货评分系统
@@ -505,10 +512,217 @@ class FuturesScorer:
         else:
             return "强烈卖出"
     
+    def get_recommendations(self, scores: np.ndarray) -> np.ndarray:
+        """
+        根据评分数组批量获取交易建议，阈值与get_recommendation一致
+        
+        Args:
+            scores: 评分数组
+            
+        Returns:
+            交易建议数组
+        """
+        return np.select(
+            [scores >= 80, scores >= 65, scores >= 55, scores >= 45, scores >= 35, scores >= 20],
+            ["强烈买入", "买入", "持有", "观望", "减持", "卖出"],
+            default="强烈卖出"
+        )
+    
+    def build_score_tables(self, futures_dfs: Dict[str, pd.DataFrame], columns: List[str]) -> Dict[str, Any]:
+        """
+        提取每个期货最新、前一根和倒数第6根K线上的指标，组成列式表
+        
+        Args:
+            futures_dfs: 字典，键为期货代码，值为包含技术指标的DataFrame（需都包含columns中的列）
+            columns: 需要提取的列
+            
+        Returns:
+            包含codes、lengths、latest、previous、back5的字典，后三者为以代码为索引的DataFrame；
+            不足2根K线时previous取最新K线，不足6根K线时back5为NaN
+        """
+        codes = list(futures_dfs.keys())
+        lengths = np.array([len(futures_dfs[code]) for code in codes], dtype=int)
+        latest = np.full((len(codes), len(columns)), np.nan)
+        previous = np.full((len(codes), len(columns)), np.nan)
+        back5 = np.full((len(codes), len(columns)), np.nan)
+        
+        for i, code in enumerate(codes):
+            values = futures_dfs[code][columns].tail(6).to_numpy(dtype=float)
+            latest[i] = values[-1]
+            previous[i] = values[-2] if len(values) > 1 else values[-1]
+            if len(values) > 5:
+                back5[i] = values[-6]
+        
+        index = pd.Index(codes, name='code')
+        return {
+            'codes': codes,
+            'lengths': lengths,
+            'latest': pd.DataFrame(latest, index=index, columns=columns),
+            'previous': pd.DataFrame(previous, index=index, columns=columns),
+            'back5': pd.DataFrame(back5, index=index, columns=columns)
+        }
+    
+    def score_tables(self, tables: Dict[str, Any], basis_scores: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        向量化评分：用NumPy掩码一次性计算所有期货的各项得分，规则与calculate_score一致
+        
+        Args:
+            tables: build_score_tables的返回值
+            basis_scores: 各期货的基差评分（可选），缺省为0
+            
+        Returns:
+            (评分数组, 交易建议数组)的元组，顺序与tables['codes']一致
+        """
+        latest = tables['latest']
+        previous = tables['previous']
+        back5 = tables['back5']
+        lengths = tables['lengths']
+        available = set(latest.columns)
+        
+        def has(*cols) -> bool:
+            return all(col in available for col in cols)
+        
+        def cur(col) -> np.ndarray:
+            return latest[col].to_numpy()
+        
+        def prev(col) -> np.ndarray:
+            return previous[col].to_numpy()
+        
+        size = len(latest)
+        close = cur('Close')
+        prev_close = prev('Close')
+        price_up = close > prev_close
+        
+        # 含NaN的比较结果均为False，与逐个评分时落入else分支的行为一致
+        with np.errstate(divide='ignore', invalid='ignore'):
+            # 1. 趋势评分
+            trend = np.full(size, 50)
+            if has('MA5', 'MA20', 'MA60'):
+                ma5, ma20, ma60 = cur('MA5'), cur('MA20'), cur('MA60')
+                trend += np.select(
+                    [(ma5 > ma20) & (prev('MA5') <= prev('MA20')), (ma5 < ma20) & (prev('MA5') >= prev('MA20'))],
+                    [15, -15], default=0
+                )
+                trend += np.select([(ma5 > ma20) & (ma20 > ma60), (ma5 < ma20) & (ma20 < ma60)], [10, -10], default=0)
+            if has('MA20'):
+                trend += np.where(close > cur('MA20'), 5, -5)
+            if has('MACD', 'Signal'):
+                macd, signal = cur('MACD'), cur('Signal')
+                trend += np.select(
+                    [(macd > signal) & (prev('MACD') <= prev('Signal')), (macd < signal) & (prev('MACD') >= prev('Signal'))],
+                    [10, -10], default=0
+                )
+                if has('Histogram'):
+                    hist, prev_hist = cur('Histogram'), prev('Histogram')
+                    trend += np.select([(hist > 0) & (hist > prev_hist), (hist < 0) & (hist < prev_hist)], [5, -5], default=0)
+            trend = np.clip(trend, 0, 100)
+            
+            # 2. 动量评分
+            momentum_score = np.full(size, 50)
+            if has('RSI'):
+                rsi, prev_rsi = cur('RSI'), prev('RSI')
+                momentum_score += np.select([rsi > 70, rsi < 30], [-10, 10], default=0)
+                momentum_score += np.select([(rsi > prev_rsi) & (rsi < 70), (rsi < prev_rsi) & (rsi > 30)], [5, -5], default=0)
+            if has('Momentum'):
+                momentum = cur('Momentum')
+                momentum_score += np.where(momentum > 0, 10, -10)
+                momentum_score += np.where(momentum > prev('Momentum'), 5, -5)
+            back5_close = back5['Close'].to_numpy()
+            price_change = (close - back5_close) / back5_close * 100
+            momentum_score += np.where(
+                lengths > 5,
+                np.select([price_change > 5, price_change > 2, price_change < -5, price_change < -2], [10, 5, -10, -5], default=0),
+                0
+            )
+            momentum_score = np.clip(momentum_score, 0, 100)
+            
+            # 3. 波动率评分
+            volatility_score = np.full(size, 50)
+            if has('VolatilityStd'):
+                volatility = cur('VolatilityStd')
+                volatility_score += np.select(
+                    [volatility > 0.4, volatility > 0.3, volatility > 0.2, volatility < 0.1], [-15, -10, -5, 5], default=0
+                )
+            if has('BB_Upper', 'BB_Lower', 'BB_Middle'):
+                upper, lower = cur('BB_Upper'), cur('BB_Lower')
+                bandwidth = (upper - lower) / cur('BB_Middle')
+                volatility_score += np.where(bandwidth > 0.1, -10, 10)
+                volatility_score += np.select([close > upper, close < lower], [-5, 5], default=0)
+            if has('ATR'):
+                atr_percent = cur('ATR') / close * 100
+                volatility_score += np.select([atr_percent > 3, atr_percent < 1], [-10, 10], default=0)
+            volatility_score = np.clip(volatility_score, 0, 100)
+            
+            # 4. 成交量评分
+            volume_score = np.full(size, 50)
+            if has('Volume'):
+                volume, prev_volume = cur('Volume'), prev('Volume')
+                volume_change = (volume - prev_volume) / prev_volume * 100
+                volume_score += np.select(
+                    [price_up & (volume_change > 20), price_up & (volume_change < -20),
+                     ~price_up & (volume_change > 20), ~price_up & (volume_change < -20)],
+                    [15, -5, -15, 5], default=0
+                )
+            if has('Volume_MA', 'Volume'):
+                volume_ratio = cur('Volume') / cur('Volume_MA')
+                volume_score += np.select(
+                    [volume_ratio > 2, volume_ratio > 1.5, volume_ratio < 0.5, volume_ratio < 0.8], [10, 5, -10, -5], default=0
+                )
+            if has('PVT'):
+                pvt, prev_pvt = cur('PVT'), prev('PVT')
+                price_down = close < prev_close
+                volume_score += np.select(
+                    [(pvt > prev_pvt) & price_up, (pvt < prev_pvt) & price_down,
+                     (pvt > prev_pvt) & price_down, (pvt < prev_pvt) & price_up],
+                    [10, -10, 5, -5], default=0
+                )
+            volume_score = np.clip(volume_score, 0, 100)
+            
+            # 5. 持仓量评分
+            open_interest_score = np.zeros(size, dtype=int)
+            if has('OpenInterest'):
+                open_interest_score = np.full(size, 50)
+                open_interest, prev_open_interest = cur('OpenInterest'), prev('OpenInterest')
+                oi_change = (open_interest - prev_open_interest) / prev_open_interest * 100
+                open_interest_score += np.select(
+                    [price_up & (oi_change > 5), price_up & (oi_change < -5),
+                     ~price_up & (oi_change > 5), ~price_up & (oi_change < -5)],
+                    [15, -5, -15, 5], default=0
+                )
+                if has('OI_MA'):
+                    oi_ratio = open_interest / cur('OI_MA')
+                    open_interest_score += np.select(
+                        [oi_ratio > 1.2, oi_ratio > 1.1, oi_ratio < 0.8, oi_ratio < 0.9], [10, 5, -10, -5], default=0
+                    )
+                if has('OI_Volume_Ratio'):
+                    oi_vol_ratio = cur('OI_Volume_Ratio')
+                    open_interest_score += np.select([oi_vol_ratio > 10, oi_vol_ratio < 2], [5, -5], default=0)
+                open_interest_score = np.clip(open_interest_score, 0, 100)
+        
+        # 6. 基差评分
+        if basis_scores is None:
+            basis_scores = np.zeros(size)
+        
+        # 计算加权总分（相加顺序与calculate_score一致）
+        total_score = (
+            trend * self.weights['trend'] +
+            momentum_score * self.weights['momentum'] +
+            volatility_score * self.weights['volatility'] +
+            volume_score * self.weights['volume'] +
+            open_interest_score * self.weights['open_interest'] +
+            basis_scores * self.weights['basis']
+        )
+        
+        # 确保分数在0-100范围内
+        final_scores = np.clip(np.round(total_score), 0, 100).astype(int)
+        return final_scores, self.get_recommendations(final_scores)
+    
     def batch_score_futures(self, futures_with_indicators: Dict[str, pd.DataFrame], 
                           basis_data: Optional[Dict[str, pd.DataFrame]] = None) -> List[Tuple[str, int, str]]:
         """
-        批量评分多个期货
+        批量评分多个期货（向量化）
+        
+        按指标列集合将期货分组，每组构建列式表后一次性评分；无法向量化的期货退回逐个评分
         
         Args:
             futures_with_indicators: 字典，键为期货代码，值为包含技术指标的DataFrame
@@ -519,19 +733,31 @@ class FuturesScorer:
         """
         try:
             results = []
+            groups: Dict[Tuple[str, ...], Dict[str, pd.DataFrame]] = {}
             
             for code, df in futures_with_indicators.items():
-                # 获取对应的基差数据（如果有）
-                basis_df = basis_data.get(code) if basis_data else None
-                
-                # 计算评分
-                score = self.calculate_score(df, basis_df)
+                columns = tuple(col for col in self.SCORE_COLUMNS if col in df.columns)
+                if df.empty or 'Close' not in columns:
+                    # 数据不完整时沿用逐个评分的容错逻辑
+                    basis_df = basis_data.get(code) if basis_data else None
+                    score = self.calculate_score(df, basis_df)
+                    results.append((code, score, self.get_recommendation(score)))
+                else:
+                    groups.setdefault(columns, {})[code] = df
+            
+            for columns, group in groups.items():
+                tables = self.build_score_tables(group, list(columns))
                 
-                # 获取建议
-                recommendation = self.get_recommendation(score)
+                # 获取对应的基差数据（如果有）
+                basis_scores = np.zeros(len(group))
+                if basis_data:
+                    for i, code in enumerate(tables['codes']):
+                        basis_df = basis_data.get(code)
+                        if basis_df is not None and not basis_df.empty:
+                            basis_scores[i] = self._calculate_basis_score(basis_df)
                 
-                # 添加到结果列表
-                results.append((code, score, recommendation))
+                scores, recommendations = self.score_tables(tables, basis_scores)
+                results.extend(zip(tables['codes'], scores.tolist(), recommendations.tolist()))
             
             # 按评分降序排序
             results.sort(key=lambda x: x[1], reverse=True)
@@ -541,4 +767,4 @@ class FuturesScorer:
         except Exception as e:
             logger.error(f"批量评分期货时出错: {str(e)}")
             logger.exception(e)
-            return []
\ No newline at end of file
+            return []
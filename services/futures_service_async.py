@@ -1,7 +1,10 @@
-import asyncio
 import pandas as pd
 from typing import List, Dict, Any, Optional
 from utils.logger import get_logger
+from utils.upstream_gateway import get_upstream_gateway, SOURCE_SINA
+from services.data_source import get_data_source
+from services.snapshot_cache import get_snapshot_cache
+from services.search_index import SearchIndex
 
 # 获取日志器
 logger = get_logger()
@@ -16,9 +19,8 @@ class FuturesServiceAsync:
         """初始化期货服务"""
         logger.debug("初始化FuturesServiceAsync")
         
-        # 可选：添加缓存以减少频繁请求
-        self._cache = None
-        self._cache_timestamp = None
+        # 各交易所期货行情快照，过期后在后台刷新
+        self._snapshot = get_snapshot_cache('futures_spot', self._get_futures_list, index_builder=self._build_search_index)
     
     async def search_futures(self, keyword: str) -> List[Dict[str, Any]]:
         """
@@ -33,26 +35,9 @@ class FuturesServiceAsync:
         try:
             logger.info(f"异步搜索期货: {keyword}")
             
-            # 使用线程池执行同步的akshare调用
-            df = await asyncio.to_thread(self._get_futures_list)
-            
-            # 模糊匹配搜索
-            mask = df['name'].str.contains(keyword, case=False, na=False) | df['symbol'].str.contains(keyword, case=False, na=False)
-            results = df[mask]
-            
-            # 格式化返回结果并处理 NaN 值
-            formatted_results = []
-            for _, row in results.iterrows():
-                formatted_results.append({
-                    'name': row['name'] if pd.notna(row['name']) else '',
-                    'symbol': str(row['symbol']) if pd.notna(row['symbol']) else '',
-                    'price': float(row['price']) if pd.notna(row['price']) else 0.0,
-                    'exchange': str(row['exchange']) if pd.notna(row['exchange']) else '',
-                    'type': str(row['type']) if pd.notna(row['type']) else ''
-                })
-                # 限制只返回前10个结果
-                if len(formatted_results) >= 10:
-                    break
+            # 在基于行情快照预先构建的索引中查找，返回排名前10的结果
+            index = await self._snapshot.get_index()
+            formatted_results = index.search(keyword, limit=10)
             
             logger.info(f"期货搜索完成，找到 {len(formatted_results)} 个匹配项（限制显示前10个）")
             return formatted_results
@@ -63,6 +48,29 @@ class FuturesServiceAsync:
             logger.exception(e)
             raise Exception(error_msg)
     
+    def _build_search_index(self, df: pd.DataFrame) -> SearchIndex:
+        """
+        基于期货行情快照构建搜索索引（在线程池中与快照一同构建）
+        
+        Args:
+            df: 期货行情快照
+            
+        Returns:
+            搜索索引
+        """
+        return SearchIndex(df, self._format_search_result)
+    
+    @staticmethod
+    def _format_search_result(row: Dict[str, Any]) -> Dict[str, Any]:
+        """格式化单条搜索结果并处理 NaN 值"""
+        return {
+            'name': row['name'] if pd.notna(row['name']) else '',
+            'symbol': str(row['symbol']) if pd.notna(row['symbol']) else '',
+            'price': float(row['price']) if pd.notna(row['price']) else 0.0,
+            'exchange': str(row['exchange']) if pd.notna(row['exchange']) else '',
+            'type': str(row['type']) if pd.notna(row['type']) else ''
+        }
+    
     def _get_futures_list(self) -> pd.DataFrame:
         """
         获取期货列表（同步方法，将被异步方法调用）
@@ -70,7 +78,7 @@ class FuturesServiceAsync:
         Returns:
             包含期货列表的DataFrame
         """
-        import akshare as ak
+        data_source = get_data_source()
         
         try:
             # 获取期货合约信息
@@ -79,7 +87,7 @@ class FuturesServiceAsync:
             
             # 上海期货交易所
             try:
-                shfe_df = ak.futures_zh_spot("shfe")
+                shfe_df = get_upstream_gateway().call(SOURCE_SINA, data_source.futures_zh_spot, "shfe")
                 shfe_df['exchange'] = '上期所'
                 shfe_df['type'] = '商品期货'
                 dfs.append(shfe_df)
@@ -88,7 +96,7 @@ class FuturesServiceAsync:
             
             # 大连商品交易所
             try:
-                dce_df = ak.futures_zh_spot("dce")
+                dce_df = get_upstream_gateway().call(SOURCE_SINA, data_source.futures_zh_spot, "dce")
                 dce_df['exchange'] = '大商所'
                 dce_df['type'] = '商品期货'
                 dfs.append(dce_df)
@@ -97,7 +105,7 @@ class FuturesServiceAsync:
             
             # 郑州商品交易所
             try:
-                czce_df = ak.futures_zh_spot("czce")
+                czce_df = get_upstream_gateway().call(SOURCE_SINA, data_source.futures_zh_spot, "czce")
                 czce_df['exchange'] = '郑商所'
                 czce_df['type'] = '商品期货'
                 dfs.append(czce_df)
@@ -106,7 +114,7 @@ class FuturesServiceAsync:
             
             # 中国金融期货交易所
             try:
-                cffex_df = ak.futures_zh_spot("cffex")
+                cffex_df = get_upstream_gateway().call(SOURCE_SINA, data_source.futures_zh_spot, "cffex")
                 cffex_df['exchange'] = '中金所'
                 cffex_df['type'] = '金融期货'
                 dfs.append(cffex_df)
@@ -157,8 +165,8 @@ class FuturesServiceAsync:
         try:
             logger.info(f"获取期货详情: {symbol}")
             
-            # 使用线程池执行同步的akshare调用
-            df = await asyncio.to_thread(self._get_futures_list)
+            # 读取行情快照
+            df = await self._snapshot.get()
             
             # 精确匹配期货代码
             result = df[df['symbol'] == symbol]
@@ -210,8 +218,8 @@ class FuturesServiceAsync:
         try:
             logger.info("获取主力合约列表")
             
-            # 使用线程池执行同步的akshare调用
-            df = await asyncio.to_thread(self._get_main_contract_list)
+            # 在上游网关线程池中执行同步的akshare调用
+            df = await get_upstream_gateway().run(self._get_main_contract_list)
             
             # 格式化返回结果
             formatted_results = []
@@ -240,11 +248,11 @@ class FuturesServiceAsync:
         Returns:
             包含主力合约列表的DataFrame
         """
-        import akshare as ak
+        data_source = get_data_source()
         
         try:
             # 获取主力合约信息
-            df = ak.futures_main_sina()
+            df = get_upstream_gateway().call(SOURCE_SINA, data_source.futures_main_sina)
             
             # 添加交易所和类型信息
             df['exchange'] = ''
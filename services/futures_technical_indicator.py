@@ -3,10 +3,35 @@ import numpy as np
 from typing import Dict, Optional, Any, Tuple
 from utils.logger import get_logger
 from services.technical_indicator import TechnicalIndicator
+from services.indicator_cache import get_indicator_cache
+from utils.compute_pool import get_compute_pool
 
 # 获取日志器
 logger = get_logger()
 
+# 计算期货技术指标所需的价格列
+FUTURES_PRICE_COLUMNS = ['Open', 'High', 'Low', 'Close', 'Volume', 'OpenInterest']
+
+
+def compute_futures_indicator_arrays(params: Dict[str, Any], futures_params: Dict[str, Any],
+                                     arrays: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+    """
+    对单个期货的价格数组计算全部期货技术指标（可在计算进程池中执行）
+    
+    Args:
+        params: 基础技术指标参数
+        futures_params: 期货特有指标参数
+        arrays: 价格列名到一维数组的映射
+        
+    Returns:
+        指标列名到一维数组的映射
+    """
+    indicator = FuturesTechnicalIndicator(params)
+    indicator.futures_params = futures_params
+    result_df = indicator.calculate_futures_indicators(pd.DataFrame(arrays))
+    return {name: result_df[name].to_numpy() for name in result_df.columns if name not in arrays}
+
+
 class FuturesTechnicalIndicator(TechnicalIndicator):
     """
     期货技术指标计算服务
@@ -288,6 +313,51 @@ class FuturesTechnicalIndicator(TechnicalIndicator):
             logger.exception(e)
             raise
     
+    def calculate_futures_indicators_cached(self, df: pd.DataFrame, futures_code: str) -> pd.DataFrame:
+        """
+        计算所有期货技术指标，优先使用进程级缓存中的结果
+        
+        Args:
+            df: 原始价格数据
+            futures_code: 期货代码
+            
+        Returns:
+            添加了技术指标的DataFrame（可能与其他请求共享，调用方不应修改）
+        """
+        params = {'base': self.params, 'futures': self.futures_params}
+        return get_indicator_cache().get_or_compute(
+            'futures', futures_code, 'FUTURES', df, params, self.calculate_futures_indicators
+        )
+    
+    async def calculate_futures_indicators_async(self, df: pd.DataFrame, futures_code: str) -> pd.DataFrame:
+        """
+        计算所有期货技术指标，与calculate_futures_indicators_cached相同，但计算在计算进程池中执行，不阻塞事件循环
+        
+        Args:
+            df: 原始价格数据
+            futures_code: 期货代码
+            
+        Returns:
+            添加了技术指标的DataFrame（可能与其他请求共享，调用方不应修改）
+        """
+        if df is None or df.empty:
+            return self.calculate_futures_indicators(df)
+        
+        params = {'base': self.params, 'futures': self.futures_params}
+        cache = get_indicator_cache()
+        key = cache.make_key('futures', futures_code, 'FUTURES', df, params)
+        cached = cache.get(key)
+        if cached is not None:
+            return cached
+        
+        arrays = {name: df[name].to_numpy(dtype=float) for name in FUTURES_PRICE_COLUMNS if name in df.columns}
+        indicators = await get_compute_pool().run(
+            compute_futures_indicator_arrays, self.params, self.futures_params, arrays
+        )
+        result = self._attach_indicators(df, indicators)
+        cache.put(key, result)
+        return result
+    
     def calculate_term_structure(self, near_contract_df: pd.DataFrame, far_contract_df: pd.DataFrame) -> pd.DataFrame:
         """
         计算期限结构指标
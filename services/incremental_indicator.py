@@ -0,0 +1,465 @@
+import os
+import json
+import math
+import threading
+import pandas as pd
+from collections import OrderedDict, deque
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+from utils.logger import get_logger
+
+# 获取日志器
+logger = get_logger()
+
+NAN = float('nan')
+
+
+class RollingWindow:
+    """
+    定长滚动窗口
+    只保存最近 period-1 个已确认的值及其和、平方和，加上当前（可能仍在变化的）最新值即可O(1)得到均值和标准差
+    """
+
+    # 累加若干次后按窗口内的值重新求和，避免浮点误差累积
+    RESUM_INTERVAL = 1000
+
+    def __init__(self, period: int):
+        self.period = period
+        self.values: deque = deque(maxlen=max(period - 1, 0))
+        self.total = 0.0
+        self.total_sq = 0.0
+        self.nan_count = 0
+        self._pushes = 0
+
+    def push(self, x: float) -> None:
+        """确认一个新值进入窗口"""
+        if self.period <= 1:
+            return
+        if len(self.values) == self.values.maxlen:
+            self._discard(self.values[0])
+        self.values.append(x)
+        if math.isnan(x):
+            self.nan_count += 1
+        else:
+            self.total += x
+            self.total_sq += x * x
+
+        self._pushes += 1
+        if self._pushes >= self.RESUM_INTERVAL:
+            self._pushes = 0
+            finite = [v for v in self.values if not math.isnan(v)]
+            self.total = math.fsum(finite)
+            self.total_sq = math.fsum(v * v for v in finite)
+
+    def _discard(self, x: float) -> None:
+        if math.isnan(x):
+            self.nan_count -= 1
+        else:
+            self.total -= x
+            self.total_sq -= x * x
+
+    def _ready(self, x: float) -> bool:
+        return len(self.values) == self.period - 1 and self.nan_count == 0 and not math.isnan(x)
+
+    def mean_with(self, x: float) -> float:
+        """包含最新值x时的窗口均值，数据不足或含NaN时为NaN"""
+        if not self._ready(x):
+            return NAN
+        return (self.total + x) / self.period
+
+    def std_with(self, x: float) -> float:
+        """包含最新值x时的窗口样本标准差(ddof=1)"""
+        if self.period < 2 or not self._ready(x):
+            return NAN
+        total = self.total + x
+        variance = (self.total_sq + x * x - total * total / self.period) / (self.period - 1)
+        return math.sqrt(max(variance, 0.0))
+
+
+class IncrementalIndicatorState:
+    """
+    单个标的的技术指标增量计算状态
+    状态分为两部分：截至倒数第二根K线的已确认状态（滚动窗口、EMA），以及最新一根K线。
+    新增K线时先确认最新K线再替换为新K线；盘中最新K线变化时只需替换，各指标均为O(1)更新，
+    计算口径与TechnicalIndicator.calculate_indicators一致
+    """
+
+    def __init__(self, params: Dict[str, Any]):
+        self.params = params
+        self.close_windows: Dict[int, RollingWindow] = {}
+        for period in list(params['ma_periods'].values()) + [params['bollinger_period'], 20]:
+            self.close_windows.setdefault(period, RollingWindow(period))
+        self.gain_window = RollingWindow(params['rsi_period'])
+        self.loss_window = RollingWindow(params['rsi_period'])
+        self.volume_window = RollingWindow(params['volume_ma_period'])
+        self.tr_window = RollingWindow(params['atr_period'])
+
+        # 已确认部分的EMA和前收盘价
+        self.ema12 = NAN
+        self.ema26 = NAN
+        self.signal = NAN
+        self.prev_close = NAN
+
+        # 最新一根K线 (Close, High, Low, Volume)
+        self.last_bar: Optional[Tuple[float, float, float, float]] = None
+
+    @classmethod
+    def from_result(cls, result_df: pd.DataFrame, params: Dict[str, Any]) -> "IncrementalIndicatorState":
+        """
+        由完整计算得到的指标DataFrame重建状态
+
+        滚动窗口只需最近若干根K线；EMA状态由收盘价序列向量化计算一次得到
+
+        Args:
+            result_df: calculate_indicators的输出
+            params: 指标参数
+
+        Returns:
+            指向result_df最新K线的增量状态
+        """
+        state = cls(params)
+        close = result_df['Close'].astype(float)
+        committed = result_df.iloc[:-1]
+
+        if len(committed) > 0:
+            ema12 = close.iloc[:-1].ewm(span=12, adjust=False).mean()
+            ema26 = close.iloc[:-1].ewm(span=26, adjust=False).mean()
+            state.ema12 = float(ema12.iloc[-1])
+            state.ema26 = float(ema26.iloc[-1])
+            state.signal = float(result_df['Signal'].iloc[-2])
+
+            # 只回放各窗口需要的尾部K线
+            longest = max([w.period for w in state.close_windows.values()] +
+                          [params['rsi_period'], params['volume_ma_period'], params['atr_period']])
+            tail = committed.iloc[-(longest + 1):]
+            prev_close = NAN
+            for close_value, high, low, volume in tail[['Close', 'High', 'Low', 'Volume']].itertuples(index=False):
+                state._push_bar(float(close_value), float(high), float(low), float(volume), prev_close)
+                prev_close = float(close_value)
+            state.prev_close = prev_close
+
+        latest = result_df.iloc[-1]
+        state.last_bar = (float(latest['Close']), float(latest['High']), float(latest['Low']), float(latest['Volume']))
+        return state
+
+    @staticmethod
+    def _true_range(high: float, low: float, prev_close: float) -> float:
+        """真实波幅，三者中取最大的有效值"""
+        candidates = [v for v in (high - low, abs(high - prev_close), abs(low - prev_close)) if not math.isnan(v)]
+        return max(candidates) if candidates else NAN
+
+    @staticmethod
+    def _gain_loss(close: float, prev_close: float) -> Tuple[float, float]:
+        """与calculate_rsi一致：无前收盘价时涨跌记为0"""
+        delta = close - prev_close
+        if math.isnan(delta):
+            return 0.0, 0.0
+        return (delta, 0.0) if delta > 0 else (0.0, -delta if delta < 0 else 0.0)
+
+    @staticmethod
+    def _divide(numerator: float, denominator: float) -> float:
+        """与pandas除法一致：除以0得到inf，0/0得到NaN"""
+        if denominator == 0:
+            if numerator == 0 or math.isnan(numerator):
+                return NAN
+            return math.copysign(math.inf, numerator)
+        return numerator / denominator
+
+    @staticmethod
+    def _ema_step(prev: float, x: float, period: int) -> float:
+        """adjust=False的EMA递推，从第一个有效值开始"""
+        if math.isnan(prev):
+            return x
+        if math.isnan(x):
+            return prev
+        alpha = 2.0 / (period + 1)
+        return alpha * x + (1 - alpha) * prev
+
+    def _push_bar(self, close: float, high: float, low: float, volume: float, prev_close: float) -> None:
+        """将一根K线确认进滚动窗口"""
+        for window in self.close_windows.values():
+            window.push(close)
+        gain, loss = self._gain_loss(close, prev_close)
+        self.gain_window.push(gain)
+        self.loss_window.push(loss)
+        self.volume_window.push(volume)
+        self.tr_window.push(self._true_range(high, low, prev_close))
+
+    def _commit_last(self) -> None:
+        """确认最新K线：写入滚动窗口并推进EMA"""
+        close, high, low, volume = self.last_bar
+        self._push_bar(close, high, low, volume, self.prev_close)
+        self.ema12 = self._ema_step(self.ema12, close, 12)
+        self.ema26 = self._ema_step(self.ema26, close, 26)
+        self.signal = self._ema_step(self.signal, self.ema12 - self.ema26, 9)
+        self.prev_close = close
+
+    def append(self, close: float, high: float, low: float, volume: float) -> Dict[str, float]:
+        """
+        追加一根新K线
+
+        Returns:
+            新K线上的各指标值
+        """
+        if self.last_bar is not None:
+            self._commit_last()
+        self.last_bar = (close, high, low, volume)
+        return self.values()
+
+    def replace_last(self, close: float, high: float, low: float, volume: float) -> Dict[str, float]:
+        """
+        替换最新一根K线（盘中刷新）
+
+        Returns:
+            最新K线上的各指标值
+        """
+        self.last_bar = (close, high, low, volume)
+        return self.values()
+
+    def values(self) -> Dict[str, float]:
+        """计算最新K线上的各指标值，列名和顺序与calculate_indicators一致"""
+        close, high, low, volume = self.last_bar
+        params = self.params
+        result: Dict[str, float] = {}
+
+        # 移动平均线
+        for name, period in params['ma_periods'].items():
+            result[f'MA{period}'] = self.close_windows[period].mean_with(close)
+
+        # RSI
+        gain, loss = self._gain_loss(close, self.prev_close)
+        avg_gain = self.gain_window.mean_with(gain)
+        avg_loss = self.loss_window.mean_with(loss)
+        if math.isnan(avg_gain) or math.isnan(avg_loss):
+            result['RSI'] = NAN
+        elif avg_loss == 0:
+            result['RSI'] = NAN if avg_gain == 0 else 100.0
+        else:
+            result['RSI'] = 100 - (100 / (1 + avg_gain / avg_loss))
+
+        # MACD
+        ema12 = self._ema_step(self.ema12, close, 12)
+        ema26 = self._ema_step(self.ema26, close, 26)
+        macd = ema12 - ema26
+        signal = self._ema_step(self.signal, macd, 9)
+        result['MACD'] = macd
+        result['Signal'] = signal
+        result['Histogram'] = macd - signal
+
+        # 布林带
+        bollinger = self.close_windows[params['bollinger_period']]
+        middle = bollinger.mean_with(close)
+        std = bollinger.std_with(close)
+        result['BB_Middle'] = middle
+        result['BB_Upper'] = middle + params['bollinger_std'] * std
+        result['BB_Lower'] = middle - params['bollinger_std'] * std
+
+        # 成交量移动平均及比率
+        volume_ma = self.volume_window.mean_with(volume)
+        result['Volume_MA'] = volume_ma
+        result['Volume_Ratio'] = self._divide(volume, volume_ma)
+
+        # ATR
+        result['ATR'] = self.tr_window.mean_with(self._true_range(high, low, self.prev_close))
+
+        # 波动率 (过去20天收盘价的标准差/均值)
+        window20 = self.close_windows[20]
+        mean20 = window20.mean_with(close)
+        result['Volatility'] = self._divide(window20.std_with(close), mean20) * 100
+
+        return result
+
+
+class IncrementalIndicatorEngine:
+    """
+    技术指标增量更新引擎
+    按标的保存最近一次的指标结果和增量状态。新数据与上次结果只相差最新一根K线（新增或盘中变化）时，
+    各指标O(1)更新后追加到上次的结果上，无需对全部历史重新计算滚动窗口
+    """
+
+    def __init__(self, max_symbols: Optional[int] = None):
+        """
+        初始化增量更新引擎
+
+        Args:
+            max_symbols: 最多保存状态的标的数，默认为环境变量INCREMENTAL_INDICATOR_MAX_SYMBOLS（默认5000）
+        """
+        if max_symbols is None:
+            max_symbols = int(os.getenv('INCREMENTAL_INDICATOR_MAX_SYMBOLS', 5000))
+
+        self.max_symbols = max_symbols
+
+        # 键 -> [指标结果DataFrame, 增量状态(首次增量更新时才构建)]
+        self._entries: "OrderedDict[Hashable, list]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        # 统计计数
+        self.appends = 0
+        self.replacements = 0
+        self.full_computes = 0
+
+        logger.debug(f"初始化IncrementalIndicatorEngine: 最多{max_symbols}个标的")
+
+    @staticmethod
+    def make_key(kind: str, symbol: str, market_type: str, params: Dict[str, Any]) -> Tuple:
+        """生成状态键"""
+        return kind, market_type, symbol, json.dumps(params, sort_keys=True, default=str)
+
+    def calculate(self, kind: str, symbol: str, market_type: str, df: pd.DataFrame, params: Dict[str, Any],
+                  compute: Callable[[pd.DataFrame], pd.DataFrame]) -> pd.DataFrame:
+        """
+        计算技术指标：能增量更新时O(1)更新最新K线，否则调用compute完整计算并记录结果
+
+        Args:
+            kind: 指标类型
+            symbol: 代码
+            market_type: 市场类型
+            df: 原始价格数据
+            params: 指标参数
+            compute: 完整计算函数
+
+        Returns:
+            添加了技术指标的DataFrame
+        """
+        result = self.update(kind, symbol, market_type, df, params)
+        if result is not None:
+            return result
+
+        result = compute(df)
+        self.record(kind, symbol, market_type, params, result)
+        return result
+
+    def update(self, kind: str, symbol: str, market_type: str, df: pd.DataFrame,
+               params: Dict[str, Any]) -> Optional[pd.DataFrame]:
+        """
+        尝试在上次结果的基础上增量更新
+
+        Returns:
+            更新后的指标DataFrame，没有可用的上次结果或无法增量更新时返回None
+        """
+        key = self.make_key(kind, symbol, market_type, params)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+            return self._try_update(entry, df, params)
+
+    def record(self, kind: str, symbol: str, market_type: str, params: Dict[str, Any], result: pd.DataFrame) -> None:
+        """
+        记录一次完整计算的结果，作为之后增量更新的起点（状态在首次增量更新时才构建）
+
+        Args:
+            kind: 指标类型
+            symbol: 代码
+            market_type: 市场类型
+            params: 指标参数
+            result: 完整计算得到的指标DataFrame
+        """
+        if result is None or len(result) < 2:
+            return
+        key = self.make_key(kind, symbol, market_type, params)
+        with self._lock:
+            self.full_computes += 1
+            self._entries[key] = [result, None]
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_symbols:
+                self._entries.popitem(last=False)
+
+    def _try_update(self, entry: list, df: pd.DataFrame, params: Dict[str, Any]) -> Optional[pd.DataFrame]:
+        """
+        尝试在上次结果的基础上增量更新（调用方需持有锁）
+
+        支持三种情况：最新K线盘中变化；新增一根K线；上一根K线收盘定格后又新增一根K线。
+        请求区间的起点可以后移（按日期滚动的数据区间），结果截取到新的起点。
+
+        Returns:
+            更新后的指标DataFrame，无法增量更新时返回None
+        """
+        previous, state = entry
+        if df is None or len(df) < 3 or df.index[0] < previous.index[0]:
+            return None
+
+        columns = ['Close', 'High', 'Low', 'Volume']
+        # 只取尾部几根K线，避免复制整段历史
+        bars = df.iloc[-3:][columns].to_numpy(dtype=float)
+        previous_bars = previous.iloc[-2:][columns].to_numpy(dtype=float)
+
+        def same_bar(position: int, previous_position: int) -> bool:
+            return df.index[position] == previous.index[previous_position] and \
+                (bars[position] == previous_bars[previous_position]).all()
+
+        if df.index[-1] == previous.index[-1] and same_bar(-2, -2):
+            # 最新K线盘中变化
+            changed = [(-1, 'replace')]
+            base = previous.iloc[:-1]
+        elif df.index[-2] == previous.index[-1] and same_bar(-3, -2):
+            # 新增一根K线；若上一根K线在上次计算后仍有变化，先替换再追加
+            if same_bar(-2, -1):
+                changed = [(-1, 'append')]
+                base = previous
+            else:
+                changed = [(-2, 'replace'), (-1, 'append')]
+                base = previous.iloc[:-1]
+        else:
+            return None
+
+        if state is None:
+            state = IncrementalIndicatorState.from_result(previous, params)
+            entry[1] = state
+
+        new_rows = []
+        for position, action in changed:
+            close, high, low, volume = bars[position]
+            if action == 'append':
+                values = state.append(close, high, low, volume)
+                self.appends += 1
+            else:
+                values = state.replace_last(close, high, low, volume)
+                self.replacements += 1
+            new_rows.append({**df.iloc[position].to_dict(), **values})
+
+        new_index = df.index[-len(new_rows):]
+        result = pd.concat([base, pd.DataFrame(new_rows, index=new_index, columns=previous.columns)])
+        if df.index[0] != result.index[0]:
+            result = result.loc[df.index[0]:]
+        if len(result) != len(df):
+            # 中间K线不一致（如数据修订），放弃增量结果
+            entry[1] = None
+            return None
+
+        entry[0] = result
+        return result
+
+    def stats(self) -> Dict[str, Any]:
+        """获取统计信息"""
+        return {
+            'symbols': len(self._entries),
+            'appends': self.appends,
+            'replacements': self.replacements,
+            'full_computes': self.full_computes
+        }
+
+
+# 进程级单例
+_incremental_engine: Optional[IncrementalIndicatorEngine] = None
+_incremental_engine_initialized = False
+_incremental_engine_guard = threading.Lock()
+
+
+def get_incremental_indicator_engine() -> Optional[IncrementalIndicatorEngine]:
+    """
+    获取进程级技术指标增量更新引擎
+
+    环境变量INCREMENTAL_INDICATOR_ENABLED为false时返回None
+    """
+    global _incremental_engine, _incremental_engine_initialized
+
+    if _incremental_engine_initialized:
+        return _incremental_engine
+
+    with _incremental_engine_guard:
+        if not _incremental_engine_initialized:
+            if os.getenv('INCREMENTAL_INDICATOR_ENABLED', 'true').lower() == 'true':
+                _incremental_engine = IncrementalIndicatorEngine()
+            _incremental_engine_initialized = True
+    return _incremental_engine
@@ -0,0 +1,193 @@
+import os
+import json
+import time
+import threading
+import pandas as pd
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+from utils.logger import get_logger
+
+# 获取日志器
+logger = get_logger()
+
+
+class IndicatorCache:
+    """
+    技术指标结果缓存
+    进程内共享的LRU缓存，按DataFrame占用的内存字节数淘汰，并支持TTL过期
+    """
+
+    def __init__(self, max_bytes: Optional[int] = None, ttl_seconds: Optional[float] = None):
+        """
+        初始化技术指标结果缓存
+
+        Args:
+            max_bytes: 缓存占用内存上限（字节），默认为环境变量INDICATOR_CACHE_MAX_MB（默认256MB）
+            ttl_seconds: 缓存项存活时间（秒），默认为环境变量INDICATOR_CACHE_TTL（默认3600秒）
+        """
+        if max_bytes is None:
+            max_bytes = int(float(os.getenv('INDICATOR_CACHE_MAX_MB', 256)) * 1024 * 1024)
+        if ttl_seconds is None:
+            ttl_seconds = float(os.getenv('INDICATOR_CACHE_TTL', 3600))
+
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+
+        # 键 -> (DataFrame, 字节数, 过期时间戳)
+        self._entries: "OrderedDict[Hashable, Tuple[pd.DataFrame, int, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._current_bytes = 0
+
+        # 统计计数
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        logger.debug(f"初始化IndicatorCache: 内存上限={self.max_bytes}字节, TTL={self.ttl_seconds}秒")
+
+    @staticmethod
+    def make_key(kind: str, symbol: str, market_type: str, df: pd.DataFrame, params: Dict[str, Any]) -> Tuple:
+        """
+        生成缓存键
+
+        除代码、市场和最新K线日期外，还包含数据长度、首根K线日期以及最新K线的收盘价和成交量，
+        保证盘中最新K线变化或请求区间不同时不会命中旧结果
+
+        Args:
+            kind: 指标类型，如'stock'或'futures'
+            symbol: 代码
+            market_type: 市场类型
+            df: 原始价格数据
+            params: 指标参数
+
+        Returns:
+            缓存键元组
+        """
+        latest = df.iloc[-1]
+        return (
+            kind,
+            market_type,
+            symbol,
+            len(df),
+            str(df.index[0]),
+            str(df.index[-1]),
+            float(latest.get('Close', 0)),
+            float(latest.get('Volume', 0)),
+            json.dumps(params, sort_keys=True, default=str)
+        )
+
+    def get(self, key: Hashable) -> Optional[pd.DataFrame]:
+        """
+        读取缓存，命中时将该项移动到最近使用位置
+
+        Returns:
+            缓存的DataFrame（调用方不应修改），未命中返回None
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            df, size, expires_at = entry
+            if expires_at < time.monotonic():
+                self._remove(key)
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return df
+
+    def put(self, key: Hashable, df: pd.DataFrame) -> None:
+        """
+        写入缓存，超出内存上限时按LRU顺序淘汰
+        """
+        size = int(df.memory_usage(index=True, deep=True).sum())
+        if size > self.max_bytes:
+            logger.debug(f"指标结果过大({size}字节)，不写入缓存")
+            return
+
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+
+            self._entries[key] = (df, size, time.monotonic() + self.ttl_seconds)
+            self._current_bytes += size
+
+            while self._current_bytes > self.max_bytes and self._entries:
+                oldest_key = next(iter(self._entries))
+                self._remove(oldest_key)
+                self.evictions += 1
+
+    def get_or_compute(self, kind: str, symbol: str, market_type: str, df: pd.DataFrame,
+                       params: Dict[str, Any], compute: Callable[[pd.DataFrame], pd.DataFrame]) -> pd.DataFrame:
+        """
+        读取缓存的指标结果，未命中时调用compute计算并写入缓存
+
+        Args:
+            kind: 指标类型
+            symbol: 代码
+            market_type: 市场类型
+            df: 原始价格数据
+            params: 指标参数
+            compute: 指标计算函数
+
+        Returns:
+            添加了技术指标的DataFrame
+        """
+        if df is None or df.empty:
+            return compute(df)
+
+        key = self.make_key(kind, symbol, market_type, df, params)
+        cached = self.get(key)
+        if cached is not None:
+            logger.debug(f"技术指标缓存命中: {market_type} {symbol}")
+            return cached
+
+        result = compute(df)
+        self.put(key, result)
+        return result
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        获取缓存统计信息
+        """
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'bytes': self._current_bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_ratio': self.hits / total if total else 0.0
+            }
+
+    def clear(self) -> None:
+        """清空缓存"""
+        with self._lock:
+            self._entries.clear()
+            self._current_bytes = 0
+
+    def _remove(self, key: Hashable) -> None:
+        """移除缓存项（调用方需持有锁）"""
+        _, size, _ = self._entries.pop(key)
+        self._current_bytes -= size
+
+
+# 进程级单例
+_indicator_cache: Optional[IndicatorCache] = None
+_indicator_cache_guard = threading.Lock()
+
+
+def get_indicator_cache() -> IndicatorCache:
+    """获取进程级技术指标结果缓存"""
+    global _indicator_cache
+
+    if _indicator_cache is None:
+        with _indicator_cache_guard:
+            if _indicator_cache is None:
+                _indicator_cache = IndicatorCache()
+    return _indicator_cache
@@ -0,0 +1,258 @@
+import os
+import json
+import time
+import asyncio
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import List, Optional, Tuple
+from urllib.parse import urlsplit, urlunsplit
+from utils.logger import get_logger
+
+# 获取日志器
+logger = get_logger()
+
+# 项目根目录
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class MemoryResultBackend:
+    """
+    内存存储后端
+    进程内LRU字典，按条目数淘汰
+    """
+
+    # 读写不阻塞，可直接在事件循环中调用
+    blocking = False
+
+    def __init__(self, max_entries: int = 1000):
+        self.max_entries = max_entries
+        # 键 -> (值, 过期时间戳)
+        self._entries: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at < time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def put(self, key: str, value: str, expires_at: float) -> None:
+        with self._lock:
+            self._entries[key] = (value, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class SQLiteResultBackend:
+    """
+    SQLite存储后端
+    结果持久化到本地文件，进程重启后仍然有效，并可在同一主机的多个worker之间共享
+    """
+
+    # 读写为同步的磁盘I/O，需放到线程中执行
+    blocking = True
+
+    def __init__(self, path: str, max_entries: int = 1000):
+        self.path = path
+        self.max_entries = max_entries
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=5)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS llm_results ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL, created_at REAL NOT NULL)"
+        )
+        self._conn.commit()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value FROM llm_results WHERE key = ? AND expires_at >= ?", (key, time.time())
+            ).fetchone()
+        return row[0] if row else None
+
+    def put(self, key: str, value: str, expires_at: float) -> None:
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO llm_results (key, value, expires_at, created_at) VALUES (?, ?, ?, ?)",
+                (key, value, expires_at, now)
+            )
+            # 清理过期条目，并只保留最新的max_entries条
+            self._conn.execute("DELETE FROM llm_results WHERE expires_at < ?", (now,))
+            self._conn.execute(
+                "DELETE FROM llm_results WHERE key NOT IN "
+                "(SELECT key FROM llm_results ORDER BY created_at DESC LIMIT ?)",
+                (self.max_entries,)
+            )
+            self._conn.commit()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM llm_results")
+            self._conn.commit()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM llm_results").fetchone()[0]
+
+
+class LLMResultCache:
+    """
+    AI分析结果缓存
+    以 (API地址, 模型, 提示词) 的哈希为键保存完整的分析内容片段，命中时按原片段回放，
+    缓存在交易日切换时过期
+    """
+
+    def __init__(self, backend, rollover_hour: Optional[int] = None):
+        """
+        初始化AI分析结果缓存
+
+        Args:
+            backend: 存储后端，MemoryResultBackend或SQLiteResultBackend
+            rollover_hour: 交易日切换的整点（本地时间），默认为环境变量LLM_CACHE_ROLLOVER_HOUR（默认9点，即A股开盘前）
+        """
+        if rollover_hour is None:
+            rollover_hour = int(os.getenv('LLM_CACHE_ROLLOVER_HOUR', 9))
+
+        self.backend = backend
+        self.rollover_hour = rollover_hour
+
+        # 统计计数
+        self.hits = 0
+        self.misses = 0
+
+        logger.debug(f"初始化LLMResultCache: 后端={type(backend).__name__}, 交易日切换时间={rollover_hour}点")
+
+    @staticmethod
+    def make_key(api_url: str, model: str, prompt: str) -> str:
+        """
+        生成缓存键
+
+        提示词中已包含代码、技术指标概要和近期K线，指标快照不同时键自然不同；
+        不同的OpenAI兼容服务可能使用相同的模型名，API地址也计入键中
+
+        Args:
+            api_url: 请求的API地址
+            model: 模型名
+            prompt: 提示词
+        """
+        parts = urlsplit(api_url.strip())
+        api_url = urlunsplit((parts.scheme.lower(), parts.netloc.lower(), parts.path.rstrip('/'), parts.query, ''))
+        return hashlib.sha256(f"{api_url}\n{model}\n{prompt}".encode('utf-8')).hexdigest()
+
+    def expires_at(self, now: Optional[datetime] = None) -> float:
+        """计算当前交易日结束（下一次交易日切换）的时间戳"""
+        now = now or datetime.now()
+        rollover = now.replace(hour=self.rollover_hour, minute=0, second=0, microsecond=0)
+        if rollover <= now:
+            rollover += timedelta(days=1)
+        return rollover.timestamp()
+
+    async def _run_backend(self, func, *args):
+        """调用存储后端，阻塞的后端在线程中执行，避免阻塞事件循环"""
+        if self.backend.blocking:
+            return await asyncio.to_thread(func, *args)
+        return func(*args)
+
+    async def get(self, key: str) -> Optional[List[str]]:
+        """
+        读取缓存的分析内容片段
+
+        Returns:
+            内容片段列表，未命中返回None
+        """
+        try:
+            value = await self._run_backend(self.backend.get, key)
+        except Exception as e:
+            logger.warning(f"读取AI分析结果缓存失败: {str(e)}")
+            value = None
+
+        if value is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        return json.loads(value)
+
+    async def put(self, key: str, fragments: List[str]) -> None:
+        """写入完整的分析内容片段"""
+        if not fragments:
+            return
+        try:
+            value = json.dumps(fragments, ensure_ascii=False)
+            await self._run_backend(self.backend.put, key, value, self.expires_at())
+        except Exception as e:
+            logger.warning(f"写入AI分析结果缓存失败: {str(e)}")
+
+    def stats(self) -> dict:
+        """获取缓存统计信息"""
+        total = self.hits + self.misses
+        return {
+            'backend': type(self.backend).__name__,
+            'entries': len(self.backend),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': self.hits / total if total else 0.0
+        }
+
+
+# 进程级单例
+_llm_cache: Optional[LLMResultCache] = None
+_llm_cache_initialized = False
+_llm_cache_guard = threading.Lock()
+
+
+def get_llm_result_cache() -> Optional[LLMResultCache]:
+    """
+    获取进程级AI分析结果缓存
+
+    由环境变量LLM_CACHE_BACKEND选择后端：memory（默认）、sqlite或none（禁用，返回None）
+    """
+    global _llm_cache, _llm_cache_initialized
+
+    if _llm_cache_initialized:
+        return _llm_cache
+
+    with _llm_cache_guard:
+        if _llm_cache_initialized:
+            return _llm_cache
+
+        backend_name = os.getenv('LLM_CACHE_BACKEND', 'memory').lower()
+        max_entries = int(os.getenv('LLM_CACHE_MAX_ENTRIES', 1000))
+
+        try:
+            if backend_name == 'memory':
+                _llm_cache = LLMResultCache(MemoryResultBackend(max_entries))
+            elif backend_name == 'sqlite':
+                path = os.getenv('LLM_CACHE_PATH') or os.path.join(PROJECT_ROOT, 'data', 'llm_cache.sqlite3')
+                _llm_cache = LLMResultCache(SQLiteResultBackend(path, max_entries))
+            elif backend_name == 'none':
+                logger.info("AI分析结果缓存已禁用")
+            else:
+                logger.warning(f"未知的AI分析结果缓存后端: {backend_name}，缓存已禁用")
+        except Exception as e:
+            logger.error(f"初始化AI分析结果缓存失败: {str(e)}")
+            _llm_cache = None
+
+        _llm_cache_initialized = True
+        return _llm_cache
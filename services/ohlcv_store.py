@@ -0,0 +1,231 @@
+import os
+import json
+import threading
+import importlib.util
+import pandas as pd
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple, Any
+from utils.logger import get_logger
+
+# 获取日志器
+logger = get_logger()
+
+# 项目根目录
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class OHLCVStore:
+    """
+    本地K线数据存储
+    按 市场类型/复权方式/代码 将历史行情以Parquet列式文件持久化到磁盘，
+    并配合元数据记录已覆盖的起始日期和最近一次向上游核对的时间
+    """
+
+    def __init__(self, base_dir: Optional[str] = None, refresh_minutes: Optional[int] = None):
+        """
+        初始化本地K线数据存储
+
+        Args:
+            base_dir: 存储根目录，默认为环境变量OHLCV_STORE_DIR或项目下的data/ohlcv
+            refresh_minutes: 两次向上游补齐尾部数据的最小间隔（分钟），默认为环境变量OHLCV_REFRESH_MINUTES或30
+        """
+        self.base_dir = base_dir or os.getenv('OHLCV_STORE_DIR') or os.path.join(PROJECT_ROOT, 'data', 'ohlcv')
+        if refresh_minutes is None:
+            refresh_minutes = int(os.getenv('OHLCV_REFRESH_MINUTES', 30))
+        self.refresh_interval = timedelta(minutes=refresh_minutes)
+
+        # 每个存储键一把锁，避免同一代码的并发读写相互覆盖
+        self._locks: Dict[str, threading.Lock] = {}
+        self._locks_guard = threading.Lock()
+
+        os.makedirs(self.base_dir, exist_ok=True)
+        logger.debug(f"初始化OHLCVStore: 目录={self.base_dir}, 刷新间隔={self.refresh_interval}")
+
+    def _key(self, market_type: str, code: str, adjust: str) -> str:
+        """生成存储键"""
+        return f"{market_type}/{adjust}/{code}"
+
+    def _paths(self, market_type: str, code: str, adjust: str) -> Tuple[str, str]:
+        """
+        获取数据文件和元数据文件路径
+
+        Returns:
+            (数据文件路径, 元数据文件路径)的元组
+        """
+        # 代码中可能包含路径分隔符等字符，统一替换
+        safe_code = ''.join(c if c.isalnum() or c in '._-' else '_' for c in str(code))
+        directory = os.path.join(self.base_dir, market_type, adjust or 'none')
+        return (
+            os.path.join(directory, f"{safe_code}.parquet"),
+            os.path.join(directory, f"{safe_code}.json")
+        )
+
+    def list_codes(self, market_type: str, adjust: str) -> List[str]:
+        """
+        列出本地已存储的代码（文件名中的特殊字符已被替换）
+
+        Args:
+            market_type: 市场类型
+            adjust: 复权方式
+
+        Returns:
+            代码列表
+        """
+        directory = os.path.join(self.base_dir, market_type, adjust or 'none')
+        if not os.path.isdir(directory):
+            return []
+        return [name[:-len('.parquet')] for name in os.listdir(directory) if name.endswith('.parquet')]
+
+    def lock(self, market_type: str, code: str, adjust: str) -> threading.Lock:
+        """
+        获取指定存储键的锁，调用方在"读取-补齐-写回"的过程中应持有该锁
+        """
+        key = self._key(market_type, code, adjust)
+        with self._locks_guard:
+            if key not in self._locks:
+                self._locks[key] = threading.Lock()
+            return self._locks[key]
+
+    def load(self, market_type: str, code: str, adjust: str) -> Tuple[Optional[pd.DataFrame], Dict[str, Any]]:
+        """
+        读取本地存储的K线数据
+
+        Args:
+            market_type: 市场类型
+            code: 代码
+            adjust: 复权方式
+
+        Returns:
+            (DataFrame或None, 元数据字典)的元组
+        """
+        data_path, meta_path = self._paths(market_type, code, adjust)
+        if not os.path.exists(data_path):
+            return None, {}
+
+        try:
+            df = pd.read_parquet(data_path)
+            meta = {}
+            if os.path.exists(meta_path):
+                with open(meta_path, 'r', encoding='utf-8') as f:
+                    meta = json.load(f)
+            return df, meta
+        except Exception as e:
+            # 文件损坏时视为无缓存，由上游重新拉取覆盖
+            logger.warning(f"读取本地K线数据失败 {self._key(market_type, code, adjust)}: {str(e)}")
+            return None, {}
+
+    def save(self, market_type: str, code: str, adjust: str, df: pd.DataFrame, meta: Dict[str, Any]) -> None:
+        """
+        写入K线数据及元数据（先写临时文件再原子替换）
+
+        Args:
+            market_type: 市场类型
+            code: 代码
+            adjust: 复权方式
+            df: 以日期为索引的K线数据
+            meta: 元数据
+        """
+        data_path, meta_path = self._paths(market_type, code, adjust)
+        os.makedirs(os.path.dirname(data_path), exist_ok=True)
+
+        tmp_data_path = f"{data_path}.tmp"
+        tmp_meta_path = f"{meta_path}.tmp"
+        df.to_parquet(tmp_data_path)
+        with open(tmp_meta_path, 'w', encoding='utf-8') as f:
+            json.dump(meta, f, ensure_ascii=False)
+        os.replace(tmp_data_path, data_path)
+        os.replace(tmp_meta_path, meta_path)
+
+        logger.debug(f"已写入本地K线数据 {self._key(market_type, code, adjust)}, 数据点数: {len(df)}")
+
+    def merge(self, stored_df: pd.DataFrame, new_df: pd.DataFrame) -> pd.DataFrame:
+        """
+        合并已存储数据与新拉取数据，日期重叠时以新数据为准
+
+        Args:
+            stored_df: 已存储的数据
+            new_df: 新拉取的数据
+
+        Returns:
+            合并并按日期升序排列的DataFrame
+        """
+        merged = pd.concat([stored_df, new_df])
+        merged = merged[~merged.index.duplicated(keep='last')]
+        merged.sort_index(inplace=True)
+        return merged
+
+    def invalidate(self, market_type: str, code: str, adjust: str) -> None:
+        """
+        删除指定代码的本地数据，下次访问时将重新全量拉取
+        """
+        for path in self._paths(market_type, code, adjust):
+            if os.path.exists(path):
+                os.remove(path)
+        logger.info(f"已清除本地K线数据 {self._key(market_type, code, adjust)}")
+
+    def is_fresh(self, meta: Dict[str, Any], end_date: datetime, now: Optional[datetime] = None) -> bool:
+        """
+        判断本地数据是否无需向上游补齐
+
+        当最近一次核对发生在结束日期之后（该日K线已定型）、结束日期的K线已由收盘后的行情快照写入，
+        或距离上次核对未超过刷新间隔时，视为新鲜
+
+        Args:
+            meta: 元数据
+            end_date: 请求的结束日期
+            now: 当前时间，默认为datetime.now()
+
+        Returns:
+            是否新鲜
+        """
+        checked_at = meta.get('checked_at')
+        if not checked_at:
+            return False
+
+        final_date = meta.get('final_date')
+        if final_date and final_date >= end_date.strftime('%Y%m%d'):
+            return True
+
+        now = now or datetime.now()
+        checked_at = datetime.fromisoformat(checked_at)
+
+        if checked_at.date() > end_date.date():
+            return True
+        return now - checked_at < self.refresh_interval
+
+
+# 进程级单例
+_store: Optional[OHLCVStore] = None
+_store_initialized = False
+_store_guard = threading.Lock()
+
+
+def get_ohlcv_store() -> Optional[OHLCVStore]:
+    """
+    获取进程级本地K线数据存储
+
+    当OHLCV_STORE_ENABLED为false或未安装pyarrow时返回None，调用方应直接请求上游
+    """
+    global _store, _store_initialized
+
+    if _store_initialized:
+        return _store
+
+    with _store_guard:
+        if _store_initialized:
+            return _store
+
+        enabled = os.getenv('OHLCV_STORE_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+        if not enabled:
+            logger.info("本地K线数据存储已禁用")
+        elif importlib.util.find_spec('pyarrow') is None:
+            logger.warning("未安装pyarrow，本地K线数据存储不可用")
+        else:
+            try:
+                _store = OHLCVStore()
+            except Exception as e:
+                logger.error(f"初始化本地K线数据存储失败: {str(e)}")
+                _store = None
+
+        _store_initialized = True
+        return _store
@@ -0,0 +1,200 @@
+import os
+import asyncio
+import threading
+from datetime import date, datetime
+from typing import Dict, List, Optional
+from utils.logger import get_logger
+from utils.upstream_gateway import get_upstream_gateway
+from services.score_table import MARKET_SESSIONS, latest_closed_session, get_score_table_store
+from services.trading_calendar import get_trading_calendar
+
+# 获取日志器
+logger = get_logger()
+
+# 支持以'*'表示全市场代码列表的市场类型
+FULL_UNIVERSE_MARKETS = ('A', 'ETF', 'LOF')
+
+# 默认在收盘后由全市场行情快照写入当日K线的市场类型
+DEFAULT_INGEST_MARKETS = 'A,HK,US,ETF,LOF'
+
+
+class PostCloseScheduler:
+    """
+    收盘后评分调度器
+    各市场收盘一段时间后（沪深市场按交易日历跳过节假日），先用一次全市场行情快照把当日K线写入本地K线存储中的所有代码，
+    再对配置的代码列表拉取K线（预热本地K线存储和指标缓存）、计算评分，
+    并写入每日评分表，盘后的批量扫描直接读取评分表
+    """
+
+    def __init__(self, universes: Optional[Dict[str, List[str]]] = None, check_seconds: Optional[float] = None,
+                 delay_minutes: Optional[float] = None, ingest_markets: Optional[List[str]] = None):
+        """
+        初始化收盘后评分调度器
+
+        Args:
+            universes: 市场类型 -> 代码列表，列表为['*']时表示全市场，默认读取环境变量SCHEDULER_UNIVERSE_<市场>
+            check_seconds: 检查间隔（秒），默认为环境变量SCHEDULER_CHECK_SECONDS（默认60秒）
+            delay_minutes: 收盘后延迟多久开始计算（分钟），默认为环境变量SCHEDULER_DELAY_MINUTES（默认20分钟）
+            ingest_markets: 收盘后写入当日K线的市场类型，默认为环境变量SCHEDULER_INGEST_MARKETS（逗号分隔，默认A,HK,US,ETF,LOF）
+        """
+        if universes is None:
+            universes = self._universes_from_env()
+        if check_seconds is None:
+            check_seconds = float(os.getenv('SCHEDULER_CHECK_SECONDS', 60))
+        if delay_minutes is None:
+            delay_minutes = float(os.getenv('SCHEDULER_DELAY_MINUTES', 20))
+        if ingest_markets is None:
+            value = os.getenv('SCHEDULER_INGEST_MARKETS', DEFAULT_INGEST_MARKETS)
+            ingest_markets = [market.strip() for market in value.split(',') if market.strip()]
+
+        from services.spot_bar_ingest import SPOT_SOURCES
+        self.universes = universes
+        self.ingest_markets = [market for market in ingest_markets if market in SPOT_SOURCES]
+        self.check_seconds = check_seconds
+        self.delay_minutes = delay_minutes
+        self._task: Optional[asyncio.Task] = None
+        # 市场类型 -> 已写入当日K线的交易日
+        self._ingested: Dict[str, date] = {}
+
+        logger.debug(f"初始化PostCloseScheduler: 市场={list(universes)}, 写入当日K线={self.ingest_markets}, "
+                     f"收盘后延迟={delay_minutes}分钟")
+
+    @staticmethod
+    def _universes_from_env() -> Dict[str, List[str]]:
+        """从环境变量读取各市场的代码列表（逗号分隔）"""
+        universes = {}
+        for market_type in MARKET_SESSIONS:
+            value = os.getenv(f'SCHEDULER_UNIVERSE_{market_type}', '')
+            codes = [code.strip() for code in value.split(',') if code.strip()]
+            if codes:
+                universes[market_type] = codes
+        return universes
+
+    def start(self) -> None:
+        """在当前事件循环中启动调度任务"""
+        if not self.universes and not self.ingest_markets:
+            logger.info("未配置收盘后评分的代码列表和写入当日K线的市场，调度器不启动")
+            return
+        if self._task is None or self._task.done():
+            self._task = asyncio.ensure_future(self._run())
+            logger.info(f"收盘后评分调度器已启动: {', '.join(self._markets())}")
+
+    def _markets(self) -> List[str]:
+        """需要在收盘后处理的市场类型"""
+        return list(dict.fromkeys(list(self.universes) + self.ingest_markets))
+
+    async def stop(self) -> None:
+        """停止调度任务"""
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _run(self) -> None:
+        """调度循环"""
+        while True:
+            # 按交易日历判断盘后时段，节假日不写入当日K线、不生成评分表（按刷新间隔缓存，失败时按工作日判断）
+            await get_upstream_gateway().run(get_trading_calendar().refresh)
+            for market_type in self._markets():
+                try:
+                    await self.run_once(market_type)
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    logger.error(f"生成{market_type}每日评分表失败: {str(e)}")
+                    logger.exception(e)
+            await asyncio.sleep(self.check_seconds)
+
+    async def run_once(self, market_type: str, now: Optional[datetime] = None) -> bool:
+        """
+        检查并生成一个市场的每日评分表，生成前先写入当日K线
+
+        Args:
+            market_type: 市场类型
+            now: 当前时间（带时区），默认为当前时间
+
+        Returns:
+            本次是否生成了评分表
+        """
+        session = latest_closed_session(market_type, now)
+        if session is None:
+            return False
+
+        session_date, closed_at = session
+        elapsed_minutes = ((now or datetime.now(closed_at.tzinfo)) - closed_at).total_seconds() / 60
+        if elapsed_minutes < self.delay_minutes:
+            return False
+
+        if market_type in self.ingest_markets and self._ingested.get(market_type) != session_date:
+            await self._ingest(market_type, session_date)
+
+        store = get_score_table_store()
+        if store is None or market_type not in self.universes or store.exists(market_type, session_date):
+            return False
+
+        codes = await self._resolve_universe(market_type)
+        logger.info(f"开始生成{market_type}每日评分表: {session_date}, 共 {len(codes)} 个代码")
+
+        table = await self._build_table(market_type, codes)
+        if table.empty:
+            logger.warning(f"{market_type}每日评分表为空，稍后重试")
+            return False
+
+        store.save(market_type, session_date, table)
+        return True
+
+    async def _ingest(self, market_type: str, session_date: date) -> None:
+        """用全市场行情快照写入当日K线，失败时在下次检查时重试"""
+        from services.spot_bar_ingest import SpotBarIngestor
+        try:
+            await SpotBarIngestor().ingest(market_type, session_date)
+            self._ingested[market_type] = session_date
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"写入{market_type}当日K线失败: {str(e)}")
+            logger.exception(e)
+
+    async def _resolve_universe(self, market_type: str) -> List[str]:
+        """解析代码列表，'*'展开为全市场代码"""
+        codes = self.universes.get(market_type, [])
+        if codes == ['*'] and market_type in FULL_UNIVERSE_MARKETS:
+            from services.stock_data_provider import StockDataProvider
+            return await StockDataProvider().get_market_universe(market_type)
+        return codes
+
+    async def _build_table(self, market_type: str, codes: List[str]):
+        """调用对应的分析服务计算评分表"""
+        if market_type == 'FUTURES':
+            from services.futures_analyzer_service import FuturesAnalyzerService
+            return await FuturesAnalyzerService().build_score_table(codes)
+
+        from services.stock_analyzer_service import StockAnalyzerService
+        return await StockAnalyzerService().build_score_table(codes, market_type)
+
+
+# 进程级单例
+_scheduler: Optional[PostCloseScheduler] = None
+_scheduler_guard = threading.Lock()
+
+
+def get_post_close_scheduler() -> Optional[PostCloseScheduler]:
+    """
+    获取进程级收盘后评分调度器
+
+    环境变量POST_CLOSE_SCHEDULER_ENABLED为false时返回None
+    """
+    global _scheduler
+
+    if os.getenv('POST_CLOSE_SCHEDULER_ENABLED', 'true').lower() != 'true':
+        return None
+
+    if _scheduler is None:
+        with _scheduler_guard:
+            if _scheduler is None:
+                _scheduler = PostCloseScheduler()
+    return _scheduler
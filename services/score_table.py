@@ -0,0 +1,219 @@
+import os
+import threading
+import importlib.util
+import pandas as pd
+from datetime import date, datetime, time
+from typing import Any, Dict, List, Optional, Tuple
+from zoneinfo import ZoneInfo
+from utils.logger import get_logger
+from services.trading_calendar import get_trading_calendar
+
+# 获取日志器
+logger = get_logger()
+
+# 项目根目录
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 各市场交易时段：(时区, 开盘时间, 收盘时间)
+# 期货的开盘时间取夜盘开盘，收盘后到夜盘开盘之间为盘后时段
+MARKET_SESSIONS: Dict[str, Tuple[str, time, time]] = {
+    'A': ('Asia/Shanghai', time(9, 30), time(15, 0)),
+    'ETF': ('Asia/Shanghai', time(9, 30), time(15, 0)),
+    'LOF': ('Asia/Shanghai', time(9, 30), time(15, 0)),
+    'HK': ('Asia/Hong_Kong', time(9, 30), time(16, 10)),
+    'US': ('America/New_York', time(9, 30), time(16, 0)),
+    'FUTURES': ('Asia/Shanghai', time(21, 0), time(15, 0)),
+}
+
+
+def latest_closed_session(market_type: str, now: Optional[datetime] = None) -> Optional[Tuple[date, datetime]]:
+    """
+    获取当前处于盘后时段的交易日
+
+    Args:
+        market_type: 市场类型
+        now: 当前时间（带时区），默认为当前时间
+
+    Returns:
+        (交易日, 该交易日收盘时间)的元组；盘中或不在盘后时段时返回None
+    """
+    session = MARKET_SESSIONS.get(market_type)
+    if session is None:
+        return None
+
+    tz_name, open_time, close_time = session
+    tz = ZoneInfo(tz_name)
+    local = (now or datetime.now(tz)).astimezone(tz)
+    today = local.date()
+    current = local.time()
+
+    def closed_at(day: date) -> Tuple[date, datetime]:
+        return day, datetime.combine(day, close_time, tzinfo=tz)
+
+    calendar = get_trading_calendar()
+    if open_time > close_time:
+        # 收盘后当天还会再开盘（期货夜盘），只有交易日收盘到夜盘开盘之间为盘后时段
+        if calendar.is_trading_day(market_type, today) and close_time <= current < open_time:
+            return closed_at(today)
+        return None
+
+    if not calendar.is_trading_day(market_type, today):
+        return closed_at(calendar.previous_trading_day(market_type, today))
+    if current >= close_time:
+        return closed_at(today)
+    if current < open_time:
+        return closed_at(calendar.previous_trading_day(market_type, today))
+    return None
+
+
+def _to_json_value(value: Any) -> Any:
+    """将评分表中的numpy标量和缺失值转为可JSON序列化的值"""
+    if value is None or (isinstance(value, float) and value != value):
+        return None
+    return value.item() if hasattr(value, 'item') else value
+
+
+class ScoreTableStore:
+    """
+    每日评分表存储
+    按 市场类型/交易日 将收盘后预先计算的评分结果以Parquet文件持久化，读取时在内存中缓存
+    """
+
+    def __init__(self, base_dir: Optional[str] = None):
+        """
+        初始化每日评分表存储
+
+        Args:
+            base_dir: 存储根目录，默认为环境变量SCORE_TABLE_DIR或项目下的data/scores
+        """
+        self.base_dir = base_dir or os.getenv('SCORE_TABLE_DIR') or os.path.join(PROJECT_ROOT, 'data', 'scores')
+
+        # 路径 -> (文件修改时间, 评分表)
+        self._memo: Dict[str, Tuple[float, pd.DataFrame]] = {}
+        self._lock = threading.Lock()
+
+        os.makedirs(self.base_dir, exist_ok=True)
+        logger.debug(f"初始化ScoreTableStore: 目录={self.base_dir}")
+
+    def path(self, market_type: str, session_date: date) -> str:
+        """获取评分表文件路径"""
+        return os.path.join(self.base_dir, market_type, f"{session_date.strftime('%Y%m%d')}.parquet")
+
+    def exists(self, market_type: str, session_date: date) -> bool:
+        """评分表是否已生成"""
+        return os.path.exists(self.path(market_type, session_date))
+
+    def save(self, market_type: str, session_date: date, table: pd.DataFrame) -> None:
+        """
+        原子写入评分表
+
+        Args:
+            market_type: 市场类型
+            session_date: 交易日
+            table: 以代码为索引的评分表
+        """
+        path = self.path(market_type, session_date)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        table.to_parquet(tmp_path)
+        os.replace(tmp_path, path)
+        logger.info(f"已保存{market_type}评分表: {session_date}, 共 {len(table)} 条")
+
+    def load(self, market_type: str, session_date: date) -> Optional[pd.DataFrame]:
+        """
+        读取评分表
+
+        Returns:
+            以代码为索引的评分表（调用方不应修改），不存在时返回None
+        """
+        path = self.path(market_type, session_date)
+        try:
+            mtime = os.path.getmtime(path)
+        except OSError:
+            return None
+
+        with self._lock:
+            memo = self._memo.get(path)
+            if memo is not None and memo[0] == mtime:
+                return memo[1]
+
+        try:
+            table = pd.read_parquet(path)
+        except Exception as e:
+            logger.warning(f"读取{market_type}评分表失败: {str(e)}")
+            return None
+
+        with self._lock:
+            self._memo[path] = (mtime, table)
+        return table
+
+    def load_current(self, market_type: str, now: Optional[datetime] = None) -> Optional[pd.DataFrame]:
+        """
+        读取当前盘后时段对应交易日的评分表
+
+        盘中或评分表尚未生成时返回None，调用方应实时计算
+        """
+        session = latest_closed_session(market_type, now)
+        if session is None:
+            return None
+        return self.load(market_type, session[0])
+
+    def lookup_current(self, market_type: str, codes: List[str], code_field: str) -> Dict[str, Dict[str, Any]]:
+        """
+        从当前盘后时段的评分表中读取一组代码的评分消息
+
+        Args:
+            market_type: 市场类型
+            codes: 代码列表
+            code_field: 消息中代码字段名，如'stock_code'或'futures_code'
+
+        Returns:
+            字典，键为代码，值为评分消息；盘中或评分表不存在时为空字典
+        """
+        table = self.load_current(market_type)
+        if table is None:
+            return {}
+
+        found = {}
+        for code in codes:
+            if code in table.index:
+                row = table.loc[code]
+                found[code] = {code_field: code, **{column: _to_json_value(row[column]) for column in table.columns}}
+
+        if found:
+            logger.info(f"使用{market_type}每日评分表中的 {len(found)} 个评分")
+        return found
+
+
+# 进程级单例
+_score_table_store: Optional[ScoreTableStore] = None
+_score_table_store_initialized = False
+_score_table_store_guard = threading.Lock()
+
+
+def get_score_table_store() -> Optional[ScoreTableStore]:
+    """
+    获取进程级每日评分表存储
+
+    未安装pyarrow时返回None
+    """
+    global _score_table_store, _score_table_store_initialized
+
+    if _score_table_store_initialized:
+        return _score_table_store
+
+    with _score_table_store_guard:
+        if _score_table_store_initialized:
+            return _score_table_store
+
+        if importlib.util.find_spec('pyarrow') is None:
+            logger.warning("未安装pyarrow，每日评分表不可用")
+        else:
+            try:
+                _score_table_store = ScoreTableStore()
+            except Exception as e:
+                logger.error(f"初始化每日评分表存储失败: {str(e)}")
+                _score_table_store = None
+
+        _score_table_store_initialized = True
+        return _score_table_store
@@ -0,0 +1,215 @@
+import heapq
+import pandas as pd
+from typing import Any, Callable, Dict, Iterable, List, Optional
+from utils.logger import get_logger
+
+try:
+    from pypinyin import lazy_pinyin, Style
+except ImportError:  # 未安装pypinyin时不支持拼音首字母搜索
+    lazy_pinyin = None
+    Style = None
+
+# 获取日志器
+logger = get_logger()
+
+# 匹配类型的排序权重，越小越靠前
+RANK_SYMBOL_EXACT = 0
+RANK_SYMBOL_PREFIX = 1
+RANK_NAME_EXACT = 2
+RANK_NAME_PREFIX = 3
+RANK_PINYIN_PREFIX = 4
+RANK_NAME_CONTAINS = 5
+RANK_SYMBOL_CONTAINS = 6
+
+# 以代码长度作为同类匹配内排序依据的匹配类型，其余以名称长度排序
+SYMBOL_RANKS = (RANK_SYMBOL_EXACT, RANK_SYMBOL_PREFIX, RANK_SYMBOL_CONTAINS)
+
+
+class PrefixTrie:
+    """
+    前缀树
+    每个节点保存以该前缀开头的条目编号（按优先级排好序并截断），查询耗时只与前缀长度有关
+    """
+
+    def __init__(self, node_limit: int = 64):
+        """
+        Args:
+            node_limit: 每个节点最多保存的条目数
+        """
+        self.node_limit = node_limit
+        self._root: Dict[str, Any] = {}
+
+    def build(self, keys: Iterable[tuple]) -> None:
+        """
+        构建前缀树
+
+        Args:
+            keys: (键, 条目编号)的序列，需已按优先级排序
+        """
+        for key, doc_id in keys:
+            node = self._root
+            for char in key:
+                node = node.setdefault(char, {})
+                ids = node.setdefault('', [])
+                if len(ids) < self.node_limit and (not ids or ids[-1] != doc_id):
+                    ids.append(doc_id)
+
+    def search(self, prefix: str) -> List[int]:
+        """返回以prefix开头的条目编号"""
+        node = self._root
+        for char in prefix:
+            node = node.get(char)
+            if node is None:
+                return []
+        return node.get('', [])
+
+
+class SearchIndex:
+    """
+    代码/名称搜索索引
+    对一份行情快照构建一次：代码前缀树、代码和名称的字符n-gram倒排索引，以及名称拼音首字母前缀树，
+    查询时只访问候选条目，并用堆取排名最高的结果
+    """
+
+    def __init__(self, df: pd.DataFrame, formatter: Callable[[Dict[str, Any]], Dict[str, Any]],
+                 symbol_column: str = 'symbol', name_column: str = 'name', use_pinyin: bool = True):
+        """
+        构建搜索索引
+
+        Args:
+            df: 行情快照
+            formatter: 将一行数据（字典）格式化为搜索结果的函数，在构建时对每行执行一次
+            symbol_column: 代码列名
+            name_column: 名称列名
+            use_pinyin: 是否索引名称拼音首字母（需要安装pypinyin）
+        """
+        rows = df.to_dict('records')
+        self.records = [formatter(row) for row in rows]
+        self.symbols = [self._normalize(row.get(symbol_column)) for row in rows]
+        self.names = [self._normalize(row.get(name_column)) for row in rows]
+
+        # 同类匹配内，代码或名称越短越靠前，再按快照原始顺序
+        symbol_order = sorted(range(len(rows)), key=lambda i: (len(self.symbols[i]), i))
+        name_order = sorted(range(len(rows)), key=lambda i: (len(self.names[i]), i))
+
+        # 代码前缀树，对'105.AAPL'这类带市场前缀的代码同时索引点号后的部分
+        symbol_keys = []
+        for i in symbol_order:
+            symbol = self.symbols[i]
+            symbol_keys.append((symbol, i))
+            if '.' in symbol:
+                symbol_keys.append((symbol.split('.', 1)[1], i))
+        self.symbol_trie = PrefixTrie()
+        self.symbol_trie.build(symbol_keys)
+
+        # 名称前缀树
+        self.name_trie = PrefixTrie()
+        self.name_trie.build((self.names[i], i) for i in name_order if self.names[i])
+
+        # 字符n-gram倒排索引
+        self.name_grams = self._build_grams(self.names, name_order)
+        self.symbol_grams = self._build_grams(self.symbols, symbol_order)
+
+        # 拼音首字母前缀树
+        self.pinyin_trie: Optional[PrefixTrie] = None
+        if use_pinyin and lazy_pinyin is not None:
+            initials = [''.join(lazy_pinyin(name, style=Style.FIRST_LETTER)).lower() for name in self.names]
+            self.pinyin_trie = PrefixTrie()
+            self.pinyin_trie.build((initials[i], i) for i in name_order if initials[i])
+
+        logger.debug(f"构建搜索索引完成: {len(rows)} 条, 拼音索引: {'已启用' if self.pinyin_trie else '未启用'}")
+
+    @staticmethod
+    def _normalize(value: Any) -> str:
+        """统一转为小写字符串，缺失值为空字符串"""
+        return str(value).strip().lower() if pd.notna(value) else ''
+
+    @staticmethod
+    def _build_grams(texts: List[str], order: List[int]) -> Dict[str, List[int]]:
+        """构建单字和双字n-gram倒排索引，倒排列表按order给出的优先级排列"""
+        grams: Dict[str, List[int]] = {}
+        for i in order:
+            text = texts[i]
+            seen = set(text)
+            seen.update(text[j:j + 2] for j in range(len(text) - 1))
+            for gram in seen:
+                grams.setdefault(gram, []).append(i)
+        return grams
+
+    @staticmethod
+    def _gram_matches(grams: Dict[str, List[int]], texts: List[str], keyword: str, limit: int) -> List[int]:
+        """
+        按优先级返回前limit个包含关键词的条目
+
+        只遍历关键词中最短的一个n-gram倒排列表并校验子串，列表已按优先级排列，凑够limit个即停止
+        """
+        if len(keyword) == 1:
+            return grams.get(keyword, [])[:limit]
+
+        shortest = None
+        for gram in {keyword[j:j + 2] for j in range(len(keyword) - 1)}:
+            posting = grams.get(gram)
+            if not posting:
+                return []
+            if shortest is None or len(posting) < len(shortest):
+                shortest = posting
+
+        matches = []
+        for i in shortest:
+            if keyword in texts[i]:
+                matches.append(i)
+                if len(matches) >= limit:
+                    break
+        return matches
+
+    def search(self, keyword: str, limit: int = 10) -> List[Dict[str, Any]]:
+        """
+        搜索代码或名称
+
+        Args:
+            keyword: 搜索关键词（不区分大小写）
+            limit: 返回结果数
+
+        Returns:
+            按匹配程度排序的搜索结果
+        """
+        keyword = keyword.strip().lower()
+        if not keyword:
+            return []
+
+        # 条目编号 -> 最佳匹配类型
+        best: Dict[int, int] = {}
+
+        def offer(doc_id: int, rank: int) -> None:
+            if rank < best.get(doc_id, RANK_SYMBOL_CONTAINS + 1):
+                best[doc_id] = rank
+
+        # 各阶段按匹配类型由强到弱执行，已凑够limit个更强的匹配时后续阶段不会影响结果，直接跳过
+        for i in self.symbol_trie.search(keyword):
+            symbol = self.symbols[i]
+            exact = symbol == keyword or symbol.split('.', 1)[-1] == keyword
+            offer(i, RANK_SYMBOL_EXACT if exact else RANK_SYMBOL_PREFIX)
+
+        if len(best) < limit:
+            for i in self.name_trie.search(keyword):
+                offer(i, RANK_NAME_EXACT if self.names[i] == keyword else RANK_NAME_PREFIX)
+
+        if len(best) < limit and self.pinyin_trie is not None:
+            for i in self.pinyin_trie.search(keyword):
+                offer(i, RANK_PINYIN_PREFIX)
+
+        if len(best) < limit:
+            for i in self._gram_matches(self.name_grams, self.names, keyword, limit):
+                offer(i, RANK_NAME_CONTAINS)
+
+        if len(best) < limit:
+            for i in self._gram_matches(self.symbol_grams, self.symbols, keyword, limit):
+                offer(i, RANK_SYMBOL_CONTAINS)
+
+        def sort_key(item):
+            doc_id, rank = item
+            text = self.symbols[doc_id] if rank in SYMBOL_RANKS else self.names[doc_id]
+            return rank, len(text), doc_id
+
+        top = heapq.nsmallest(limit, best.items(), key=sort_key)
+        return [dict(self.records[i]) for i, _ in top]
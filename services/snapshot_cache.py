@@ -0,0 +1,175 @@
+import os
+import time
+import asyncio
+import threading
+import pandas as pd
+from typing import Any, Callable, Dict, Optional
+from utils.logger import get_logger
+from utils.singleflight import SingleFlight
+from utils.upstream_gateway import get_upstream_gateway
+
+# 获取日志器
+logger = get_logger()
+
+
+class SnapshotCache:
+    """
+    全市场行情快照缓存（stale-while-revalidate）
+    始终立即返回最近一次成功获取的快照，过期后在后台刷新，
+    只有首次加载时调用方需要等待上游下载
+    """
+
+    def __init__(self, name: str, loader: Callable[[], pd.DataFrame], ttl_seconds: Optional[float] = None,
+                 retry_seconds: Optional[float] = None, index_builder: Optional[Callable[[pd.DataFrame], Any]] = None):
+        """
+        初始化快照缓存
+
+        Args:
+            name: 快照名称，用于日志
+            loader: 同步加载函数，返回完整快照DataFrame，将在上游网关线程池中执行
+            ttl_seconds: 快照有效期（秒），默认为环境变量SNAPSHOT_CACHE_TTL（默认300秒）
+            retry_seconds: 刷新失败后再次尝试的间隔（秒），默认为环境变量SNAPSHOT_CACHE_RETRY（默认30秒）
+            index_builder: 可选，基于快照构建索引的函数，与快照一同在线程池中构建并同时替换
+        """
+        if ttl_seconds is None:
+            ttl_seconds = float(os.getenv('SNAPSHOT_CACHE_TTL', 300))
+        if retry_seconds is None:
+            retry_seconds = float(os.getenv('SNAPSHOT_CACHE_RETRY', 30))
+
+        self.name = name
+        self.loader = loader
+        self.ttl_seconds = ttl_seconds
+        self.retry_seconds = retry_seconds
+        self.index_builder = index_builder
+
+        self._snapshot: Optional[pd.DataFrame] = None
+        self._index: Any = None
+        self._loaded_at: Optional[float] = None
+        self._next_refresh_at = 0.0
+        self._refresh_task: Optional[asyncio.Task] = None
+        self._single_flight = SingleFlight(f"snapshot:{name}")
+
+        # 统计计数
+        self.hits = 0
+        self.stale_hits = 0
+        self.loads = 0
+        self.failures = 0
+
+        logger.debug(f"初始化SnapshotCache[{name}]: TTL={ttl_seconds}秒")
+
+    async def get(self) -> pd.DataFrame:
+        """
+        获取快照
+
+        已有快照时立即返回（即使已过期），过期时触发一次后台刷新；
+        尚无快照时等待首次加载，并发的首次请求共享同一次加载
+
+        Returns:
+            快照DataFrame（与其他请求共享，调用方不应修改）
+        """
+        if self._snapshot is None:
+            return await self._single_flight.do(self.name, self._load)
+
+        if time.monotonic() >= self._next_refresh_at:
+            self.stale_hits += 1
+            self._schedule_refresh()
+        else:
+            self.hits += 1
+        return self._snapshot
+
+    async def get_index(self) -> Any:
+        """
+        获取与当前快照对应的索引，过期与刷新策略同get
+
+        Returns:
+            index_builder构建的索引
+        """
+        await self.get()
+        return self._index
+
+    async def refresh(self) -> pd.DataFrame:
+        """立即从上游重新加载快照"""
+        return await self._single_flight.do(self.name, self._load)
+
+    async def _load(self) -> pd.DataFrame:
+        """从上游加载快照，失败时保留旧快照并延后重试"""
+        started = time.monotonic()
+        try:
+            df, index = await get_upstream_gateway().run(self._load_sync)
+        except Exception:
+            self.failures += 1
+            self._next_refresh_at = time.monotonic() + self.retry_seconds
+            raise
+
+        self._snapshot = df
+        self._index = index
+        self._loaded_at = time.monotonic()
+        self._next_refresh_at = self._loaded_at + self.ttl_seconds
+        self.loads += 1
+        logger.info(f"快照[{self.name}]已更新, 共 {len(df)} 条, 耗时 {self._loaded_at - started:.2f}秒")
+        return df
+
+    def _load_sync(self):
+        """在上游网关线程池中加载快照并构建索引"""
+        df = self.loader()
+        index = self.index_builder(df) if self.index_builder is not None else None
+        return df, index
+
+    def _schedule_refresh(self) -> None:
+        """在后台刷新快照，同一时间只运行一个刷新任务"""
+        if self._refresh_task is not None and not self._refresh_task.done():
+            return
+
+        async def run():
+            try:
+                await self.refresh()
+            except Exception as e:
+                logger.warning(f"后台刷新快照[{self.name}]失败，继续使用旧快照: {str(e)}")
+
+        self._refresh_task = asyncio.ensure_future(run())
+
+    def stats(self) -> Dict[str, Any]:
+        """获取缓存统计信息"""
+        return {
+            'name': self.name,
+            'rows': 0 if self._snapshot is None else len(self._snapshot),
+            'age_seconds': None if self._loaded_at is None else time.monotonic() - self._loaded_at,
+            'hits': self.hits,
+            'stale_hits': self.stale_hits,
+            'loads': self.loads,
+            'failures': self.failures
+        }
+
+
+# 进程级快照注册表，同名快照在所有服务实例间共享
+_snapshot_caches: Dict[str, SnapshotCache] = {}
+_snapshot_caches_guard = threading.Lock()
+
+
+def get_snapshot_cache(name: str, loader: Callable[[], pd.DataFrame], ttl_seconds: Optional[float] = None,
+                       index_builder: Optional[Callable[[pd.DataFrame], Any]] = None) -> SnapshotCache:
+    """
+    获取进程级共享的快照缓存，不存在时创建
+
+    Args:
+        name: 快照名称，同名快照共享
+        loader: 同步加载函数（仅在首次创建时使用）
+        ttl_seconds: 快照有效期（秒）
+        index_builder: 可选，基于快照构建索引的函数（仅在首次创建时使用）
+
+    Returns:
+        快照缓存
+    """
+    cache = _snapshot_caches.get(name)
+    if cache is None:
+        with _snapshot_caches_guard:
+            cache = _snapshot_caches.get(name)
+            if cache is None:
+                cache = SnapshotCache(name, loader, ttl_seconds, index_builder=index_builder)
+                _snapshot_caches[name] = cache
+    return cache
+
+
+def get_snapshot_cache_stats() -> Dict[str, Dict[str, Any]]:
+    """获取所有快照缓存的统计信息"""
+    return {name: cache.stats() for name, cache in list(_snapshot_caches.items())}
@@ -0,0 +1,211 @@
+import numpy as np
+import pandas as pd
+from datetime import date, datetime
+from typing import Dict, List, Optional
+from utils.logger import get_logger
+from utils.upstream_gateway import get_upstream_gateway, SOURCE_EM
+from services.data_source import get_data_source
+from services.ohlcv_store import OHLCVStore, get_ohlcv_store
+from services.stock_data_provider import StockDataProvider
+
+# 获取日志器
+logger = get_logger()
+
+# 各市场的全市场行情快照：(上游数据源, 函数名, 成交量换算为历史K线单位的倍数)
+# 基金行情快照的成交量单位为手，新浪基金历史K线为股
+SPOT_SOURCES = {
+    'A': (SOURCE_EM, 'stock_zh_a_spot_em', 1),
+    'HK': (SOURCE_EM, 'stock_hk_spot_em', 1),
+    'US': (SOURCE_EM, 'stock_us_spot_em', 1),
+    'ETF': (SOURCE_EM, 'fund_etf_spot_em', 100),
+    'LOF': (SOURCE_EM, 'fund_lof_spot_em', 100),
+}
+
+# 标准化列名 -> 行情快照中的候选列名（不同快照的列名略有差异）
+SPOT_COLUMNS = {
+    'Open': ('今开', '开盘价', '开盘'),
+    'High': ('最高', '最高价'),
+    'Low': ('最低', '最低价'),
+    'Close': ('最新价',),
+    'Volume': ('成交量',),
+    'Amount': ('成交额',),
+    'Amplitude': ('振幅',),
+    'Change_pct': ('涨跌幅',),
+    'Change': ('涨跌额',),
+    'Turnover': ('换手率',),
+    'PrevClose': ('昨收', '昨收价'),
+}
+
+# 快照中的昨收与本地最后一根K线收盘价的最大偏差（相对值，且不小于半个最小价格变动单位），
+# 超过时说明本地数据有缺口或发生了除权
+PREV_CLOSE_TOLERANCE = 0.001
+PREV_CLOSE_MIN_TOLERANCE = 0.005
+
+# 本地存储中带交易所前缀（如sh510050，新浪基金接口的写法）、而行情快照中不带前缀的市场
+PREFIXED_MARKETS = ('ETF', 'LOF')
+
+
+def build_spot_bars(spot_df: pd.DataFrame, market_type: str) -> pd.DataFrame:
+    """
+    把全市场行情快照一次性转换为当日K线表（向量化）
+
+    停牌（无成交）或价格不完整的代码会被剔除
+
+    Args:
+        spot_df: 行情快照
+        market_type: 市场类型
+
+    Returns:
+        以代码为索引、列为标准化列名（含PrevClose）的DataFrame
+    """
+    volume_factor = SPOT_SOURCES[market_type][2]
+
+    bars = pd.DataFrame(index=spot_df['代码'].astype(str).str.strip())
+    for column, candidates in SPOT_COLUMNS.items():
+        source = next((name for name in candidates if name in spot_df.columns), None)
+        values = pd.to_numeric(spot_df[source], errors='coerce').to_numpy() if source else np.nan
+        bars[column] = values
+
+    bars['Volume'] = bars['Volume'] * volume_factor
+    if market_type == 'US':
+        # 与美股历史K线一致，成交额按成交量×收盘价计算
+        bars['Amount'] = bars['Volume'] * bars['Close']
+
+    valid = (
+        (bars['Close'] > 0) & (bars['PrevClose'] > 0) & (bars['Volume'] > 0)
+        & bars[['Open', 'High', 'Low']].notna().all(axis=1)
+    )
+    bars = bars[valid & ~bars.index.duplicated(keep='first')]
+
+    if market_type == 'US':
+        # 行情快照中的美股代码带有市场前缀（如105.AAPL），历史K线使用不带前缀的代码，两种写法都保留
+        symbols = bars.index.str.split('.', n=1).str[-1]
+        prefixed = symbols != bars.index
+        aliases = bars[prefixed].set_axis(symbols[prefixed])
+        bars = pd.concat([bars, aliases[~aliases.index.isin(bars.index)]])
+
+    return bars
+
+
+def spot_symbol(market_type: str, code: str) -> str:
+    """
+    本地存储的代码在行情快照中的写法
+
+    Args:
+        market_type: 市场类型
+        code: 本地存储的代码
+
+    Returns:
+        行情快照中的代码，如ETF的sh510050对应510050
+    """
+    if market_type in PREFIXED_MARKETS and code[:2].lower() in ('sh', 'sz'):
+        return code[2:]
+    return code
+
+
+class SpotBarIngestor:
+    """
+    收盘后当日K线批量写入
+    每个市场只请求一次全市场行情快照，把当日K线追加到本地K线存储中已有的每个代码，
+    代替收盘后逐个代码向上游补齐尾部数据
+
+    本地存储按代码分文件，追加一根K线需要重写该代码的Parquet文件，无法合并为一次写入；
+    逐个代码读写只在收盘后执行一次、在后台线程中进行，且只处理快照中有行情的代码，
+    每个文件只有几百到几千行，相比逐个代码请求上游的耗时可以忽略
+    """
+
+    def __init__(self, store: Optional[OHLCVStore] = None):
+        """
+        初始化当日K线批量写入
+
+        Args:
+            store: 本地K线存储，默认为进程级存储（未启用时不写入）
+        """
+        self.store = store or get_ohlcv_store()
+
+    async def ingest(self, market_type: str, session_date: date) -> Dict[str, int]:
+        """
+        异步写入一个市场的当日K线
+
+        Args:
+            market_type: 市场类型，支持SPOT_SOURCES中的市场
+            session_date: 行情快照对应的交易日（应在收盘后调用）
+
+        Returns:
+            统计信息字典
+        """
+        return await get_upstream_gateway().run(self._ingest_sync, market_type, session_date)
+
+    def _ingest_sync(self, market_type: str, session_date: date) -> Dict[str, int]:
+        """同步写入的实现，在上游网关线程池中执行"""
+        stats = {'stored': 0, 'quoted': 0, 'appended': 0, 'up_to_date': 0, 'mismatched': 0}
+        if self.store is None or market_type not in SPOT_SOURCES:
+            return stats
+
+        adjust = StockDataProvider.ADJUST_MODES.get(market_type, 'none')
+        stored_codes = self.store.list_codes(market_type, adjust)
+        stats['stored'] = len(stored_codes)
+        if not stored_codes:
+            logger.info(f"本地没有{market_type}市场的K线数据，跳过当日K线写入")
+            return stats
+
+        source, func_name, _ = SPOT_SOURCES[market_type]
+        spot_df = get_upstream_gateway().call(source, getattr(get_data_source(), func_name))
+        bars = build_spot_bars(spot_df, market_type)
+
+        # 快照代码 -> 本地存储的代码（同一标的可能以带前缀和不带前缀两种写法存储）
+        codes_by_symbol: Dict[str, List[str]] = {}
+        for code in stored_codes:
+            codes_by_symbol.setdefault(spot_symbol(market_type, code), []).append(code)
+        bars = bars[bars.index.isin(codes_by_symbol.keys())]
+
+        session_ts = pd.Timestamp(session_date)
+        meta_update = {
+            'checked_at': datetime.now().isoformat(),
+            'final_date': session_ts.strftime('%Y%m%d')
+        }
+
+        for symbol, bar in bars.to_dict('index').items():
+            for code in codes_by_symbol[symbol]:
+                stats['quoted'] += 1
+                result = self._append_bar(market_type, code, adjust, session_ts, bar, meta_update)
+                stats[result] += 1
+
+        logger.info(f"{market_type}当日K线写入完成: {session_ts.date()}, 本地代码 {stats['stored']} 个, "
+                    f"有行情 {stats['quoted']} 个, 写入 {stats['appended']} 个, 已是最新 {stats['up_to_date']} 个, "
+                    f"与本地数据不连续 {stats['mismatched']} 个")
+        return stats
+
+    def _append_bar(self, market_type: str, code: str, adjust: str, session_ts: pd.Timestamp,
+                    bar: Dict[str, float], meta_update: Dict[str, str]) -> str:
+        """
+        把一根当日K线写入一个代码的本地数据
+
+        本地最后一根K线已是当日时（盘中拉取、尚未定型）以快照数据替换；
+        快照中的昨收与本地前一根K线收盘价不一致（数据有缺口或除权后前复权价格变化）时不写入，
+        留给正常的尾部补齐流程处理
+
+        Returns:
+            统计项名称
+        """
+        with self.store.lock(market_type, code, adjust):
+            stored_df, meta = self.store.load(market_type, code, adjust)
+            if stored_df is None or stored_df.empty or 'Close' not in stored_df.columns:
+                return 'mismatched'
+
+            last_dt = stored_df.index[-1]
+            if last_dt > session_ts or (last_dt == session_ts and meta.get('final_date') == meta_update['final_date']):
+                return 'up_to_date'
+
+            base_df = stored_df[stored_df.index < session_ts]
+            if base_df.empty:
+                return 'mismatched'
+            prev_close = float(base_df['Close'].iloc[-1])
+            if abs(prev_close - bar['PrevClose']) > max(PREV_CLOSE_TOLERANCE * prev_close, PREV_CLOSE_MIN_TOLERANCE):
+                return 'mismatched'
+
+            row = {column: (code if column == 'Code' else bar.get(column, np.nan)) for column in stored_df.columns}
+            row_df = pd.DataFrame([row], index=pd.DatetimeIndex([session_ts], name=stored_df.index.name))
+            self.store.save(market_type, code, adjust, pd.concat([base_df, row_df]), {**meta, **meta_update})
+            return 'appended'
+
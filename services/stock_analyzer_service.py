@@ -1,11 +1,18 @@
+import os
 import json
+import time
+import heapq
+import pandas as pd
 from datetime import datetime
-from typing import List, AsyncGenerator
+from typing import List, Dict, Any, AsyncGenerator
 from utils.logger import get_logger
+from utils.stream_merge import merge_async_streams, iter_ready_batches
 from services.stock_data_provider import StockDataProvider
 from services.technical_indicator import TechnicalIndicator
 from services.stock_scorer import StockScorer
 from services.ai_analyzer import AIAnalyzer
+from services.score_table import get_score_table_store
+from utils.metrics import get_metrics, STAGE_INDICATORS, STAGE_SCORING
 
 # 获取日志器
 logger = get_logger()
@@ -37,6 +44,10 @@ class StockAnalyzerService:
             custom_api_timeout=custom_api_timeout
         )
         
+        # 批量扫描时AI分析的数量和并发度
+        self.ai_top_n = int(os.getenv('SCAN_AI_TOP_N', 5))
+        self.ai_concurrency = int(os.getenv('SCAN_AI_CONCURRENCY', 5))
+        
         logger.info("初始化StockAnalyzerService完成")
     
     async def analyze_stock(self, stock_code: str, market_type: str = 'A', stream: bool = False) -> AsyncGenerator[str, None]:
@@ -54,6 +65,20 @@ class StockAnalyzerService:
         try:
             logger.info(f"开始分析股票: {stock_code}, 市场: {market_type}")
             
+            # 盘后优先使用收盘后预先计算的评分表，命中时直接输出基本分析结果，不再实时评分；
+            # K线和技术指标仍需作为AI分析的输入（收盘后已预热本地存储和指标缓存）
+            basic_result = None
+            store = get_score_table_store()
+            precomputed = store.lookup_current(market_type, [stock_code], 'stock_code') if store else {}
+            if stock_code in precomputed:
+                basic_result = {
+                    **precomputed[stock_code],
+                    "market_type": market_type,
+                    "analysis_date": datetime.now().strftime('%Y-%m-%d'),
+                    "ai_analysis": ""
+                }
+                yield json.dumps(basic_result)
+            
             # 获取股票数据
             df = await self.data_provider.get_stock_data(stock_code, market_type)
             
@@ -82,84 +107,16 @@ class StockAnalyzerService:
                 return
             
             # 计算技术指标
-            df_with_indicators = self.indicator.calculate_indicators(df)
-            
-            # 计算评分
-            score = self.scorer.calculate_score(df_with_indicators)
-            recommendation = self.scorer.get_recommendation(score)
-            
-            # 获取最新数据
-            latest_data = df_with_indicators.iloc[-1]
-            previous_data = df_with_indicators.iloc[-2] if len(df_with_indicators) > 1 else latest_data
-            
-            # 价格变动绝对值
-            price_change_value = latest_data['Close'] - previous_data['Close']
-            
-            # 优先使用原始数据中的涨跌幅(Change_pct)
-            change_percent = latest_data.get('Change_pct')
+            with get_metrics().time_stage(STAGE_INDICATORS, market_type):
+                df_with_indicators = await self.indicator.calculate_indicators_async(df, stock_code, market_type)
             
-            # 如果原始数据中没有涨跌幅，才进行计算
-            if change_percent is None and previous_data['Close'] != 0:
-                change_percent = (price_change_value / previous_data['Close']) * 100
-            
-            # 确定MA趋势
-            ma_short = latest_data.get('MA5', 0)
-            ma_medium = latest_data.get('MA20', 0)
-            ma_long = latest_data.get('MA60', 0)
-            
-            if ma_short > ma_medium > ma_long:
-                ma_trend = "UP"
-            elif ma_short < ma_medium < ma_long:
-                ma_trend = "DOWN"
-            else:
-                ma_trend = "FLAT"
-                
-            # 确定MACD信号
-            macd = latest_data.get('MACD', 0)
-            signal = latest_data.get('Signal', 0)
-            
-            if macd > signal:
-                macd_signal = "BUY"
-            elif macd < signal:
-                macd_signal = "SELL"
-            else:
-                macd_signal = "HOLD"
-                
-            # 确定成交量状态
-            volume = latest_data.get('Volume', 0)
-            volume_ma = latest_data.get('Volume_MA', 0)
-            
-            if volume > volume_ma * 1.5:
-                volume_status = "HIGH"
-            elif volume < volume_ma * 0.5:
-                volume_status = "LOW"
-            else:
-                volume_status = "NORMAL"
+            # 盘后评分表中没有该代码时实时计算评分
+            if basic_result is None:
+                basic_result = self._build_analysis_result(stock_code, market_type, df_with_indicators)
                 
-            # 当前分析日期
-            analysis_date = datetime.now().strftime('%Y-%m-%d')
-            
-            # 生成基本分析结果
-            basic_result = {
-                "stock_code": stock_code,
-                "market_type": market_type,
-                "analysis_date": analysis_date,
-                "score": score,
-                "price": latest_data['Close'],
-                "price_change_value": price_change_value,  # 价格变动绝对值
-                "price_change": change_percent,  # 兼容旧版前端，传递涨跌幅
-                "change_percent": change_percent,  # 涨跌幅百分比，新字段
-                "ma_trend": ma_trend,
-                "rsi": latest_data.get('RSI', 0),
-                "macd_signal": macd_signal,
-                "volume_status": volume_status,
-                "recommendation": recommendation,
-                "ai_analysis": ""
-            }
-            
-            # 输出基本分析结果
-            logger.info(f"基本分析结果: {json.dumps(basic_result)}")
-            yield json.dumps(basic_result)
+                # 输出基本分析结果
+                logger.info(f"基本分析结果: {json.dumps(basic_result)}")
+                yield json.dumps(basic_result)
             
             # 使用AI进行深入分析
             async for analysis_chunk in self.ai_analyzer.get_ai_analysis(df_with_indicators, stock_code, market_type, stream):
@@ -173,7 +130,95 @@ class StockAnalyzerService:
             logger.exception(e)
             yield json.dumps({"error": error_msg})
     
-    async def scan_stocks(self, stock_codes: List[str], market_type: str = 'A', min_score: int = 0, stream: bool = False) -> AsyncGenerator[str, None]:
+    def _build_analysis_result(self, stock_code: str, market_type: str, df: pd.DataFrame) -> Dict[str, Any]:
+        """
+        实时计算单只股票的评分并生成基本分析结果
+        
+        Args:
+            stock_code: 股票代码
+            market_type: 市场类型
+            df: 包含技术指标的DataFrame
+        
+        Returns:
+            基本分析结果字典
+        """
+        # 计算评分
+        with get_metrics().time_stage(STAGE_SCORING, market_type):
+            score = self.scorer.calculate_score(df)
+            recommendation = self.scorer.get_recommendation(score)
+        
+        # 获取最新数据
+        latest_data = df.iloc[-1]
+        previous_data = df.iloc[-2] if len(df) > 1 else latest_data
+        
+        # 价格变动绝对值
+        price_change_value = latest_data['Close'] - previous_data['Close']
+        
+        # 优先使用原始数据中的涨跌幅(Change_pct)
+        change_percent = latest_data.get('Change_pct')
+        
+        # 如果原始数据中没有涨跌幅，才进行计算
+        if change_percent is None and previous_data['Close'] != 0:
+            change_percent = (price_change_value / previous_data['Close']) * 100
+        
+        # 确定MA趋势
+        ma_short = latest_data.get('MA5', 0)
+        ma_medium = latest_data.get('MA20', 0)
+        ma_long = latest_data.get('MA60', 0)
+        
+        if ma_short > ma_medium > ma_long:
+            ma_trend = "UP"
+        elif ma_short < ma_medium < ma_long:
+            ma_trend = "DOWN"
+        else:
+            ma_trend = "FLAT"
+        
+        # 确定MACD信号
+        macd = latest_data.get('MACD', 0)
+        signal = latest_data.get('Signal', 0)
+        
+        if macd > signal:
+            macd_signal = "BUY"
+        elif macd < signal:
+            macd_signal = "SELL"
+        else:
+            macd_signal = "HOLD"
+        
+        # 确定成交量状态
+        volume = latest_data.get('Volume', 0)
+        volume_ma = latest_data.get('Volume_MA', 0)
+        
+        if volume > volume_ma * 1.5:
+            volume_status = "HIGH"
+        elif volume < volume_ma * 0.5:
+            volume_status = "LOW"
+        else:
+            volume_status = "NORMAL"
+        
+        # 当前分析日期
+        analysis_date = datetime.now().strftime('%Y-%m-%d')
+        
+        # 生成基本分析结果
+        return {
+            "stock_code": stock_code,
+            "market_type": market_type,
+            "analysis_date": analysis_date,
+            "score": score,
+            "price": latest_data['Close'],
+            "price_change_value": price_change_value,  # 价格变动绝对值
+            "price_change": change_percent,  # 兼容旧版前端，传递涨跌幅
+            "change_percent": change_percent,  # 涨跌幅百分比，新字段
+            "ma_trend": ma_trend,
+            "rsi": latest_data.get('RSI', 0),
+            "macd_signal": macd_signal,
+            "volume_status": volume_status,
+            "recommendation": recommendation,
+            "ai_analysis": ""
+        }
+    
+    async def scan_stocks(self, stock_codes: List[str], market_type: str = 'A', min_score: int = 0, stream: bool = False,
+                          ai_top_n: int = None, ai_concurrency: int = None,
+                          summary: bool = False) -> AsyncGenerator[str, None]:
         """
         批量扫描股票
         
@@ -182,6 +227,9 @@ class StockAnalyzerService:
             market_type: 市场类型
             min_score: 最低评分阈值
             stream: 是否使用流式响应
+            ai_top_n: 进行AI分析的最高评分数量，默认为环境变量SCAN_AI_TOP_N（默认5）
+            ai_concurrency: AI分析的最大并发数，默认为环境变量SCAN_AI_CONCURRENCY（默认5）
+            summary: 是否在全部评分后输出汇总排名消息，默认不输出（旧版前端按单个代码解析流式消息）
             
         Returns:
             异步生成器，生成扫描结果的JSON字符串
@@ -197,67 +245,116 @@ class StockAnalyzerService:
                 "min_score": min_score
             })
             
-            # 批量获取股票数据
-            stock_data_dict = await self.data_provider.get_multiple_stocks_data(stock_codes, market_type)
+            # 盘后优先使用收盘后预先计算的评分表，只对表中没有的代码实时计算
+            store = get_score_table_store()
+            precomputed = store.lookup_current(market_type, stock_codes, 'stock_code') if store else {}
+            live_codes = [code for code in stock_codes if code not in precomputed]
             
-            # 计算技术指标
+            results = []
             stock_with_indicators = {}
-            for code, df in stock_data_dict.items():
-                try:
-                    stock_with_indicators[code] = self.indicator.calculate_indicators(df)
-                except Exception as e:
-                    logger.error(f"计算 {code} 技术指标时出错: {str(e)}")
-                    # 发送错误状态
-                    yield json.dumps({
-                        "stock_code": code,
-                        "error": f"计算技术指标时出错: {str(e)}",
-                        "status": "error"
-                    })
-            
-            # 评分股票
-            results = self.scorer.batch_score_stocks(stock_with_indicators)
             
-            # 过滤低于最低评分的股票
-            filtered_results = [r for r in results if r[1] >= min_score]
+            # 预计算的评分无需获取数据，直接输出
+            for code, row in precomputed.items():
+                score = int(row['score'])
+                results.append((code, score, row['recommendation']))
+                message = dict(row)
+                message["status"] = "completed" if score < min_score else "waiting"
+                yield json.dumps(message)
             
-            # 为每只股票发送基本评分和推荐信息
-            for code, score, rec in results:
-                df = stock_with_indicators.get(code)
-                if df is not None and len(df) > 0:
-                    # 获取最新数据
-                    latest_data = df.iloc[-1]
-                    previous_data = df.iloc[-2] if len(df) > 1 else latest_data
+            # 逐只获取股票数据，每当有数据到达就对已到达的这一批计算指标和评分并立即输出，
+            # 首个结果不必等待最慢的请求；数据到达密集时批次自动变大，仍按面板模式向量化计算
+            if live_codes:
+                fetched = self.data_provider.iter_multiple_stocks_data(live_codes, market_type)
+                async for batch in iter_ready_batches(fetched):
+                    # 过滤获取失败或为空的数据
+                    valid_data_dict = {}
+                    for code, df in batch:
+                        if df is None or hasattr(df, 'error') or df.empty:
+                            error_msg = getattr(df, 'error', f"获取到的股票 {code} 数据为空")
+                            logger.error(f"计算 {code} 技术指标时出错: {error_msg}")
+                            yield json.dumps({
+                                "stock_code": code,
+                                "error": f"计算技术指标时出错: {error_msg}",
+                                "status": "error"
+                            })
+                        else:
+                            valid_data_dict[code] = df
+                    
+                    if not valid_data_dict:
+                        continue
                     
-                    # 价格变动绝对值
-                    price_change_value = latest_data['Close'] - previous_data['Close']
+                    # 计算技术指标：面板模式一次性向量化计算，失败时退回逐只计算
+                    indicators_started = time.perf_counter()
+                    try:
+                        batch_indicators = await self.indicator.calculate_indicators_batch_async(valid_data_dict, market_type)
+                    except Exception as e:
+                        logger.warning(f"面板模式计算技术指标失败，改为逐只计算: {str(e)}")
+                        batch_indicators = {}
+                        for code, df in valid_data_dict.items():
+                            try:
+                                batch_indicators[code] = await self.indicator.calculate_indicators_async(df, code, market_type)
+                            except Exception as e:
+                                logger.error(f"计算 {code} 技术指标时出错: {str(e)}")
+                                # 发送错误状态
+                                yield json.dumps({
+                                    "stock_code": code,
+                                    "error": f"计算技术指标时出错: {str(e)}",
+                                    "status": "error"
+                                })
                     
-                    # 获取涨跌幅
-                    change_percent = latest_data.get('Change_pct')
+                    get_metrics().observe_stage(STAGE_INDICATORS, time.perf_counter() - indicators_started, market_type)
+                    if not batch_indicators:
+                        continue
                     
-                    # 发送股票基本信息和评分
-                    yield json.dumps({
-                        "stock_code": code,
-                        "score": score,
-                        "recommendation": rec,
-                        "price": float(latest_data.get('Close', 0)),
-                        "price_change_value": float(price_change_value),  # 价格变动绝对值
-                        "price_change": change_percent,  # 兼容旧版前端，传递涨跌幅
-                        "change_percent": change_percent,  # 涨跌幅百分比，新字段
-                        "rsi": float(latest_data.get('RSI', 0)) if 'RSI' in latest_data else None,
-                        "ma_trend": "UP" if latest_data.get('MA5', 0) > latest_data.get('MA20', 0) else "DOWN",
-                        "macd_signal": "BUY" if latest_data.get('MACD', 0) > latest_data.get('MACD_Signal', 0) else "SELL",
-                        "volume_status": "HIGH" if latest_data.get('Volume_Ratio', 1) > 1.5 else ("LOW" if latest_data.get('Volume_Ratio', 1) < 0.5 else "NORMAL"),
-                        "status": "completed" if score < min_score else "waiting"
-                    })
+                    # 评分股票
+                    with get_metrics().time_stage(STAGE_SCORING, market_type):
+                        batch_results = await self.scorer.batch_score_stocks_async(batch_indicators)
+                    
+                    # 为每只股票发送基本评分和推荐信息
+                    for code, score, rec in batch_results:
+                        df = batch_indicators.get(code)
+                        if df is None or len(df) == 0:
+                            continue
+                        stock_with_indicators[code] = df
+                        results.append((code, score, rec))
+                        
+                        message = self._build_score_message(code, df, score, rec)
+                        message["status"] = "completed" if score < min_score else "waiting"
+                        yield json.dumps(message)
+            
+            # 全部结果到齐后按评分重新排序，调用方要求时输出汇总排名
+            results.sort(key=lambda x: x[1], reverse=True)
+            if summary:
+                yield json.dumps({
+                    "scan_summary": True,
+                    "ranking": [
+                        {"stock_code": code, "score": score, "recommendation": rec}
+                        for code, score, rec in results
+                    ]
+                })
+            
+            # 过滤低于最低评分的股票
+            filtered_results = [r for r in results if r[1] >= min_score]
             
             # 如果需要进一步分析，对评分较高的股票进行AI分析
             if stream and filtered_results:
-                # 只分析前5只评分最高的股票，避免分析过多导致前端卡顿
-                top_stocks = filtered_results[:5]
+                # 只分析评分最高的前N只股票，多个AI流以有限并发同时进行，按stock_code标记的数据块交错输出
+                top_n = self.ai_top_n if ai_top_n is None else ai_top_n
+                concurrency = self.ai_concurrency if ai_concurrency is None else ai_concurrency
+                top_stocks = filtered_results[:top_n]
                 
-                for stock_code, score, _ in top_stocks:
-                    df = stock_with_indicators.get(stock_code)
-                    if df is not None:
+                # 评分来自预计算表的股票仍需K线和指标作为AI分析的输入（收盘后已预热本地存储和指标缓存）
+                missing_codes = [code for code, _, _ in top_stocks if code not in stock_with_indicators]
+                if missing_codes:
+                    missing_data = await self.data_provider.get_multiple_stocks_data(missing_codes, market_type)
+                    for code, df in missing_data.items():
+                        if hasattr(df, 'error') or df.empty:
+                            logger.error(f"获取 {code} 数据失败，跳过AI分析: {getattr(df, 'error', '数据为空')}")
+                            continue
+                        stock_with_indicators[code] = await self.indicator.calculate_indicators_async(df, code, market_type)
+                
+                def make_analysis_stream(stock_code, df):
+                    async def analysis_stream():
                         # 输出正在分析的股票信息
                         yield json.dumps({
                             "stock_code": stock_code,
@@ -267,6 +364,17 @@ class StockAnalyzerService:
                         # AI分析
                         async for analysis_chunk in self.ai_analyzer.get_ai_analysis(df, stock_code, market_type, stream):
                             yield analysis_chunk
+                    return analysis_stream
+                
+                analysis_streams = [
+                    make_analysis_stream(stock_code, stock_with_indicators[stock_code])
+                    for stock_code, _, _ in top_stocks
+                    if stock_with_indicators.get(stock_code) is not None
+                ]
+                
+                logger.info(f"开始AI分析评分最高的 {len(analysis_streams)} 只股票, 并发数: {concurrency}")
+                async for analysis_chunk in merge_async_streams(analysis_streams, concurrency):
+                    yield analysis_chunk
             
             # 输出扫描完成信息
             yield json.dumps({
@@ -282,3 +390,224 @@ class StockAnalyzerService:
             logger.error(error_msg)
             logger.exception(e)
             yield json.dumps({"error": error_msg})
+    
+    def _build_score_message(self, code: str, df, score: int, rec: str) -> Dict[str, Any]:
+        """
+        生成单只股票的评分消息（不含状态字段），实时扫描和收盘后评分表共用
+        
+        Args:
+            code: 股票代码
+            df: 包含技术指标的DataFrame
+            score: 评分
+            rec: 推荐
+            
+        Returns:
+            评分消息字典
+        """
+        # 获取最新数据
+        latest_data = df.iloc[-1]
+        previous_data = df.iloc[-2] if len(df) > 1 else latest_data
+        
+        # 价格变动绝对值
+        price_change_value = latest_data['Close'] - previous_data['Close']
+        
+        # 获取涨跌幅
+        change_percent = latest_data.get('Change_pct')
+        
+        return {
+            "stock_code": code,
+            "score": score,
+            "recommendation": rec,
+            "price": float(latest_data.get('Close', 0)),
+            "price_change_value": float(price_change_value),  # 价格变动绝对值
+            "price_change": change_percent,  # 兼容旧版前端，传递涨跌幅
+            "change_percent": change_percent,  # 涨跌幅百分比，新字段
+            "rsi": float(latest_data.get('RSI', 0)) if 'RSI' in latest_data else None,
+            "ma_trend": "UP" if latest_data.get('MA5', 0) > latest_data.get('MA20', 0) else "DOWN",
+            "macd_signal": "BUY" if latest_data.get('MACD', 0) > latest_data.get('MACD_Signal', 0) else "SELL",
+            "volume_status": "HIGH" if latest_data.get('Volume_Ratio', 1) > 1.5 else ("LOW" if latest_data.get('Volume_Ratio', 1) < 0.5 else "NORMAL")
+        }
+    
+    async def build_score_table(self, stock_codes: List[str], market_type: str = 'A',
+                                chunk_size: int = None) -> pd.DataFrame:
+        """
+        计算一组股票的评分表（供收盘后调度任务使用）
+        
+        分块获取数据（同时预热本地K线存储）、计算技术指标（写入指标缓存）并评分
+        
+        Args:
+            stock_codes: 股票代码列表
+            market_type: 市场类型
+            chunk_size: 每块处理的代码数，默认为环境变量MARKET_SCAN_CHUNK_SIZE或100
+            
+        Returns:
+            以股票代码为索引的评分表
+        """
+        chunk_size = chunk_size or int(os.getenv('MARKET_SCAN_CHUNK_SIZE', 100))
+        rows = []
+        
+        for start in range(0, len(stock_codes), chunk_size):
+            chunk_codes = stock_codes[start:start + chunk_size]
+            stock_data_dict = await self.data_provider.get_multiple_stocks_data(chunk_codes, market_type)
+            valid_data_dict = {
+                code: df for code, df in stock_data_dict.items()
+                if not hasattr(df, 'error') and not df.empty
+            }
+            if not valid_data_dict:
+                continue
+            
+            stock_with_indicators = await self.indicator.calculate_indicators_batch_async(valid_data_dict, market_type)
+            for code, score, rec in await self.scorer.batch_score_stocks_async(stock_with_indicators):
+                message = self._build_score_message(code, stock_with_indicators[code], score, rec)
+                message["bar_date"] = str(stock_with_indicators[code].index[-1])[:10]
+                rows.append(message)
+        
+        table = pd.DataFrame(rows)
+        if not table.empty:
+            table = table.set_index('stock_code')
+        return table
+    
+    async def scan_market(self, market_type: str = 'A', top_k: int = 20, min_score: int = 0,
+                          chunk_size: int = None) -> AsyncGenerator[str, None]:
+        """
+        全市场扫描
+        
+        按固定大小分块依次完成 获取数据 → 面板计算指标 → 向量化评分，每块处理完即释放数据，
+        只保留评分最高的top_k个结果，峰值内存与市场规模无关
+        
+        Args:
+            market_type: 市场类型，支持'A'、'ETF'、'LOF'
+            top_k: 保留的最高评分结果数
+            min_score: 最低评分阈值
+            chunk_size: 每块处理的代码数，默认为环境变量MARKET_SCAN_CHUNK_SIZE或100
+            
+        Returns:
+            异步生成器，生成扫描进度和结果的JSON字符串
+        """
+        try:
+            chunk_size = chunk_size or int(os.getenv('MARKET_SCAN_CHUNK_SIZE', 100))
+            
+            codes = await self.data_provider.get_market_universe(market_type)
+            total = len(codes)
+            logger.info(f"开始全市场扫描, 市场: {market_type}, 共 {total} 个代码, 分块大小: {chunk_size}")
+            
+            yield json.dumps({
+                "stream_type": "market_scan",
+                "market_type": market_type,
+                "total": total,
+                "top_k": top_k,
+                "min_score": min_score
+            })
+            
+            # 最小堆保存(评分, 负序号, 结果)，堆顶为当前top_k中的最低分（同分时先匹配的优先保留）
+            top_heap = []
+            processed = 0
+            matched = 0
+            failed = 0
+            
+            for start in range(0, total, chunk_size):
+                chunk_codes = codes[start:start + chunk_size]
+                stock_data_dict = await self.data_provider.get_multiple_stocks_data(chunk_codes, market_type)
+                valid_data_dict = {
+                    code: df for code, df in stock_data_dict.items()
+                    if not hasattr(df, 'error') and not df.empty
+                }
+                failed += len(chunk_codes) - len(valid_data_dict)
+                
+                if valid_data_dict:
+                    for result in await self._score_market_chunk(valid_data_dict, market_type):
+                        if result['score'] < min_score:
+                            continue
+                        matched += 1
+                        entry = (result['score'], -matched, result)
+                        if len(top_heap) < top_k:
+                            heapq.heappush(top_heap, entry)
+                        elif entry[0] > top_heap[0][0]:
+                            heapq.heapreplace(top_heap, entry)
+                
+                # 释放本块数据
+                del stock_data_dict, valid_data_dict
+                processed += len(chunk_codes)
+                
+                yield json.dumps({
+                    "stream_type": "market_scan_progress",
+                    "processed": processed,
+                    "total": total,
+                    "matched": matched,
+                    "failed": failed,
+                    "top": self._sorted_top(top_heap)
+                })
+            
+            yield json.dumps({
+                "scan_completed": True,
+                "market_type": market_type,
+                "total_scanned": processed - failed,
+                "total_matched": matched,
+                "results": self._sorted_top(top_heap)
+            })
+            
+            logger.info(f"完成全市场扫描, 市场: {market_type}, 有效: {processed - failed}, 符合条件: {matched}")
+            
+        except Exception as e:
+            error_msg = f"全市场扫描时出错: {str(e)}"
+            logger.error(error_msg)
+            logger.exception(e)
+            yield json.dumps({"error": error_msg})
+    
+    async def _score_market_chunk(self, stock_data_dict: Dict[str, Any], market_type: str) -> List[Dict[str, Any]]:
+        """
+        对一块股票做面板指标计算和向量化评分，只返回精简的结果字典，不保留DataFrame
+        
+        Args:
+            stock_data_dict: 字典，键为股票代码，值为原始价格数据
+            market_type: 市场类型
+            
+        Returns:
+            结果字典列表
+        """
+        try:
+            with get_metrics().time_stage(STAGE_INDICATORS, market_type):
+                panel = await self.indicator.calculate_panel_indicators_async(stock_data_dict)
+        except Exception as e:
+            logger.error(f"全市场扫描计算技术指标时出错: {str(e)}")
+            return []
+        
+        with get_metrics().time_stage(STAGE_SCORING, market_type):
+            table = panel.latest(self.scorer.SCORE_COLUMNS + ['Volume', 'Volume_MA'])
+            previous_close = panel.latest(['Close'], offset=1)['Close']
+            scores, recommendations = self.scorer.score_table(table)
+        
+        results = []
+        for i, (code, row) in enumerate(zip(table.index, table.itertuples(index=False))):
+            price = row.Close
+            prev_price = previous_close.iat[i] if previous_close.iat[i] == previous_close.iat[i] else price
+            
+            # 优先使用原始数据中的涨跌幅，缺失(NaN)时按前收盘价计算
+            df = stock_data_dict[code]
+            change_percent = float(df['Change_pct'].iat[-1]) if 'Change_pct' in df.columns else float('nan')
+            if change_percent != change_percent:
+                change_percent = (price - prev_price) / prev_price * 100 if prev_price else 0.0
+            # NaN无法序列化为合法的JSON，仍无法计算时返回None
+            if change_percent != change_percent:
+                change_percent = None
+
+            results.append({
+                "stock_code": code,
+                "market_type": market_type,
+                "score": int(scores[i]),
+                "recommendation": str(recommendations[i]),
+                "price": float(price),
+                "price_change_value": float(price - prev_price),
+                "price_change": change_percent,
+                "change_percent": change_percent,
+                "rsi": float(row.RSI) if row.RSI == row.RSI else None,
+                "ma_trend": "UP" if row.MA5 > row.MA20 else "DOWN",
+                "macd_signal": "BUY" if row.MACD > row.Signal else "SELL",
+                "volume_status": "HIGH" if row.Volume_Ratio > 1.5 else ("LOW" if row.Volume_Ratio < 0.5 else "NORMAL")
+            })
+        return results
+    
+    @staticmethod
+    def _sorted_top(top_heap: List) -> List[Dict[str, Any]]:
+        """将top_k最小堆转为按评分降序排列的结果列表"""
+        return [entry[2] for entry in sorted(top_heap, reverse=True)]
@@ -1,8 +1,14 @@
+import time
 import pandas as pd
 from datetime import datetime, timedelta
 import asyncio
-from typing import Dict, List, Optional, Tuple, Any
+from typing import Dict, List, Optional, Tuple, Any, AsyncGenerator
 from utils.logger import get_logger
+from utils.upstream_gateway import get_upstream_gateway, SOURCE_EM, SOURCE_HK, SOURCE_SINA, SOURCE_US
+from services.data_source import get_data_source
+from utils.metrics import get_metrics, STAGE_UPSTREAM_FETCH, STAGE_NORMALIZATION
+from services.ohlcv_store import get_ohlcv_store
+from utils.singleflight import SingleFlight
 
 # 获取日志器
 logger = get_logger()
@@ -13,9 +19,32 @@ class StockDataProvider:
     负责获取股票、基金等金融产品的历史数据
     """
     
+    # 各市场历史数据使用的复权方式，作为本地存储键的一部分
+    ADJUST_MODES = {
+        'A': 'qfq',
+        'HK': 'qfq',
+        'US': 'qfq',
+        'ETF': 'none',
+        'LOF': 'none'
+    }
+    
+    # 各市场历史数据的上游数据源，批量请求按数据源控制并发
+    UPSTREAM_SOURCES = {
+        'A': SOURCE_EM,
+        'HK': SOURCE_HK,
+        'US': SOURCE_US,
+        'ETF': SOURCE_SINA,
+        'LOF': SOURCE_SINA
+    }
+    
+    # 进程级请求合并器：并发请求同一代码、市场和日期区间时只发起一次上游调用
+    _single_flight = SingleFlight("stock_data")
+    
     def __init__(self):
         """初始化数据提供者服务"""
-        logger.debug("初始化StockDataProvider")
+        # 本地K线存储，未启用时为None
+        self.store = get_ohlcv_store()
+        logger.debug(f"初始化StockDataProvider, 本地存储: {'已启用' if self.store else '未启用'}")
     
     async def get_stock_data(self, stock_code: str, market_type: str = 'A', 
                             start_date: Optional[str] = None, 
@@ -32,13 +61,24 @@ class StockDataProvider:
         Returns:
             包含历史数据的DataFrame
         """
-        # 使用线程池执行同步的akshare调用
-        return await asyncio.to_thread(
-            self._get_stock_data_sync, 
-            stock_code, 
-            market_type, 
-            start_date, 
-            end_date
+        # 先确定默认日期，保证相同请求得到相同的合并键
+        if start_date is None:
+            start_date = (datetime.now() - timedelta(days=365)).strftime('%Y%m%d')
+        if end_date is None:
+            end_date = datetime.now().strftime('%Y%m%d')
+        start_date = start_date.replace('-', '')
+        end_date = end_date.replace('-', '')
+        
+        # 在上游网关线程池中执行同步的akshare调用，并发的相同请求共享同一次调用
+        return await self._single_flight.do(
+            (market_type, stock_code, start_date, end_date),
+            lambda: get_upstream_gateway().run(
+                self._get_stock_data_sync, 
+                stock_code, 
+                market_type, 
+                start_date, 
+                end_date
+            )
         )
     
     def _get_stock_data_sync(self, stock_code: str, market_type: str = 'A', 
@@ -46,9 +86,116 @@ class StockDataProvider:
                            end_date: Optional[str] = None) -> pd.DataFrame:
         """
         同步获取股票数据的实现
-        将被异步方法调用
+        将被异步方法调用，启用本地存储时优先读取本地数据，仅向上游补齐缺失的尾部
+        """
+        if start_date is None:
+            start_date = (datetime.now() - timedelta(days=365)).strftime('%Y%m%d')
+        if end_date is None:
+            end_date = datetime.now().strftime('%Y%m%d')
+            
+        # 确保日期格式统一（移除可能的'-'符号）
+        start_date = start_date.replace('-', '')
+        end_date = end_date.replace('-', '')
+        
+        if self.store is None:
+            return self._fetch_stock_data_sync(stock_code, market_type, start_date, end_date)
+        
+        try:
+            return self._get_stock_data_from_store(stock_code, market_type, start_date, end_date)
+        except Exception as e:
+            # 本地存储异常不应影响正常分析，退回直接请求上游
+            logger.warning(f"读取本地K线数据出错 {stock_code}: {str(e)}，改为直接请求上游")
+            return self._fetch_stock_data_sync(stock_code, market_type, start_date, end_date)
+    
+    def _get_stock_data_from_store(self, stock_code: str, market_type: str,
+                                   start_date: str, end_date: str) -> pd.DataFrame:
+        """
+        基于本地存储获取股票数据
+        
+        本地无数据或请求的起始日期早于已覆盖范围时全量拉取；
+        否则仅从倒数第二根K线起拉取尾部并合并，若重叠K线价格不一致（复权因子变化）则全量重建
+        
+        Args:
+            stock_code: 股票代码
+            market_type: 市场类型
+            start_date: 开始日期，格式YYYYMMDD
+            end_date: 结束日期，格式YYYYMMDD
+            
+        Returns:
+            包含历史数据的DataFrame
+        """
+        adjust = self.ADJUST_MODES.get(market_type, 'none')
+        start_date_dt = pd.to_datetime(start_date, format='%Y%m%d')
+        end_date_dt = pd.to_datetime(end_date, format='%Y%m%d')
+        
+        with self.store.lock(market_type, stock_code, adjust):
+            stored_df, meta = self.store.load(market_type, stock_code, adjust)
+            now = datetime.now()
+            
+            covered_start = meta.get('start')
+            if stored_df is None or stored_df.empty or not covered_start or start_date < covered_start:
+                logger.debug(f"本地无可用K线数据，全量拉取: {market_type} {stock_code}")
+                df = self._fetch_stock_data_sync(stock_code, market_type, start_date, end_date)
+                if not hasattr(df, 'error') and not df.empty:
+                    self.store.save(market_type, stock_code, adjust, df, {
+                        'start': start_date,
+                        'checked_at': now.isoformat()
+                    })
+                return df
+            
+            if self.store.is_fresh(meta, end_date_dt, now):
+                logger.debug(f"使用本地K线数据: {market_type} {stock_code}")
+            else:
+                # 从倒数第二根K线开始拉取：最后一根可能是盘中未定型的K线，倒数第二根用于校验复权
+                overlap_dt = stored_df.index[-2] if len(stored_df) > 1 else stored_df.index[-1]
+                tail_df = self._fetch_stock_data_sync(stock_code, market_type, overlap_dt.strftime('%Y%m%d'), end_date)
+                
+                if hasattr(tail_df, 'error'):
+                    # 上游失败时返回本地已有数据，保证可用性
+                    logger.warning(f"补齐尾部数据失败，使用本地数据: {market_type} {stock_code}")
+                    return self._slice_by_date(stored_df, start_date_dt, end_date_dt)
+                
+                if self._adjustment_changed(stored_df, tail_df, overlap_dt):
+                    logger.info(f"检测到复权价格变化，全量重建本地数据: {market_type} {stock_code}")
+                    full_df = self._fetch_stock_data_sync(stock_code, market_type, covered_start, end_date)
+                    if hasattr(full_df, 'error') or full_df.empty:
+                        return full_df
+                    stored_df = full_df
+                elif not tail_df.empty:
+                    stored_df = self.store.merge(stored_df, tail_df)
+                
+                self.store.save(market_type, stock_code, adjust, stored_df, {
+                    'start': covered_start,
+                    'checked_at': now.isoformat()
+                })
+                logger.debug(f"已补齐尾部K线数据: {market_type} {stock_code}, 新增数据点数: {len(tail_df)}")
+            
+            return self._slice_by_date(stored_df, start_date_dt, end_date_dt)
+    
+    def _adjustment_changed(self, stored_df: pd.DataFrame, tail_df: pd.DataFrame, overlap_dt) -> bool:
         """
-        import akshare as ak
+        判断重叠K线的收盘价是否变化（除权除息后前复权价格会整体变化）
+        """
+        if overlap_dt not in tail_df.index or 'Close' not in tail_df.columns:
+            return False
+        
+        stored_close = float(stored_df.loc[overlap_dt, 'Close'])
+        new_close = float(tail_df.loc[overlap_dt, 'Close'])
+        return abs(stored_close - new_close) > 1e-6 * max(1.0, abs(stored_close))
+    
+    def _slice_by_date(self, df: pd.DataFrame, start_date_dt, end_date_dt) -> pd.DataFrame:
+        """按日期范围截取数据"""
+        result = df[(df.index >= start_date_dt) & (df.index <= end_date_dt)].copy()
+        logger.info(f"从本地存储获取数据, 数据点数: {len(result)}")
+        return result
+    
+    def _fetch_stock_data_sync(self, stock_code: str, market_type: str = 'A', 
+                             start_date: Optional[str] = None, 
+                             end_date: Optional[str] = None) -> pd.DataFrame:
+        """
+        从上游(akshare)拉取股票数据并标准化列名
+        """
+        data_source = get_data_source()
         
         if start_date is None:
             start_date = (datetime.now() - timedelta(days=365)).strftime('%Y%m%d')
@@ -61,11 +208,12 @@ class StockDataProvider:
         if isinstance(end_date, str) and '-' in end_date:
             end_date = end_date.replace('-', '')
             
+        started = time.perf_counter()
         try:
             if market_type == 'A':
                 logger.debug(f"获取A股数据: {stock_code}")
                 
-                df = ak.stock_zh_a_hist(
+                df = get_upstream_gateway().fetch(SOURCE_EM, data_source.stock_zh_a_hist,
                     symbol=stock_code,
                     start_date=start_date,
                     end_date=end_date,
@@ -74,7 +222,7 @@ class StockDataProvider:
                 
             elif market_type in ['HK']:
                 logger.debug(f"获取港股数据: {stock_code}")
-                df = ak.stock_hk_daily(
+                df = get_upstream_gateway().fetch(SOURCE_HK, data_source.stock_hk_daily,
                     symbol=stock_code,
                     adjust="qfq"
                 )
@@ -119,7 +267,7 @@ class StockDataProvider:
             elif market_type in ['US']:
                 logger.debug(f"获取美股数据: {stock_code}")
                 try:
-                    df = ak.stock_us_daily(
+                    df = get_upstream_gateway().fetch(SOURCE_US, data_source.stock_us_daily,
                         symbol=stock_code,
                         adjust="qfq"
                     )
@@ -186,10 +334,12 @@ class StockDataProvider:
                     
             elif market_type in ['ETF', 'LOF']:
                 logger.debug(f"获取{market_type}基金数据: {stock_code}")
-                df = ak.fund_etf_hist_sina(
+                # 新浪较慢或出错时以东方财富的基金历史行情作为对冲和重试的备用数据源
+                df = get_upstream_gateway().fetch(SOURCE_SINA, data_source.fund_etf_hist_sina,
                     symbol=stock_code,
                     start_date=start_date.replace('-', ''),
-                    end_date=end_date.replace('-', '')
+                    end_date=end_date.replace('-', ''),
+                    alternate=(SOURCE_EM, lambda: self._fund_hist_em(market_type, stock_code, start_date, end_date))
                 )
                 
             else:
@@ -197,6 +347,9 @@ class StockDataProvider:
                 logger.error(f"[市场类型错误] {error_msg}")
                 raise ValueError(error_msg)
                 
+            fetched = time.perf_counter()
+            get_metrics().observe_stage(STAGE_UPSTREAM_FETCH, fetched - started, market_type)
+                
             # 标准化列名
             if market_type == 'A':
                 # 根据实际数据结构调整列名映射
@@ -240,6 +393,7 @@ class StockDataProvider:
             # 确保按日期升序排序
             df.sort_index(inplace=True)
                 
+            get_metrics().observe_stage(STAGE_NORMALIZATION, time.perf_counter() - fetched, market_type)
             logger.info(f"成功获取{market_type}数据 {stock_code}, 数据点数: {len(df)}")
             return df
             
@@ -253,11 +407,39 @@ class StockDataProvider:
             df.error = error_msg  # 添加错误属性
             return df
             
+    @staticmethod
+    def _fund_hist_em(market_type: str, stock_code: str, start_date: str, end_date: str) -> pd.DataFrame:
+        """
+        从东方财富获取ETF/LOF历史行情，转换为与新浪基金历史行情相同的结构
+        
+        Args:
+            market_type: 'ETF'或'LOF'
+            stock_code: 基金代码（可带sh/sz前缀）
+            start_date: 开始日期，格式YYYYMMDD
+            end_date: 结束日期，格式YYYYMMDD
+            
+        Returns:
+            列为date、open、high、low、close、volume、amount的DataFrame
+        """
+        data_source = get_data_source()
+        func = data_source.fund_etf_hist_em if market_type == 'ETF' else data_source.fund_lof_hist_em
+        df = func(symbol=stock_code.lstrip('shzSHZ'), period='daily', start_date=start_date, end_date=end_date, adjust='')
+        return pd.DataFrame({
+            'date': df['日期'],
+            'open': df['开盘'],
+            'high': df['最高'],
+            'low': df['最低'],
+            'close': df['收盘'],
+            # 东方财富基金行情的成交量单位为手，新浪为股
+            'volume': df['成交量'] * 100,
+            'amount': df['成交额']
+        })
+    
     async def get_multiple_stocks_data(self, stock_codes: List[str], 
                                      market_type: str = 'A',
                                      start_date: Optional[str] = None, 
                                      end_date: Optional[str] = None,
-                                     max_concurrency: int = 5) -> Dict[str, pd.DataFrame]:
+                                     max_concurrency: Optional[int] = None) -> Dict[str, pd.DataFrame]:
         """
         异步批量获取多只股票数据
         
@@ -266,16 +448,45 @@ class StockDataProvider:
             market_type: 市场类型，默认为'A'股
             start_date: 开始日期，格式YYYYMMDD
             end_date: 结束日期，格式YYYYMMDD
-            max_concurrency: 最大并发数，默认为5
+            max_concurrency: 固定的最大并发数，默认为None，使用数据源的自适应并发上限
             
         Returns:
             字典，键为股票代码，值为对应的DataFrame
         """
-        # 使用信号量控制并发数
-        semaphore = asyncio.Semaphore(max_concurrency)
+        results = {}
+        async for code, df in self.iter_multiple_stocks_data(stock_codes, market_type, start_date, end_date, max_concurrency=max_concurrency):
+            if df is not None:
+                results[code] = df
+        
+        # 按传入顺序构建结果字典，过滤掉失败的请求
+        return {code: results[code] for code in stock_codes if code in results}
+    
+    async def iter_multiple_stocks_data(self, stock_codes: List[str], 
+                                      market_type: str = 'A',
+                                      start_date: Optional[str] = None, 
+                                      end_date: Optional[str] = None,
+                                      max_concurrency: Optional[int] = None) -> AsyncGenerator[Tuple[str, Optional[pd.DataFrame]], None]:
+        """
+        异步批量获取多只股票数据，按完成顺序逐个产出，不必等待最慢的请求
+        
+        Args:
+            stock_codes: 股票代码列表
+            market_type: 市场类型，默认为'A'股
+            start_date: 开始日期，格式YYYYMMDD
+            end_date: 结束日期，格式YYYYMMDD
+            max_concurrency: 固定的最大并发数，默认为None，使用数据源的自适应并发上限
+            
+        Returns:
+            异步生成器，产出(代码, DataFrame)，获取时抛出异常的代码DataFrame为None
+        """
+        # 未指定固定并发数时按数据源的自适应并发上限控制，上游调用的成败和耗时会实时调整上限
+        if max_concurrency is None:
+            limiter = get_upstream_gateway().limiter(self.UPSTREAM_SOURCES.get(market_type, SOURCE_EM))
+        else:
+            limiter = asyncio.Semaphore(max_concurrency)
         
-        async def get_with_semaphore(code):
-            async with semaphore:
+        async def get_with_limit(code):
+            async with limiter:
                 try:
                     return code, await self.get_stock_data(code, market_type, start_date, end_date)
                 except Exception as e:
@@ -283,10 +494,46 @@ class StockDataProvider:
                     return code, None
         
         # 创建异步任务
-        tasks = [get_with_semaphore(code) for code in stock_codes]
+        tasks = [asyncio.ensure_future(get_with_limit(code)) for code in stock_codes]
+        
+        try:
+            for future in asyncio.as_completed(tasks):
+                yield await future
+        finally:
+            # 消费方提前结束时取消尚未完成的请求
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+    
+    async def get_market_universe(self, market_type: str = 'A') -> List[str]:
+        """
+        异步获取整个市场的代码列表
+        
+        Args:
+            market_type: 市场类型，支持'A'、'ETF'、'LOF'
+            
+        Returns:
+            代码列表
+        """
+        return await get_upstream_gateway().run(self._get_market_universe_sync, market_type)
+    
+    def _get_market_universe_sync(self, market_type: str) -> List[str]:
+        """
+        同步获取整个市场的代码列表（基于全市场实时行情快照）
+        """
+        data_source = get_data_source()
         
-        # 等待所有任务完成
-        results = await asyncio.gather(*tasks)
+        if market_type == 'A':
+            df = get_upstream_gateway().call(SOURCE_EM, data_source.stock_zh_a_spot_em)
+        elif market_type == 'ETF':
+            df = get_upstream_gateway().call(SOURCE_EM, data_source.fund_etf_spot_em)
+        elif market_type == 'LOF':
+            df = get_upstream_gateway().call(SOURCE_EM, data_source.fund_lof_spot_em)
+        else:
+            error_msg = f"不支持全市场扫描的市场类型: {market_type}"
+            logger.error(f"[市场类型错误] {error_msg}")
+            raise ValueError(error_msg)
         
-        # 构建结果字典，过滤掉失败的请求
-        return {code: df for code, df in results if df is not None}
\ No newline at end of file
+        codes = df['代码'].dropna().astype(str).drop_duplicates().tolist()
+        logger.info(f"获取{market_type}全市场代码列表成功, 共 {len(codes)} 个")
+        return codes
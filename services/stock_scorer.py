@@ -1,16 +1,35 @@
+import numpy as np
 import pandas as pd
 from typing import Dict, List, Tuple
 from utils.logger import get_logger
+from utils.compute_pool import get_compute_pool
 
 # 获取日志器
 logger = get_logger()
 
+
+def score_arrays(values: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    对按SCORE_COLUMNS排列的二维数组向量化评分（可在计算进程池中执行）
+    
+    Args:
+        values: (股票 × SCORE_COLUMNS) 的二维数组
+        
+    Returns:
+        (评分数组, 投资建议数组)的元组
+    """
+    return StockScorer().score_table(pd.DataFrame(values, columns=StockScorer.SCORE_COLUMNS))
+
+
 class StockScorer:
     """
     股票评分服务
     负责根据技术指标计算股票的综合评分
     """
     
+    # 评分所需的列
+    SCORE_COLUMNS = ['Close', 'MA5', 'MA20', 'MA60', 'RSI', 'MACD', 'Signal', 'Volume_Ratio']
+    
     def __init__(self):
         """初始化股票评分服务"""
         logger.debug("初始化StockScorer股票评分服务")
@@ -101,27 +120,125 @@ class StockScorer:
         else:
             return "强烈不推荐"
             
-    def batch_score_stocks(self, stock_dfs: Dict[str, pd.DataFrame]) -> List[Tuple[str, int, str]]:
+    def get_recommendations(self, scores: np.ndarray) -> np.ndarray:
         """
-        批量评分多只股票
+        根据评分数组批量获取投资建议，阈值与get_recommendation一致
         
         Args:
-            stock_dfs: 字典，键为股票代码，值为DataFrame
+            scores: 评分数组
             
         Returns:
-            评分结果列表，每项为(股票代码, 评分, 推荐)的三元组
+            投资建议数组
         """
-        results = []
+        return np.select(
+            [scores >= 80, scores >= 70, scores >= 60, scores >= 40, scores >= 20],
+            ["强烈推荐", "推荐", "谨慎推荐", "观望", "不推荐"],
+            default="强烈不推荐"
+        )
+    
+    def build_latest_table(self, stock_dfs: Dict[str, pd.DataFrame]) -> pd.DataFrame:
+        """
+        提取每只股票最新K线上的评分所需指标，组成按代码索引的列式表
         
+        Args:
+            stock_dfs: 字典，键为股票代码，值为包含技术指标的DataFrame
+            
+        Returns:
+            以代码为索引、SCORE_COLUMNS为列的DataFrame，数据不完整的股票会被跳过
+        """
+        codes = []
+        rows = []
         for stock_code, df in stock_dfs.items():
             try:
-                score = self.calculate_score(df)
-                recommendation = self.get_recommendation(score)
-                results.append((stock_code, score, recommendation))
+                rows.append([float(df[col].iat[-1]) for col in self.SCORE_COLUMNS])
+                codes.append(stock_code)
             except Exception as e:
                 logger.error(f"评分股票 {stock_code} 时出错: {str(e)}")
+        
+        return pd.DataFrame(
+            np.array(rows, dtype=float).reshape(len(rows), len(self.SCORE_COLUMNS)),
+            index=pd.Index(codes, name='code'),
+            columns=self.SCORE_COLUMNS
+        )
+    
+    def score_table(self, table: pd.DataFrame) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        向量化评分：用NumPy掩码一次性计算所有股票的规则得分，规则与calculate_score一致
+        
+        Args:
+            table: 以代码为索引、至少包含SCORE_COLUMNS的列式表
+            
+        Returns:
+            (评分数组, 投资建议数组)的元组，顺序与table的行一致
+        """
+        close = table['Close'].to_numpy(dtype=float)
+        ma5 = table['MA5'].to_numpy(dtype=float)
+        ma20 = table['MA20'].to_numpy(dtype=float)
+        ma60 = table['MA60'].to_numpy(dtype=float)
+        rsi = table['RSI'].to_numpy(dtype=float)
+        macd = table['MACD'].to_numpy(dtype=float)
+        signal = table['Signal'].to_numpy(dtype=float)
+        volume_ratio = table['Volume_Ratio'].to_numpy(dtype=float)
+        
+        # 含NaN的比较结果均为False，与逐行评分的分支行为一致
+        with np.errstate(invalid='ignore'):
+            # 移动平均线评分（25分）
+            score = np.select(
+                [(ma5 > ma20) & (ma20 > ma60), ma5 > ma20, close > ma20],
+                [25, 15, 10],
+                default=0
+            )
+            
+            # RSI评分（25分）
+            score += np.select(
+                [(rsi >= 45) & (rsi <= 55), (rsi > 55) & (rsi < 70), (rsi > 30) & (rsi < 45), rsi >= 70, rsi <= 30],
+                [15, 25, 10, 5, 15],
+                default=0
+            )
+            
+            # MACD得分（20分）
+            score += np.where(macd > signal, 20, 0)
+            
+            # 成交量得分（30分）
+            score += np.select([volume_ratio > 1.5, volume_ratio > 1], [30, 15], default=0)
+        
+        return score, self.get_recommendations(score)
+            
+    def batch_score_stocks(self, stock_dfs: Dict[str, pd.DataFrame]) -> List[Tuple[str, int, str]]:
+        """
+        批量评分多只股票（向量化）
+        
+        Args:
+            stock_dfs: 字典，键为股票代码，值为DataFrame
+            
+        Returns:
+            评分结果列表，每项为(股票代码, 评分, 推荐)的三元组
+        """
+        table = self.build_latest_table(stock_dfs)
+        scores, recommendations = self.score_table(table)
+        
+        results = list(zip(table.index.tolist(), scores.tolist(), recommendations.tolist()))
                 
         # 按评分降序排序
         results.sort(key=lambda x: x[1], reverse=True)
         
-        return results 
\ No newline at end of file
+        return results
+    
+    async def batch_score_stocks_async(self, stock_dfs: Dict[str, pd.DataFrame]) -> List[Tuple[str, int, str]]:
+        """
+        批量评分多只股票，与batch_score_stocks相同，但评分在计算进程池中执行，只传递最新K线的指标数组
+        
+        Args:
+            stock_dfs: 字典，键为股票代码，值为DataFrame
+            
+        Returns:
+            评分结果列表，每项为(股票代码, 评分, 推荐)的三元组，按评分降序排列
+        """
+        table = self.build_latest_table(stock_dfs)
+        scores, recommendations = await get_compute_pool().run(
+            score_arrays, table[self.SCORE_COLUMNS].to_numpy(dtype=float), size=len(table)
+        )
+        
+        results = list(zip(table.index.tolist(), scores.tolist(), recommendations.tolist()))
+        results.sort(key=lambda x: x[1], reverse=True)
+        return results
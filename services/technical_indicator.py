@@ -1,10 +1,212 @@
+import numpy as np
 import pandas as pd
-from typing import Dict, Optional, Any
+from typing import Dict, List, Optional, Any
+from numpy.lib.stride_tricks import sliding_window_view
 from utils.logger import get_logger
+from services.indicator_cache import get_indicator_cache
+from services.incremental_indicator import get_incremental_indicator_engine
+from utils.compute_pool import get_compute_pool
 
 # 获取日志器
 logger = get_logger()
 
+# 计算技术指标所需的价格列
+PRICE_COLUMNS = ['Open', 'High', 'Low', 'Close', 'Volume']
+
+
+def _rolling_mean(arr: np.ndarray, window: int) -> np.ndarray:
+    """沿时间轴(axis=0)计算滚动均值，窗口内存在NaN时结果为NaN，与pandas rolling默认行为一致"""
+    out = np.full(arr.shape, np.nan)
+    if arr.shape[0] >= window:
+        out[window - 1:] = sliding_window_view(arr, window, axis=0).mean(axis=-1)
+    return out
+
+
+def _rolling_std(arr: np.ndarray, window: int) -> np.ndarray:
+    """沿时间轴(axis=0)计算滚动样本标准差(ddof=1)"""
+    out = np.full(arr.shape, np.nan)
+    if arr.shape[0] >= window:
+        out[window - 1:] = sliding_window_view(arr, window, axis=0).std(axis=-1, ddof=1)
+    return out
+
+
+def _ema(arr: np.ndarray, period: int) -> np.ndarray:
+    """
+    沿时间轴(axis=0)计算指数移动平均(adjust=False)
+    每列从第一个非NaN值开始递推，与pandas的ewm(span=period, adjust=False)一致：
+    NaN位置沿用上一个值，其后的新值按绝对位置衰减上一个值的权重（ignore_na=False）
+    """
+    alpha = 2.0 / (period + 1)
+    decay = 1.0 - alpha
+    out = np.empty(arr.shape)
+    prev = np.full(arr.shape[1:], np.nan)
+    # 上一个值的权重，每经过一根K线（包括NaN）衰减一次，遇到新值后重置为1
+    old_weight = np.ones(arr.shape[1:])
+    for i in range(arr.shape[0]):
+        x = arr[i]
+        started = ~np.isnan(prev)
+        observed = ~np.isnan(x)
+        old_weight = np.where(started, old_weight * decay, old_weight)
+        combined = (old_weight * prev + alpha * x) / (old_weight + alpha)
+        prev = np.where(observed, np.where(started, combined, x), prev)
+        old_weight = np.where(observed, 1.0, old_weight)
+        out[i] = prev
+    return out
+
+
+def compute_panel_arrays(params: Dict[str, Any], columns: Dict[str, np.ndarray], lengths: np.ndarray) -> Dict[str, np.ndarray]:
+    """
+    在右对齐堆叠的价格数组上向量化计算全部技术指标（可在计算进程池中执行）
+    
+    Args:
+        params: 技术指标参数
+        columns: 价格列名到 (K线序号 × 标的) 二维数组的映射，需包含High, Low, Close, Volume
+        lengths: 每个标的的K线数
+        
+    Returns:
+        指标列名到二维数组的映射（按calculate_indicators的输出顺序）
+    """
+    close = columns['Close']
+    high = columns['High']
+    low = columns['Low']
+    volume = columns['Volume']
+    rows, count = close.shape
+    
+    # 标记每个标的的有效K线区域（右对齐后前部为填充）
+    row_valid = np.arange(rows)[:, None] >= (rows - lengths)[None, :]
+    
+    indicators: Dict[str, np.ndarray] = {}
+    
+    with np.errstate(divide='ignore', invalid='ignore'):
+        # 移动平均线
+        for name, period in params['ma_periods'].items():
+            indicators[f'MA{period}'] = _rolling_mean(close, period)
+        
+        # RSI（与calculate_rsi一致：首根K线的涨跌记为0）
+        prev_close = np.vstack([np.full((1, count), np.nan), close[:-1]])
+        delta = close - prev_close
+        gain = np.where(row_valid, np.where(delta > 0, delta, 0.0), np.nan)
+        loss = np.where(row_valid, np.where(delta < 0, -delta, 0.0), np.nan)
+        rs = _rolling_mean(gain, params['rsi_period']) / _rolling_mean(loss, params['rsi_period'])
+        indicators['RSI'] = 100 - (100 / (1 + rs))
+        
+        # MACD
+        macd = _ema(close, 12) - _ema(close, 26)
+        signal = _ema(macd, 9)
+        indicators['MACD'] = macd
+        indicators['Signal'] = signal
+        indicators['Histogram'] = macd - signal
+        
+        # 布林带
+        period = params['bollinger_period']
+        middle = _rolling_mean(close, period)
+        std = _rolling_std(close, period)
+        indicators['BB_Middle'] = middle
+        indicators['BB_Upper'] = middle + params['bollinger_std'] * std
+        indicators['BB_Lower'] = middle - params['bollinger_std'] * std
+        
+        # 成交量移动平均及比率
+        volume_ma = _rolling_mean(volume, params['volume_ma_period'])
+        indicators['Volume_MA'] = volume_ma
+        indicators['Volume_Ratio'] = volume / volume_ma
+        
+        # ATR（真实波幅取三者中的最大有效值）
+        tr = np.fmax(np.fmax(high - low, np.abs(high - prev_close)), np.abs(low - prev_close))
+        indicators['ATR'] = _rolling_mean(tr, params['atr_period'])
+        
+        # 波动率 (过去20天收盘价的标准差/均值)
+        indicators['Volatility'] = _rolling_std(close, 20) / _rolling_mean(close, 20) * 100
+    
+    return indicators
+
+
+def compute_indicator_arrays(params: Dict[str, Any], arrays: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+    """
+    对单个标的的价格数组计算全部技术指标（可在计算进程池中执行）
+    
+    Args:
+        params: 技术指标参数
+        arrays: 价格列名到一维数组的映射
+        
+    Returns:
+        指标列名到一维数组的映射
+    """
+    result_df = TechnicalIndicator(params).calculate_indicators(pd.DataFrame(arrays))
+    return {name: result_df[name].to_numpy() for name in result_df.columns if name not in arrays}
+
+
+class IndicatorPanel:
+    """
+    多标的技术指标面板
+    各标的按最新K线右对齐堆叠为 (K线序号 × 标的) 的二维数组，较短的历史在前部以NaN填充，
+    因此每个标的的滚动窗口只覆盖其自身的K线，结果与逐个计算一致
+    """
+    
+    def __init__(self, codes: List[str], frames: Dict[str, pd.DataFrame],
+                 columns: Dict[str, np.ndarray], indicator_columns: List[str]):
+        """
+        初始化指标面板
+        
+        Args:
+            codes: 标的代码列表，与数组的列一一对应
+            frames: 原始价格数据
+            columns: 列名到二维数组的映射，包含价格列和指标列
+            indicator_columns: 指标列名（按calculate_indicators的输出顺序）
+        """
+        self.codes = codes
+        self.frames = frames
+        self.columns = columns
+        self.indicator_columns = indicator_columns
+        self.positions = {code: i for i, code in enumerate(codes)}
+        self.lengths = np.array([len(frames[code]) for code in codes], dtype=int)
+        self.rows = max(self.lengths) if codes else 0
+    
+    def frame(self, code: str) -> pd.DataFrame:
+        """
+        获取单个标的添加了技术指标的DataFrame，列与calculate_indicators的输出一致
+        
+        Args:
+            code: 标的代码
+            
+        Returns:
+            添加了技术指标的DataFrame
+        """
+        j = self.positions[code]
+        df = self.frames[code]
+        start = self.rows - len(df)
+        
+        indicators = pd.DataFrame(
+            {name: self.columns[name][start:, j] for name in self.indicator_columns},
+            index=df.index
+        )
+        base = df.drop(columns=self.indicator_columns, errors='ignore')
+        return pd.concat([base, indicators], axis=1)
+    
+    def to_frames(self) -> Dict[str, pd.DataFrame]:
+        """获取所有标的的指标DataFrame"""
+        return {code: self.frame(code) for code in self.codes}
+    
+    def latest(self, columns: Optional[List[str]] = None, offset: int = 0) -> pd.DataFrame:
+        """
+        获取每个标的倒数第(offset+1)根K线上的数值，组成按代码索引的列式表
+        
+        Args:
+            columns: 需要的列，默认为全部列
+            offset: 距最新K线的偏移，0表示最新K线
+            
+        Returns:
+            以代码为索引的DataFrame，历史长度不足的标的对应NaN
+        """
+        columns = columns or list(self.columns.keys())
+        row = self.rows - 1 - offset
+        has_row = self.lengths > offset
+        data = {}
+        for name in columns:
+            values = self.columns[name][row] if row >= 0 else np.full(len(self.codes), np.nan)
+            data[name] = np.where(has_row, values, np.nan)
+        return pd.DataFrame(data, index=pd.Index(self.codes, name='code'))
+
+
 class TechnicalIndicator:
     """
     技术指标计算服务
@@ -183,4 +385,219 @@ class TechnicalIndicator:
         except Exception as e:
             logger.error(f"计算技术指标时出错: {str(e)}")
             logger.exception(e)
-            raise 
\ No newline at end of file
+            raise
+    
+    def calculate_indicators_cached(self, df: pd.DataFrame, stock_code: str, market_type: str = 'A') -> pd.DataFrame:
+        """
+        计算所有技术指标，优先使用进程级缓存中的结果
+        
+        Args:
+            df: 原始价格数据
+            stock_code: 股票代码
+            market_type: 市场类型
+            
+        Returns:
+            添加了技术指标的DataFrame（可能与其他请求共享，调用方不应修改）
+        """
+        engine = get_incremental_indicator_engine()
+        if engine is None:
+            compute = self.calculate_indicators
+        else:
+            # 与上次结果只差最新一根K线时增量更新，否则完整计算
+            def compute(data: pd.DataFrame) -> pd.DataFrame:
+                return engine.calculate('stock', stock_code, market_type, data, self.params, self.calculate_indicators)
+        
+        return get_indicator_cache().get_or_compute(
+            'stock', stock_code, market_type, df, self.params, compute
+        )
+    
+    async def calculate_indicators_async(self, df: pd.DataFrame, stock_code: str, market_type: str = 'A') -> pd.DataFrame:
+        """
+        计算所有技术指标，与calculate_indicators_cached相同，但完整计算在计算进程池中执行，不阻塞事件循环
+        
+        Args:
+            df: 原始价格数据
+            stock_code: 股票代码
+            market_type: 市场类型
+            
+        Returns:
+            添加了技术指标的DataFrame（可能与其他请求共享，调用方不应修改）
+        """
+        if df is None or df.empty:
+            return self.calculate_indicators(df)
+        
+        cache = get_indicator_cache()
+        key = cache.make_key('stock', stock_code, market_type, df, self.params)
+        cached = cache.get(key)
+        if cached is not None:
+            return cached
+        
+        engine = get_incremental_indicator_engine()
+        result = engine.update('stock', stock_code, market_type, df, self.params) if engine is not None else None
+        if result is None:
+            arrays = self._price_arrays(df)
+            indicators = await get_compute_pool().run(compute_indicator_arrays, self.params, arrays)
+            result = self._attach_indicators(df, indicators)
+            if engine is not None:
+                engine.record('stock', stock_code, market_type, self.params, result)
+        
+        cache.put(key, result)
+        return result
+    
+    @staticmethod
+    def _price_arrays(df: pd.DataFrame) -> Dict[str, np.ndarray]:
+        """提取计算指标所需的价格列为NumPy数组，用于传递给计算进程"""
+        return {name: df[name].to_numpy(dtype=float) for name in PRICE_COLUMNS if name in df.columns}
+    
+    @staticmethod
+    def _attach_indicators(df: pd.DataFrame, indicators: Dict[str, np.ndarray]) -> pd.DataFrame:
+        """将计算进程返回的指标数组附加到原始数据上，列顺序与calculate_indicators一致"""
+        base = df.drop(columns=list(indicators), errors='ignore')
+        return pd.concat([base, pd.DataFrame(indicators, index=df.index)], axis=1)
+    
+    def calculate_panel_indicators(self, stock_dfs: Dict[str, pd.DataFrame]) -> IndicatorPanel:
+        """
+        面板模式批量计算技术指标
+        将多只股票堆叠为二维数组后一次性完成MA、RSI、MACD、布林带、ATR、成交量比率和波动率的向量化计算
+        
+        Args:
+            stock_dfs: 字典，键为股票代码，值为包含Open, High, Low, Close, Volume列的DataFrame
+            
+        Returns:
+            IndicatorPanel指标面板
+        """
+        try:
+            codes, columns, lengths = self._stack_panel(stock_dfs)
+            indicators = compute_panel_arrays(self.params, columns, lengths)
+            return self._build_panel(codes, stock_dfs, columns, indicators)
+            
+        except Exception as e:
+            logger.error(f"面板模式计算技术指标时出错: {str(e)}")
+            logger.exception(e)
+            raise
+    
+    async def calculate_panel_indicators_async(self, stock_dfs: Dict[str, pd.DataFrame]) -> IndicatorPanel:
+        """
+        面板模式批量计算技术指标，向量化计算在计算进程池中执行，只传递堆叠后的价格数组
+        
+        Args:
+            stock_dfs: 字典，键为股票代码，值为包含Open, High, Low, Close, Volume列的DataFrame
+            
+        Returns:
+            IndicatorPanel指标面板
+        """
+        codes, columns, lengths = self._stack_panel(stock_dfs)
+        indicators = await get_compute_pool().run(compute_panel_arrays, self.params, columns, lengths, size=len(codes))
+        return self._build_panel(codes, stock_dfs, columns, indicators)
+    
+    @staticmethod
+    def _stack_panel(stock_dfs: Dict[str, pd.DataFrame]) -> tuple:
+        """
+        将各标的的价格列按最新K线右对齐堆叠为二维数组
+        
+        Returns:
+            (代码列表, 价格列名到二维数组的映射, 各标的K线数)的元组
+        """
+        codes = list(stock_dfs.keys())
+        rows = max((len(df) for df in stock_dfs.values()), default=0)
+        
+        def stack(column: str) -> np.ndarray:
+            arr = np.full((rows, len(codes)), np.nan)
+            for j, code in enumerate(codes):
+                values = stock_dfs[code][column].to_numpy(dtype=float)
+                arr[rows - len(values):, j] = values
+            return arr
+        
+        columns = {name: stack(name) for name in PRICE_COLUMNS
+                   if all(name in df.columns for df in stock_dfs.values())}
+        lengths = np.array([len(stock_dfs[code]) for code in codes], dtype=int)
+        return codes, columns, lengths
+    
+    @staticmethod
+    def _build_panel(codes: List[str], stock_dfs: Dict[str, pd.DataFrame], columns: Dict[str, np.ndarray],
+                     indicators: Dict[str, np.ndarray]) -> IndicatorPanel:
+        """由价格数组和指标数组组装指标面板"""
+        indicator_columns = list(indicators.keys())
+        columns = {**columns, **indicators}
+        logger.debug(f"面板模式计算技术指标完成: {len(codes)} 只股票, {columns['Close'].shape[0]} 根K线")
+        return IndicatorPanel(codes, stock_dfs, columns, indicator_columns)
+    
+    def calculate_indicators_batch(self, stock_dfs: Dict[str, pd.DataFrame], market_type: str = 'A') -> Dict[str, pd.DataFrame]:
+        """
+        批量计算技术指标：已缓存的直接复用，只差最新一根K线的增量更新，其余通过面板模式一次性计算并写入缓存
+        
+        Args:
+            stock_dfs: 字典，键为股票代码，值为原始价格数据
+            market_type: 市场类型
+            
+        Returns:
+            字典，键为股票代码，值为添加了技术指标的DataFrame
+        """
+        results, keys, missing = self._lookup_batch(stock_dfs, market_type)
+        if missing:
+            self._store_panel(self.calculate_panel_indicators(missing), results, keys, market_type)
+        
+        # 保持输入顺序
+        return {code: results[code] for code in stock_dfs if code in results}
+    
+    async def calculate_indicators_batch_async(self, stock_dfs: Dict[str, pd.DataFrame],
+                                               market_type: str = 'A') -> Dict[str, pd.DataFrame]:
+        """
+        批量计算技术指标，与calculate_indicators_batch相同，但面板计算在计算进程池中执行，不阻塞事件循环
+        
+        Args:
+            stock_dfs: 字典，键为股票代码，值为原始价格数据
+            market_type: 市场类型
+            
+        Returns:
+            字典，键为股票代码，值为添加了技术指标的DataFrame
+        """
+        results, keys, missing = self._lookup_batch(stock_dfs, market_type)
+        if missing:
+            self._store_panel(await self.calculate_panel_indicators_async(missing), results, keys, market_type)
+        
+        # 保持输入顺序
+        return {code: results[code] for code in stock_dfs if code in results}
+    
+    def _lookup_batch(self, stock_dfs: Dict[str, pd.DataFrame], market_type: str) -> tuple:
+        """
+        批量查找已缓存或可增量更新的指标结果
+        
+        Returns:
+            (已得到的结果, 各代码的缓存键, 需要完整计算的原始数据)的元组
+        """
+        cache = get_indicator_cache()
+        results = {}
+        keys = {}
+        missing = {}
+        
+        for code, df in stock_dfs.items():
+            keys[code] = cache.make_key('stock', code, market_type, df, self.params)
+            cached = cache.get(keys[code])
+            if cached is not None:
+                results[code] = cached
+            else:
+                missing[code] = df
+        
+        # 与上次结果只差最新一根K线的增量更新
+        engine = get_incremental_indicator_engine()
+        if engine is not None:
+            for code in list(missing):
+                updated = engine.update('stock', code, market_type, missing[code], self.params)
+                if updated is not None:
+                    results[code] = updated
+                    cache.put(keys[code], updated)
+                    del missing[code]
+        
+        return results, keys, missing
+    
+    def _store_panel(self, panel: IndicatorPanel, results: Dict[str, pd.DataFrame], keys: Dict[str, Any],
+                     market_type: str) -> None:
+        """将面板计算结果写入结果字典、指标缓存和增量更新引擎"""
+        cache = get_indicator_cache()
+        engine = get_incremental_indicator_engine()
+        for code in panel.codes:
+            results[code] = panel.frame(code)
+            cache.put(keys[code], results[code])
+            if engine is not None:
+                engine.record('stock', code, market_type, self.params, results[code])
@@ -0,0 +1,124 @@
+import os
+import time
+import threading
+import pandas as pd
+from datetime import date, timedelta
+from typing import Any, Dict, FrozenSet, Optional
+from utils.logger import get_logger
+from utils.upstream_gateway import get_upstream_gateway, SOURCE_SINA
+from services.data_source import get_data_source
+
+# 获取日志器
+logger = get_logger()
+
+# 按沪深交易所交易日历判断交易日的市场类型，其他市场只排除周末
+CN_CALENDAR_MARKETS = ('A', 'ETF', 'LOF', 'FUTURES')
+
+# 获取交易日历失败后的重试间隔（秒）
+RETRY_SECONDS = 600
+
+
+class TradingCalendar:
+    """
+    交易日历
+    沪深市场的交易日从新浪交易日历获取（含节假日休市），在内存中缓存并定期刷新；
+    未加载、获取失败或日期超出日历范围时按工作日判断
+    """
+
+    def __init__(self, refresh_hours: Optional[float] = None):
+        """
+        初始化交易日历
+
+        Args:
+            refresh_hours: 刷新间隔（小时），默认为环境变量TRADING_CALENDAR_REFRESH_HOURS（默认24小时）
+        """
+        if refresh_hours is None:
+            refresh_hours = float(os.getenv('TRADING_CALENDAR_REFRESH_HOURS', 24))
+        self.refresh_seconds = refresh_hours * 3600
+
+        self._dates: Optional[FrozenSet[date]] = None
+        self._first: Optional[date] = None
+        self._last: Optional[date] = None
+        # 下次允许刷新的时间（time.monotonic）
+        self._next_refresh = 0.0
+        self._lock = threading.Lock()
+
+    def refresh(self, force: bool = False) -> bool:
+        """
+        需要时从上游获取交易日历（同步调用，应在上游网关线程池中执行）
+
+        Args:
+            force: 是否忽略刷新间隔
+
+        Returns:
+            当前是否有可用的交易日历
+        """
+        with self._lock:
+            if not force and time.monotonic() < self._next_refresh:
+                return self._dates is not None
+
+            try:
+                df = get_upstream_gateway().call(SOURCE_SINA, get_data_source().tool_trade_date_hist_sina)
+                dates = frozenset(pd.to_datetime(df['trade_date']).dt.date)
+                if not dates:
+                    raise ValueError("交易日历为空")
+            except Exception as e:
+                logger.warning(f"获取交易日历失败，暂按工作日判断: {str(e)}")
+                self._next_refresh = time.monotonic() + RETRY_SECONDS
+                return self._dates is not None
+
+            # 先更新范围再替换日期集合，不加锁的读取方看到新集合时范围已就绪
+            self._first, self._last = min(dates), max(dates)
+            self._dates = dates
+            self._next_refresh = time.monotonic() + self.refresh_seconds
+            logger.info(f"已加载交易日历: {self._first} ~ {self._last}, 共 {len(dates)} 个交易日")
+            return True
+
+    def is_trading_day(self, market_type: str, day: date) -> bool:
+        """
+        判断是否为交易日
+
+        Args:
+            market_type: 市场类型
+            day: 日期
+
+        Returns:
+            是否为交易日
+        """
+        if day.weekday() >= 5:
+            return False
+        dates = self._dates
+        if market_type not in CN_CALENDAR_MARKETS or dates is None or not self._first <= day <= self._last:
+            return True
+        return day in dates
+
+    def previous_trading_day(self, market_type: str, day: date) -> date:
+        """返回day之前最近的交易日"""
+        day -= timedelta(days=1)
+        while not self.is_trading_day(market_type, day):
+            day -= timedelta(days=1)
+        return day
+
+    def stats(self) -> Dict[str, Any]:
+        """获取统计信息"""
+        return {
+            'loaded': self._dates is not None,
+            'first': self._first.isoformat() if self._first else None,
+            'last': self._last.isoformat() if self._last else None,
+        }
+
+
+# 进程级单例
+_trading_calendar: Optional[TradingCalendar] = None
+_trading_calendar_guard = threading.Lock()
+
+
+def get_trading_calendar() -> TradingCalendar:
+    """获取进程级交易日历"""
+    global _trading_calendar
+
+    if _trading_calendar is None:
+        with _trading_calendar_guard:
+            if _trading_calendar is None:
+                _trading_calendar = TradingCalendar()
+    return _trading_calendar
@@ -1,7 +1,10 @@
-import asyncio
 import pandas as pd
 from typing import List, Dict, Any, Optional
 from utils.logger import get_logger
+from utils.upstream_gateway import get_upstream_gateway, SOURCE_EM
+from services.data_source import get_data_source
+from services.snapshot_cache import get_snapshot_cache
+from services.search_index import SearchIndex
 
 # 获取日志器
 logger = get_logger()
@@ -16,9 +19,8 @@ class USStockServiceAsync:
         """初始化美股服务"""
         logger.debug("初始化USStockServiceAsync")
         
-        # 可选：添加缓存以减少频繁请求
-        self._cache = None
-        self._cache_timestamp = None
+        # 全市场美股行情快照，过期后在后台刷新
+        self._snapshot = get_snapshot_cache('us_spot', self._get_us_stocks_data, index_builder=self._build_search_index)
     
     async def search_us_stocks(self, keyword: str) -> List[Dict[str, Any]]:
         """
@@ -33,25 +35,9 @@ class USStockServiceAsync:
         try:
             logger.info(f"异步搜索美股: {keyword}")
             
-            # 使用线程池执行同步的akshare调用
-            df = await asyncio.to_thread(self._get_us_stocks_data)
-            
-            # 模糊匹配搜索
-            mask = df['name'].str.contains(keyword, case=False, na=False)
-            results = df[mask]
-            
-            # 格式化返回结果并处理 NaN 值
-            formatted_results = []
-            for _, row in results.iterrows():
-                formatted_results.append({
-                    'name': row['name'] if pd.notna(row['name']) else '',
-                    'symbol': str(row['symbol']) if pd.notna(row['symbol']) else '',
-                    'price': float(row['price']) if pd.notna(row['price']) else 0.0,
-                    'market_value': float(row['market_value']) if pd.notna(row['market_value']) else 0.0
-                })
-                # 限制只返回前10个结果
-                if len(formatted_results) >= 10:
-                    break
+            # 在基于行情快照预先构建的索引中查找，返回排名前10的结果
+            index = await self._snapshot.get_index()
+            formatted_results = index.search(keyword, limit=10)
             
             logger.info(f"美股搜索完成，找到 {len(formatted_results)} 个匹配项（限制显示前10个）")
             return formatted_results
@@ -62,6 +48,28 @@ class USStockServiceAsync:
             logger.exception(e)
             raise Exception(error_msg)
     
+    def _build_search_index(self, df: pd.DataFrame) -> SearchIndex:
+        """
+        基于美股行情快照构建搜索索引（在线程池中与快照一同构建）
+        
+        Args:
+            df: 美股行情快照
+            
+        Returns:
+            搜索索引
+        """
+        return SearchIndex(df, self._format_search_result)
+    
+    @staticmethod
+    def _format_search_result(row: Dict[str, Any]) -> Dict[str, Any]:
+        """格式化单条搜索结果并处理 NaN 值"""
+        return {
+            'name': row['name'] if pd.notna(row['name']) else '',
+            'symbol': str(row['symbol']) if pd.notna(row['symbol']) else '',
+            'price': float(row['price']) if pd.notna(row['price']) else 0.0,
+            'market_value': float(row['market_value']) if pd.notna(row['market_value']) else 0.0
+        }
+    
     def _get_us_stocks_data(self) -> pd.DataFrame:
         """
         获取美股数据（同步方法，将被异步方法调用）
@@ -69,11 +77,11 @@ class USStockServiceAsync:
         Returns:
             包含美股数据的DataFrame
         """
-        import akshare as ak
+        data_source = get_data_source()
         
         try:
             # 获取美股数据
-            df = ak.stock_us_spot_em()
+            df = get_upstream_gateway().call(SOURCE_EM, data_source.stock_us_spot_em)
             
             # 转换列名
             df = df.rename(columns={
@@ -115,8 +123,8 @@ class USStockServiceAsync:
         try:
             logger.info(f"获取美股详情: {symbol}")
             
-            # 使用线程池执行同步的akshare调用
-            df = await asyncio.to_thread(self._get_us_stocks_data)
+            # 读取行情快照
+            df = await self._snapshot.get()
             
             # 精确匹配股票代码
             result = df[df['symbol'] == symbol]
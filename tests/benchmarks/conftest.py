@@ -0,0 +1,99 @@
+"""
+分析流程基准测试的公共配置
+
+使用离线回放数据源（合成行情预先录制到临时目录）和进程内的模拟LLM，不访问任何网络。
+运行方式（在项目根目录）：
+
+    python -m pytest tests/benchmarks --benchmark-json=benchmark.json
+
+与之前保存的结果比较：
+
+    python -m pytest tests/benchmarks --benchmark-autosave
+    python -m pytest tests/benchmarks --benchmark-compare --benchmark-compare-fail=mean:10%
+"""
+import os
+import sys
+import json
+import tempfile
+from datetime import datetime, timedelta
+
+# 服务在首次使用时读取环境变量，需在导入服务模块之前设置
+BENCH_DIR = tempfile.mkdtemp(prefix='stock-scanner-bench-')
+os.environ.update({
+    'DATA_SOURCE': 'replay',
+    'REPLAY_DIR': os.path.join(BENCH_DIR, 'replay'),
+    'REPLAY_LATENCY_MS': '0',
+    'REPLAY_FAILURE_RATE': '0',
+    'SCORE_TABLE_DIR': os.path.join(BENCH_DIR, 'scores'),
+    'OHLCV_STORE_ENABLED': 'false',
+    'POST_CLOSE_SCHEDULER_ENABLED': 'false',
+    # 关闭结果缓存，每轮都完整计算
+    'INDICATOR_CACHE_MAX_MB': '0',
+    'INCREMENTAL_INDICATOR_ENABLED': 'false',
+    'LLM_CACHE_BACKEND': 'none',
+    # 不对回放数据源限流
+    'UPSTREAM_RATE_EM': '0',
+    'UPSTREAM_RATE_SINA': '0',
+    'UPSTREAM_RATE_HK': '0',
+    'UPSTREAM_RATE_US': '0',
+    'API_URL': 'http://fake-llm.local/',
+    'API_KEY': 'benchmark',
+    'API_MODEL': 'fake-model',
+})
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+import httpx
+import pytest
+from services.data_source import ReplayDataSource
+from utils.http_client import get_http_client_pool
+
+# 基准测试使用的合成A股代码数量
+SCAN_SIZES = (10, 100, 1000)
+
+# 模拟LLM每次回复的内容片段
+FAKE_LLM_CHUNKS = ["## 技术面分析\n", "均线多头排列，", "MACD金叉，", "成交量温和放大。\n",
+                   "## 投资建议\n", "综合来看建议**买入**，", "注意控制仓位。"]
+
+
+def synthetic_codes(count: int) -> list:
+    """合成A股代码"""
+    return [f"{600000 + i:06d}" for i in range(count)]
+
+
+def _fake_llm_body() -> bytes:
+    """OpenAI兼容的流式响应（SSE）"""
+    events = []
+    for content in FAKE_LLM_CHUNKS:
+        chunk = {"choices": [{"index": 0, "delta": {"content": content}, "finish_reason": None}]}
+        events.append(f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n")
+    events.append("data: [DONE]\n\n")
+    return ''.join(events).encode('utf-8')
+
+
+@pytest.fixture(scope='session', autouse=True)
+def replay_recordings():
+    """把合成K线录制为回放文件，基准测试时只计入读取和标准化的开销，不计入合成数据的生成"""
+    source = ReplayDataSource(base_dir=os.environ['REPLAY_DIR'])
+    directory = os.path.join(source.base_dir, 'stock_zh_a_hist')
+    os.makedirs(directory, exist_ok=True)
+
+    end_date = datetime.now().strftime('%Y%m%d')
+    start_date = (datetime.now() - timedelta(days=2 * 365)).strftime('%Y%m%d')
+    for code in synthetic_codes(max(SCAN_SIZES)):
+        df = source.stock_zh_a_hist(symbol=code, start_date=start_date, end_date=end_date, adjust='qfq')
+        df.to_parquet(os.path.join(directory, f"{code}.parquet"), index=False)
+    return source.base_dir
+
+
+@pytest.fixture
+def fake_llm(monkeypatch):
+    """让AI分析请求进程内的模拟LLM，返回固定的流式回复"""
+    body = _fake_llm_body()
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(200, content=body, headers={'Content-Type': 'text/event-stream'})
+
+    client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    monkeypatch.setattr(get_http_client_pool(), 'get_client', lambda url: client)
+    return client
@@ -0,0 +1,105 @@
+"""
+分析流程各阶段的基准测试：数据标准化、技术指标、评分和NDJSON序列化
+"""
+import json
+import pytest
+from datetime import datetime, timedelta
+from services.stock_data_provider import StockDataProvider
+from services.futures_data_provider import FuturesDataProvider
+from services.technical_indicator import TechnicalIndicator
+from services.futures_technical_indicator import FuturesTechnicalIndicator
+from services.stock_scorer import StockScorer
+from services.futures_scorer import FuturesScorer
+from services.stock_analyzer_service import StockAnalyzerService
+from conftest import synthetic_codes
+
+START_DATE = (datetime.now() - timedelta(days=365)).strftime('%Y%m%d')
+END_DATE = datetime.now().strftime('%Y%m%d')
+
+# 批量阶段使用的代码数
+BATCH_SIZE = 100
+
+
+@pytest.fixture(scope='module')
+def stock_frames():
+    """标准化后的A股日K线"""
+    provider = StockDataProvider()
+    return {code: provider._fetch_stock_data_sync(code, 'A', START_DATE, END_DATE)
+            for code in synthetic_codes(BATCH_SIZE)}
+
+
+@pytest.fixture(scope='module')
+def stock_indicator_frames(stock_frames):
+    indicator = TechnicalIndicator()
+    return {code: indicator.calculate_indicators(df) for code, df in stock_frames.items()}
+
+
+@pytest.fixture(scope='module')
+def futures_frame():
+    return FuturesDataProvider()._get_futures_data_sync('rb88', START_DATE, END_DATE)
+
+
+@pytest.fixture(scope='module')
+def futures_indicator_frame(futures_frame):
+    return FuturesTechnicalIndicator().calculate_futures_indicators(futures_frame)
+
+
+def test_stock_data_normalization(benchmark):
+    provider = StockDataProvider()
+    df = benchmark(provider._fetch_stock_data_sync, '600000', 'A', START_DATE, END_DATE)
+    assert not df.empty and 'Close' in df.columns
+
+
+def test_futures_data_normalization(benchmark):
+    provider = FuturesDataProvider()
+    df = benchmark(provider._get_futures_data_sync, 'rb88', START_DATE, END_DATE)
+    assert not df.empty and 'OpenInterest' in df.columns
+
+
+def test_calculate_indicators(benchmark, stock_frames):
+    df = benchmark(TechnicalIndicator().calculate_indicators, stock_frames['600000'])
+    assert 'RSI' in df.columns
+
+
+def test_calculate_indicators_panel(benchmark, stock_frames):
+    benchmark.extra_info['symbols'] = len(stock_frames)
+    panel = benchmark(TechnicalIndicator().calculate_panel_indicators, stock_frames)
+    assert len(panel.to_frames()) == len(stock_frames)
+
+
+def test_calculate_futures_indicators(benchmark, futures_frame):
+    df = benchmark(FuturesTechnicalIndicator().calculate_futures_indicators, futures_frame)
+    assert 'RSI' in df.columns
+
+
+def test_stock_scorer_single(benchmark, stock_indicator_frames):
+    score = benchmark(StockScorer().calculate_score, stock_indicator_frames['600000'])
+    assert 0 <= score <= 100
+
+
+def test_stock_scorer_batch(benchmark, stock_indicator_frames):
+    benchmark.extra_info['symbols'] = len(stock_indicator_frames)
+    results = benchmark(StockScorer().batch_score_stocks, stock_indicator_frames)
+    assert len(results) == len(stock_indicator_frames)
+
+
+def test_futures_scorer(benchmark, futures_indicator_frame):
+    score = benchmark(FuturesScorer().calculate_score, futures_indicator_frame)
+    assert 0 <= score <= 100
+
+
+def test_ndjson_serialization(benchmark, stock_indicator_frames):
+    """扫描结果逐行序列化为NDJSON"""
+    service = StockAnalyzerService()
+    scorer = StockScorer()
+    results = scorer.batch_score_stocks(stock_indicator_frames)
+
+    def serialize():
+        return '\n'.join(
+            json.dumps(service._build_score_message(code, stock_indicator_frames[code], score, rec))
+            for code, score, rec in results
+        )
+
+    benchmark.extra_info['messages'] = len(results)
+    lines = benchmark(serialize)
+    assert lines.count('\n') == len(results) - 1
@@ -0,0 +1,44 @@
+"""
+批量扫描的端到端吞吐量基准测试：回放数据源 -> 标准化 -> 技术指标 -> 评分 -> 模拟LLM流式分析 -> NDJSON
+"""
+import json
+import asyncio
+import pytest
+from services.stock_analyzer_service import StockAnalyzerService
+from conftest import SCAN_SIZES, synthetic_codes
+
+# 代码数较多时减少轮数，控制总耗时
+ROUNDS = {10: 10, 100: 5, 1000: 2}
+
+
+async def _consume_scan(service: StockAnalyzerService, codes: list) -> dict:
+    """消费完整的扫描流，统计已评分的代码数和各类消息数"""
+    scored = set()
+    counts = {'ai_chunks': 0, 'errors': 0}
+    async for line in service.scan_stocks(codes, 'A', min_score=0, stream=True):
+        message = json.loads(line)
+        if 'error' in message:
+            counts['errors'] += 1
+        elif 'ai_analysis_chunk' in message:
+            counts['ai_chunks'] += 1
+        elif 'score' in message:
+            scored.add(message['stock_code'])
+    counts['scored'] = len(scored)
+    return counts
+
+
+@pytest.mark.parametrize('size', SCAN_SIZES)
+def test_scan_stocks_throughput(benchmark, fake_llm, size):
+    service = StockAnalyzerService()
+    codes = synthetic_codes(size)
+
+    benchmark.extra_info['symbols'] = size
+    counts = benchmark.pedantic(lambda: asyncio.run(_consume_scan(service, codes)),
+                                rounds=ROUNDS[size], iterations=1, warmup_rounds=1)
+    # --benchmark-disable时只运行一次，没有统计数据
+    if benchmark.stats:
+        benchmark.extra_info['symbols_per_second'] = size / benchmark.stats.stats.mean
+
+    assert counts['errors'] == 0
+    assert counts['scored'] == size
+    assert counts['ai_chunks'] > 0
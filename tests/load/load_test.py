@@ -0,0 +1,276 @@
+"""
+/api/analyze 流式接口的并发压测
+
+默认在本地启动两个子进程：模拟LLM（mock_llm_server.py）和使用离线回放数据源的后端服务，
+然后以指定并发数持续发起分析请求，统计首字节时间（TTFB）、首个AI内容块时间、完整耗时和吞吐量。
+
+运行方式（在项目根目录）：
+
+    python tests/load/load_test.py --concurrency 200 --requests 1000
+    python tests/load/load_test.py --concurrency 300 --fragment-bytes 16 --json load.json
+    # 压测已在运行的服务（需自行配置离线数据源并关闭AI结果缓存）
+    python tests/load/load_test.py --target http://127.0.0.1:8888 --mock-url http://127.0.0.1:9999/
+"""
+import os
+import sys
+import json
+import time
+import socket
+import asyncio
+import argparse
+import subprocess
+from typing import Any, Dict, List, Optional, Tuple
+
+import httpx
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+MOCK_SERVER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'mock_llm_server.py')
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def _percentile(values: List[float], q: float) -> float:
+    """计算分位数，无数据时为0"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def _wait_ready(url: str, timeout: float = 60.0) -> None:
+    """轮询直到服务可用"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(url, timeout=2).status_code < 500:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.3)
+    raise RuntimeError(f"服务未在{timeout}秒内就绪: {url}")
+
+
+def start_mock_llm(args: argparse.Namespace) -> Tuple[subprocess.Popen, str]:
+    """启动模拟LLM子进程"""
+    port = _free_port()
+    process = subprocess.Popen([
+        sys.executable, MOCK_SERVER,
+        '--port', str(port),
+        '--tokens-per-sec', str(args.tokens_per_sec),
+        '--ttft-ms', str(args.ttft_ms),
+        '--tokens', str(args.tokens),
+        '--error-rate', str(args.error_rate),
+        '--midstream-error-rate', str(args.midstream_error_rate),
+        '--fragment-bytes', str(args.fragment_bytes),
+    ], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    base_url = f"http://127.0.0.1:{port}"
+    _wait_ready(f"{base_url}/stats")
+    return process, f"{base_url}/"
+
+
+def start_app(log_path: str) -> Tuple[subprocess.Popen, str]:
+    """启动使用离线回放数据源的后端服务子进程，服务日志写入log_path"""
+    port = _free_port()
+    env = dict(os.environ)
+    env.update({
+        'DATA_SOURCE': 'replay',
+        'REPLAY_LATENCY_MS': env.get('REPLAY_LATENCY_MS', '0'),
+        'LLM_CACHE_BACKEND': 'none',
+        'POST_CLOSE_SCHEDULER_ENABLED': 'false',
+        'UPSTREAM_RATE_EM': '0',
+        'UPSTREAM_RATE_SINA': '0',
+        'UPSTREAM_RATE_HK': '0',
+        'UPSTREAM_RATE_US': '0',
+        'LOGIN_PASSWORD': '',
+    })
+    with open(log_path, 'ab') as log_file:
+        process = subprocess.Popen(
+            [sys.executable, '-m', 'uvicorn', 'web_server:app', '--host', '127.0.0.1', '--port', str(port),
+             '--log-level', 'warning'],
+            cwd=PROJECT_ROOT, env=env, stdout=log_file, stderr=subprocess.STDOUT
+        )
+    base_url = f"http://127.0.0.1:{port}"
+    _wait_ready(f"{base_url}/api/need_login")
+    return process, base_url
+
+
+class RequestResult:
+    """单个分析请求的测量结果"""
+
+    def __init__(self):
+        self.ttfb: Optional[float] = None
+        self.first_ai_chunk: Optional[float] = None
+        self.duration: float = 0.0
+        self.bytes = 0
+        self.lines = 0
+        self.ai_chunks = 0
+        self.error: Optional[str] = None
+
+
+async def run_request(client: httpx.AsyncClient, target: str, payload: Dict[str, Any],
+                      headers: Dict[str, str]) -> RequestResult:
+    """发起一次流式分析请求并逐行读取NDJSON"""
+    result = RequestResult()
+    started = time.monotonic()
+    pending = b''
+    try:
+        async with client.stream('POST', f"{target}/api/analyze", json=payload, headers=headers) as response:
+            if response.status_code != 200:
+                result.error = f"HTTP {response.status_code}"
+                await response.aread()
+                return result
+
+            async for data in response.aiter_bytes():
+                if result.ttfb is None:
+                    result.ttfb = time.monotonic() - started
+                result.bytes += len(data)
+                pending += data
+                *lines, pending = pending.split(b'\n')
+                for line in lines:
+                    if not line.strip():
+                        continue
+                    result.lines += 1
+                    message = json.loads(line)
+                    if 'ai_analysis_chunk' in message:
+                        result.ai_chunks += 1
+                        if result.first_ai_chunk is None:
+                            result.first_ai_chunk = time.monotonic() - started
+                    elif 'error' in message and result.error is None:
+                        result.error = str(message['error'])[:200]
+    except Exception as e:
+        result.error = f"{type(e).__name__}: {str(e)}"
+    finally:
+        result.duration = time.monotonic() - started
+    return result
+
+
+async def run_load(args: argparse.Namespace, target: str, mock_url: str) -> Dict[str, Any]:
+    """以固定并发数发起全部请求，汇总统计结果"""
+    headers = {'Authorization': f"Bearer {args.token}"} if args.token else {}
+    codes = [f"{600000 + i:06d}" for i in range(args.universe)]
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    results: List[RequestResult] = []
+    next_index = 0
+
+    async with httpx.AsyncClient(limits=limits, timeout=httpx.Timeout(args.timeout)) as client:
+        async def worker():
+            nonlocal next_index
+            while next_index < args.requests:
+                index = next_index
+                next_index += 1
+                start = index * args.codes_per_request
+                payload = {
+                    'stock_codes': [codes[(start + k) % len(codes)] for k in range(args.codes_per_request)],
+                    'market_type': 'A',
+                    'api_url': mock_url,
+                    'api_key': 'load-test',
+                    'api_model': 'mock',
+                }
+                results.append(await run_request(client, target, payload, headers))
+
+        started = time.monotonic()
+        await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+        elapsed = time.monotonic() - started
+
+    succeeded = [r for r in results if r.error is None]
+    ttfb = [r.ttfb for r in results if r.ttfb is not None]
+    first_ai = [r.first_ai_chunk for r in results if r.first_ai_chunk is not None]
+    durations = [r.duration for r in succeeded]
+    errors: Dict[str, int] = {}
+    for r in results:
+        if r.error is not None:
+            errors[r.error] = errors.get(r.error, 0) + 1
+
+    def summary(values: List[float]) -> Dict[str, float]:
+        return {
+            'p50_ms': _percentile(values, 0.50) * 1000,
+            'p90_ms': _percentile(values, 0.90) * 1000,
+            'p99_ms': _percentile(values, 0.99) * 1000,
+            'max_ms': max(values, default=0.0) * 1000,
+        }
+
+    return {
+        'target': target,
+        'concurrency': args.concurrency,
+        'requests': len(results),
+        'succeeded': len(succeeded),
+        'failed': len(results) - len(succeeded),
+        'elapsed_seconds': elapsed,
+        'requests_per_second': len(results) / elapsed if elapsed else 0.0,
+        'lines_per_second': sum(r.lines for r in results) / elapsed if elapsed else 0.0,
+        'ai_chunks_per_second': sum(r.ai_chunks for r in results) / elapsed if elapsed else 0.0,
+        'megabytes_per_second': sum(r.bytes for r in results) / elapsed / 1e6 if elapsed else 0.0,
+        'ttfb': summary(ttfb),
+        'first_ai_chunk': summary(first_ai),
+        'duration': summary(durations),
+        'errors': errors,
+    }
+
+
+def print_report(report: Dict[str, Any]) -> None:
+    print(f"\n目标: {report['target']}  并发: {report['concurrency']}  请求: {report['requests']}  "
+          f"成功: {report['succeeded']}  失败: {report['failed']}  耗时: {report['elapsed_seconds']:.2f}s")
+    print(f"吞吐量: {report['requests_per_second']:.1f} 请求/秒, {report['lines_per_second']:.0f} 行/秒, "
+          f"{report['ai_chunks_per_second']:.0f} AI块/秒, {report['megabytes_per_second']:.2f} MB/秒")
+    print(f"{'指标':<16}{'p50(ms)':>10}{'p90(ms)':>10}{'p99(ms)':>10}{'max(ms)':>10}")
+    for key, label in (('ttfb', '首字节'), ('first_ai_chunk', '首个AI内容块'), ('duration', '完整响应')):
+        s = report[key]
+        print(f"{label:<16}{s['p50_ms']:>10.1f}{s['p90_ms']:>10.1f}{s['p99_ms']:>10.1f}{s['max_ms']:>10.1f}")
+    for error, count in sorted(report['errors'].items(), key=lambda item: -item[1])[:10]:
+        print(f"  错误 x{count}: {error}")
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="/api/analyze 流式接口并发压测")
+    parser.add_argument('--target', help='已运行的后端服务地址，不指定时启动本地子进程')
+    parser.add_argument('--mock-url', help='已运行的模拟LLM地址，不指定时启动本地子进程')
+    parser.add_argument('--token', help='后端需要登录时使用的访问令牌')
+    parser.add_argument('--concurrency', type=int, default=100, help='并发流数量')
+    parser.add_argument('--requests', type=int, default=500, help='请求总数')
+    parser.add_argument('--codes-per-request', type=int, default=1, help='每个请求的股票数，大于1时走批量扫描')
+    parser.add_argument('--universe', type=int, default=200, help='轮流使用的合成股票代码数')
+    parser.add_argument('--timeout', type=float, default=300.0, help='单个请求的超时（秒）')
+    parser.add_argument('--json', help='把统计结果写入该JSON文件')
+    parser.add_argument('--app-log', default=os.devnull, help='本地启动的后端服务的日志文件')
+    # 模拟LLM参数（仅在启动本地模拟LLM时生效）
+    parser.add_argument('--tokens-per-sec', type=float, default=50.0)
+    parser.add_argument('--ttft-ms', type=float, default=300.0)
+    parser.add_argument('--tokens', type=int, default=200)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--midstream-error-rate', type=float, default=0.0)
+    parser.add_argument('--fragment-bytes', type=int, default=0)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    processes = []
+    try:
+        mock_url = args.mock_url
+        if mock_url is None:
+            process, mock_url = start_mock_llm(args)
+            processes.append(process)
+
+        target = args.target
+        if target is None:
+            process, target = start_app(args.app_log)
+            processes.append(process)
+
+        report = asyncio.run(run_load(args, target.rstrip('/'), mock_url))
+        print_report(report)
+        if args.json:
+            with open(args.json, 'w', encoding='utf-8') as f:
+                json.dump(report, f, ensure_ascii=False, indent=2)
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.wait(timeout=10)
+
+
+if __name__ == '__main__':
+    main()
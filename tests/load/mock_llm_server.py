@@ -0,0 +1,204 @@
+"""
+本地模拟的OpenAI兼容流式接口，用于在不消耗真实LLM额度的情况下压测AIAnalyzer
+
+支持 POST /v1/chat/completions（stream为true时按SSE逐个token输出），可配置：
+首个token延迟、每秒token数、回复长度、HTTP错误率、流中途错误率，以及把SSE事件拆成随机大小的字节片段
+（会在行中间、UTF-8多字节字符中间断开），用于验证客户端的增量解析。
+
+运行方式（在项目根目录）：
+
+    python tests/load/mock_llm_server.py --port 9999 --tokens-per-sec 50 --ttft-ms 300 --fragment-bytes 16
+
+AIAnalyzer的API_URL设置为 http://127.0.0.1:9999/ 即可（API_KEY任意）。
+"""
+import json
+import time
+import random
+import asyncio
+import argparse
+from typing import AsyncGenerator, Dict, List
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+# 模拟回复的内容，按token循环输出
+REPLY_TEXT = (
+    "## 技术面分析\n"
+    "从均线系统看，短期均线上穿中期均线，呈多头排列；MACD柱由负转正，动能逐步增强。"
+    "RSI位于55附近，尚未进入超买区间，布林带开口向上，价格沿中轨上方运行。\n"
+    "## 量能分析\n"
+    "近五日成交量较前期温和放大，量价配合良好，资金关注度有所提升。\n"
+    "## 风险提示\n"
+    "若价格跌破20日均线且放量，需警惕趋势反转，建议设置止损位。\n"
+    "## 投资建议\n"
+    "综合技术面与量能判断，建议**买入**，注意控制仓位，分批建仓。\n"
+)
+
+
+class MockLLMConfig:
+    """模拟接口的行为配置"""
+
+    def __init__(self, tokens_per_sec: float = 50.0, ttft_ms: float = 300.0, tokens: int = 200,
+                 error_rate: float = 0.0, midstream_error_rate: float = 0.0, fragment_bytes: int = 0,
+                 seed: int = 0):
+        """
+        Args:
+            tokens_per_sec: 每秒输出的token数，0表示不限速
+            ttft_ms: 首个token前的延迟（毫秒）
+            tokens: 每次回复的token数
+            error_rate: 直接返回HTTP 500错误的请求比例
+            midstream_error_rate: 输出一半token后在流中返回错误事件的请求比例
+            fragment_bytes: 大于0时把每个SSE事件拆成1~fragment_bytes字节的随机片段分别发送
+            seed: 随机种子
+        """
+        self.tokens_per_sec = tokens_per_sec
+        self.ttft = ttft_ms / 1000
+        self.tokens = tokens
+        self.error_rate = error_rate
+        self.midstream_error_rate = midstream_error_rate
+        self.fragment_bytes = fragment_bytes
+        self.random = random.Random(seed)
+
+
+def _tokenize(text: str) -> List[str]:
+    """把回复内容切成1~3个字符的token"""
+    rng = random.Random(len(text))
+    tokens = []
+    i = 0
+    while i < len(text):
+        size = rng.randint(1, 3)
+        tokens.append(text[i:i + size])
+        i += size
+    return tokens
+
+
+REPLY_TOKENS = _tokenize(REPLY_TEXT)
+
+
+def _event(payload: Dict) -> bytes:
+    return f"data: {json.dumps(payload, ensure_ascii=False)}\n\n".encode('utf-8')
+
+
+def _chunk(model: str, content: str = None, finish_reason: str = None) -> Dict:
+    delta = {"content": content} if content is not None else {}
+    return {
+        "id": "chatcmpl-mock",
+        "object": "chat.completion.chunk",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}]
+    }
+
+
+def create_app(config: MockLLMConfig) -> FastAPI:
+    """创建模拟接口应用"""
+    app = FastAPI(title="Mock LLM")
+    stats = {'requests': 0, 'active': 0, 'http_errors': 0, 'midstream_errors': 0, 'tokens': 0}
+
+    def fragment(data: bytes) -> List[bytes]:
+        if config.fragment_bytes <= 0:
+            return [data]
+        pieces = []
+        i = 0
+        while i < len(data):
+            size = config.random.randint(1, config.fragment_bytes)
+            pieces.append(data[i:i + size])
+            i += size
+        return pieces
+
+    async def stream_reply(model: str, fail_midway: bool) -> AsyncGenerator[bytes, None]:
+        stats['active'] += 1
+        try:
+            await asyncio.sleep(config.ttft)
+            started = time.monotonic()
+            interval = 1 / config.tokens_per_sec if config.tokens_per_sec > 0 else 0.0
+
+            for i in range(config.tokens):
+                if fail_midway and i == config.tokens // 2:
+                    stats['midstream_errors'] += 1
+                    for piece in fragment(_event({"error": {"message": "mock upstream overloaded", "type": "server_error"}})):
+                        yield piece
+                    return
+
+                # 按目标速率对齐发送时间，避免sleep误差累积
+                delay = started + i * interval - time.monotonic()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+
+                stats['tokens'] += 1
+                for piece in fragment(_event(_chunk(model, REPLY_TOKENS[i % len(REPLY_TOKENS)]))):
+                    yield piece
+
+            for piece in fragment(_event(_chunk(model, finish_reason="stop")) + b"data: [DONE]\n\n"):
+                yield piece
+        finally:
+            stats['active'] -= 1
+
+    @app.post("/v1/chat/completions")
+    @app.post("/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        model = body.get("model", "mock")
+        stats['requests'] += 1
+
+        if config.random.random() < config.error_rate:
+            stats['http_errors'] += 1
+            return JSONResponse(status_code=500, content={
+                "error": {"message": "mock internal error", "type": "server_error"}
+            })
+
+        if body.get("stream"):
+            fail_midway = config.random.random() < config.midstream_error_rate
+            return StreamingResponse(stream_reply(model, fail_midway), media_type="text/event-stream")
+
+        # 非流式：等待完整生成时间后一次返回
+        generation = config.tokens / config.tokens_per_sec if config.tokens_per_sec > 0 else 0.0
+        await asyncio.sleep(config.ttft + generation)
+        stats['tokens'] += config.tokens
+        content = ''.join(REPLY_TOKENS[i % len(REPLY_TOKENS)] for i in range(config.tokens))
+        return {
+            "id": "chatcmpl-mock",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}]
+        }
+
+    @app.get("/stats")
+    async def get_stats():
+        return stats
+
+    return app
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="本地模拟的OpenAI兼容流式接口")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=9999)
+    parser.add_argument('--tokens-per-sec', type=float, default=50.0, help='每秒输出的token数，0表示不限速')
+    parser.add_argument('--ttft-ms', type=float, default=300.0, help='首个token前的延迟（毫秒）')
+    parser.add_argument('--tokens', type=int, default=200, help='每次回复的token数')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='返回HTTP 500的请求比例')
+    parser.add_argument('--midstream-error-rate', type=float, default=0.0, help='流中途返回错误事件的请求比例')
+    parser.add_argument('--fragment-bytes', type=int, default=0, help='把SSE事件拆成不超过该字节数的随机片段，0表示不拆分')
+    parser.add_argument('--seed', type=int, default=0)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    config = MockLLMConfig(
+        tokens_per_sec=args.tokens_per_sec,
+        ttft_ms=args.ttft_ms,
+        tokens=args.tokens,
+        error_rate=args.error_rate,
+        midstream_error_rate=args.midstream_error_rate,
+        fragment_bytes=args.fragment_bytes,
+        seed=args.seed
+    )
+    uvicorn.run(create_app(config), host=args.host, port=args.port, log_level='warning')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,48 @@
+"""
+各子系统正确性测试的公共配置
+
+不访问任何网络：上游请求通过进程内构造的网关和替换的akshare函数完成。
+运行方式（在项目根目录）：
+
+    python -m pytest tests/unit
+"""
+import os
+import sys
+import types
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+import pytest
+import services.data_source as data_source_module
+import utils.upstream_gateway as upstream_gateway_module
+from services.data_source import AkshareDataSource
+from utils.upstream_gateway import UpstreamGateway
+
+
+@pytest.fixture
+def gateway(monkeypatch):
+    """不限流、重试间隔很短的上游网关，替换进程级单例"""
+    gateway = UpstreamGateway(max_workers=4, limits={
+        upstream_gateway_module.SOURCE_EM: (0, 1),
+        upstream_gateway_module.SOURCE_SINA: (0, 1),
+    })
+    gateway.call_timeout = 2.0
+    gateway.max_retries = 2
+    gateway.retry_base_delay = 0.01
+    gateway.retry_max_delay = 0.02
+    gateway.hedge_enabled = False
+    monkeypatch.setattr(upstream_gateway_module, '_upstream_gateway', gateway)
+    yield gateway
+    gateway.shutdown()
+
+
+@pytest.fixture
+def fake_akshare(monkeypatch):
+    """
+    以空模块替换akshare，测试中按需设置其函数；
+    进程级数据源替换为AkshareDataSource，使调用经过真实的函数白名单
+    """
+    module = types.ModuleType('akshare')
+    monkeypatch.setitem(sys.modules, 'akshare', module)
+    monkeypatch.setattr(data_source_module, '_data_source', AkshareDataSource())
+    return module
@@ -0,0 +1,107 @@
+"""技术指标增量更新与完整计算结果一致"""
+import numpy as np
+import pandas as pd
+import pytest
+
+from services.incremental_indicator import IncrementalIndicatorEngine
+from services.technical_indicator import TechnicalIndicator
+
+
+def _bars(count: int, seed: int = 7) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    close = 10 * np.exp(np.cumsum(rng.normal(0, 0.02, count)))
+    spread = np.abs(rng.normal(0, 0.01, count)) * close
+    return pd.DataFrame({
+        'Open': close * (1 + rng.normal(0, 0.005, count)),
+        'High': close + spread,
+        'Low': close - spread,
+        'Close': close,
+        'Volume': rng.integers(1000, 5000, count).astype(float),
+    }, index=pd.bdate_range('2024-01-02', periods=count))
+
+
+@pytest.fixture
+def indicator():
+    return TechnicalIndicator()
+
+
+@pytest.fixture
+def engine():
+    return IncrementalIndicatorEngine(max_symbols=10)
+
+
+def _assert_matches_full(result: pd.DataFrame, df: pd.DataFrame, indicator: TechnicalIndicator) -> None:
+    expected = indicator.calculate_indicators(df)
+    assert list(result.columns) == list(expected.columns)
+    pd.testing.assert_index_equal(result.index, expected.index)
+    pd.testing.assert_frame_equal(result.astype(float), expected.astype(float),
+                                  check_exact=False, rtol=1e-9, atol=1e-9, check_freq=False)
+
+
+def _calculate(engine, indicator, df):
+    return engine.calculate('stock', '600000', 'A', df, indicator.params, indicator.calculate_indicators)
+
+
+def test_append_matches_full_computation(engine, indicator):
+    df = _bars(150)
+    _calculate(engine, indicator, df.iloc[:-3])
+
+    for end in (-2, -1, None):
+        result = _calculate(engine, indicator, df.iloc[:end])
+        _assert_matches_full(result, df.iloc[:end], indicator)
+    assert engine.appends == 3
+    assert engine.full_computes == 1
+
+
+def test_intraday_replace_matches_full_computation(engine, indicator):
+    df = _bars(150)
+    _calculate(engine, indicator, df)
+
+    # 盘中最新K线变化两次
+    for close in (df['Close'].iat[-1] * 1.01, df['Close'].iat[-1] * 0.97):
+        intraday = df.copy()
+        intraday.iloc[-1, intraday.columns.get_loc('Close')] = close
+        intraday.iloc[-1, intraday.columns.get_loc('High')] = max(close, intraday['High'].iat[-1])
+        intraday.iloc[-1, intraday.columns.get_loc('Low')] = min(close, intraday['Low'].iat[-1])
+        result = _calculate(engine, indicator, intraday)
+        _assert_matches_full(result, intraday, indicator)
+    assert engine.replacements == 2
+
+
+def test_changed_last_bar_then_new_bar(engine, indicator):
+    df = _bars(150)
+    previous = df.iloc[:-1].copy()
+    previous.iloc[-1, previous.columns.get_loc('Close')] *= 1.02
+    _calculate(engine, indicator, previous)
+
+    # 上一根K线收盘定格（与上次计算时不同）后又新增一根
+    result = _calculate(engine, indicator, df)
+    _assert_matches_full(result, df, indicator)
+    assert (engine.replacements, engine.appends) == (1, 1)
+
+
+def test_rolling_start_date_is_trimmed(engine, indicator):
+    df = _bars(150)
+    _calculate(engine, indicator, df.iloc[:-1])
+
+    result = _calculate(engine, indicator, df.iloc[1:])
+    assert engine.appends == 1
+    assert result.index[0] == df.index[1]
+    assert len(result) == len(df) - 1
+    expected = indicator.calculate_indicators(df).iloc[1:]
+    pd.testing.assert_frame_equal(result.astype(float), expected.astype(float),
+                                  check_exact=False, rtol=1e-9, atol=1e-9, check_freq=False)
+
+
+def test_adjusted_history_falls_back_to_full_computation(engine, indicator):
+    df = _bars(150)
+    _calculate(engine, indicator, df.iloc[:-1])
+
+    # 除权后前复权价格整体变化，不能在上次结果上增量更新
+    revised = df.copy()
+    revised[['Open', 'High', 'Low', 'Close']] *= 0.9
+    result = _calculate(engine, indicator, revised)
+
+    assert engine.appends == 0
+    assert engine.full_computes == 2
+    _assert_matches_full(result, revised, indicator)
@@ -0,0 +1,49 @@
+"""AI分析结果缓存的键和存储后端"""
+import asyncio
+
+import services.llm_result_cache as llm_result_cache_module
+from services.llm_result_cache import LLMResultCache, MemoryResultBackend, SQLiteResultBackend
+
+
+def test_key_includes_normalized_api_url():
+    key = LLMResultCache.make_key('https://api.example.com/v1/chat/completions', 'gpt-4o', 'prompt')
+
+    assert key == LLMResultCache.make_key('HTTPS://API.example.com/v1/chat/completions/', 'gpt-4o', 'prompt')
+    # 同名模型的不同服务不共享结果
+    assert key != LLMResultCache.make_key('https://other.example.com/v1/chat/completions', 'gpt-4o', 'prompt')
+    assert key != LLMResultCache.make_key('https://api.example.com/v1/chat/completions', 'gpt-4o', 'prompt2')
+
+
+def test_sqlite_backend_runs_in_thread(tmp_path, monkeypatch):
+    cache = LLMResultCache(SQLiteResultBackend(str(tmp_path / 'cache.sqlite3')))
+    offloaded = []
+    to_thread = asyncio.to_thread
+
+    async def recording_to_thread(func, *args):
+        offloaded.append(func.__name__)
+        return await to_thread(func, *args)
+
+    monkeypatch.setattr(llm_result_cache_module.asyncio, 'to_thread', recording_to_thread)
+
+    async def roundtrip():
+        await cache.put('key', ['片段1', '片段2'])
+        return await cache.get('key'), await cache.get('missing')
+
+    assert asyncio.run(roundtrip()) == (['片段1', '片段2'], None)
+    assert offloaded == ['put', 'get', 'get']
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_memory_backend_stays_on_event_loop(monkeypatch):
+    cache = LLMResultCache(MemoryResultBackend())
+
+    async def fail(*args):
+        raise AssertionError('内存后端不应放到线程中执行')
+
+    monkeypatch.setattr(llm_result_cache_module.asyncio, 'to_thread', fail)
+
+    async def roundtrip():
+        await cache.put('key', ['内容'])
+        return await cache.get('key')
+
+    assert asyncio.run(roundtrip()) == ['内容']
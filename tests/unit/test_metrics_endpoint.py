@@ -0,0 +1,31 @@
+"""/metrics 接口的访问控制"""
+import pytest
+from fastapi.testclient import TestClient
+
+import web_server
+
+
+@pytest.fixture
+def client_from():
+    def make(host: str) -> TestClient:
+        return TestClient(web_server.app, client=(host, 50000))
+    return make
+
+
+def test_without_token_only_loopback_is_allowed(client_from, monkeypatch):
+    monkeypatch.setattr(web_server, 'METRICS_TOKEN', '')
+
+    assert client_from('127.0.0.1').get('/metrics').status_code == 200
+    assert client_from('::1').get('/metrics').status_code == 200
+    assert client_from('192.168.1.20').get('/metrics').status_code == 403
+
+
+def test_token_is_required_when_configured(client_from, monkeypatch):
+    monkeypatch.setattr(web_server, 'METRICS_TOKEN', 'secret')
+    client = client_from('192.168.1.20')
+
+    assert client.get('/metrics').status_code == 401
+    assert client.get('/metrics', headers={'Authorization': 'Bearer wrong'}).status_code == 401
+    response = client.get('/metrics', headers={'Authorization': 'Bearer secret'})
+    assert response.status_code == 200
+    assert response.headers['content-type'].startswith('text/plain')
@@ -0,0 +1,82 @@
+"""本地K线存储的尾部补齐与复权变化后的全量重建"""
+import numpy as np
+import pandas as pd
+import pytest
+
+from services.ohlcv_store import OHLCVStore
+from services.stock_data_provider import StockDataProvider
+
+# 远期结束日期：最近一次核对总早于结束日期，刷新间隔为0时每次都向上游补齐
+END_DATE = '20991231'
+
+
+def _bars(count: int, scale: float = 1.0) -> pd.DataFrame:
+    index = pd.bdate_range('2024-01-02', periods=count)
+    close = (10 + np.arange(count) * 0.1) * scale
+    return pd.DataFrame({
+        'Open': close - 0.05,
+        'High': close + 0.1,
+        'Low': close - 0.1,
+        'Close': close,
+        'Volume': np.full(count, 1000.0),
+    }, index=index)
+
+
+@pytest.fixture
+def provider(tmp_path, monkeypatch):
+    """使用临时目录存储、以内存数据模拟上游的数据提供者"""
+    provider = StockDataProvider()
+    provider.store = OHLCVStore(base_dir=str(tmp_path), refresh_minutes=0)
+    provider.upstream = _bars(10)
+    provider.fetches = []
+
+    def fetch(stock_code, market_type, start_date, end_date):
+        provider.fetches.append((start_date, end_date))
+        df = provider.upstream
+        start = pd.to_datetime(start_date, format='%Y%m%d')
+        end = pd.to_datetime(end_date, format='%Y%m%d')
+        return df[(df.index >= start) & (df.index <= end)].copy()
+
+    monkeypatch.setattr(provider, '_fetch_stock_data_sync', fetch)
+    return provider
+
+
+def test_only_tail_is_fetched_and_merged(provider):
+    first = provider._get_stock_data_sync('600000', 'A', '20240101', END_DATE)
+    assert len(first) == 10
+
+    provider.upstream = _bars(11)
+    second = provider._get_stock_data_sync('600000', 'A', '20240101', END_DATE)
+
+    # 从倒数第二根已存储的K线开始补齐
+    overlap = _bars(10).index[-2].strftime('%Y%m%d')
+    assert provider.fetches == [('20240101', END_DATE), (overlap, END_DATE)]
+    pd.testing.assert_frame_equal(second, provider.upstream, check_freq=False)
+
+    stored, meta = provider.store.load('A', '600000', 'qfq')
+    assert len(stored) == 11
+    assert meta['start'] == '20240101'
+
+
+def test_adjustment_change_triggers_full_refetch(provider):
+    provider._get_stock_data_sync('600000', 'A', '20240101', END_DATE)
+
+    # 除权后前复权价格整体变化，同时新增一根K线
+    provider.upstream = _bars(11, scale=0.9)
+    result = provider._get_stock_data_sync('600000', 'A', '20240101', END_DATE)
+
+    assert len(provider.fetches) == 3
+    assert provider.fetches[-1] == ('20240101', END_DATE)
+    pd.testing.assert_frame_equal(result, provider.upstream, check_freq=False)
+
+    stored, _ = provider.store.load('A', '600000', 'qfq')
+    assert stored['Close'].tolist() == pytest.approx(provider.upstream['Close'].tolist())
+
+
+def test_earlier_start_date_refetches_in_full(provider):
+    provider._get_stock_data_sync('600000', 'A', '20240105', END_DATE)
+    provider._get_stock_data_sync('600000', 'A', '20240101', END_DATE)
+
+    assert provider.fetches == [('20240105', END_DATE), ('20240101', END_DATE)]
+    _, meta = provider.store.load('A', '600000', 'qfq')
+    assert meta['start'] == '20240101'
@@ -0,0 +1,42 @@
+"""面板模式技术指标与逐只计算一致（含缺失值）"""
+import numpy as np
+import pandas as pd
+import pytest
+
+from services.technical_indicator import TechnicalIndicator, _ema
+
+
+def _bars(count: int, seed: int) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    close = 10 * np.exp(np.cumsum(rng.normal(0, 0.02, count)))
+    return pd.DataFrame({
+        'Open': close, 'High': close * 1.01, 'Low': close * 0.99, 'Close': close,
+        'Volume': rng.integers(1000, 5000, count).astype(float),
+    }, index=pd.bdate_range('2024-01-02', periods=count))
+
+
+@pytest.mark.parametrize('period', [3, 9, 12, 26])
+def test_ema_matches_pandas_with_nan_gaps(period):
+    rng = np.random.default_rng(period)
+    arr = rng.normal(10, 1, (60, 4))
+    arr[:5, 1] = np.nan          # 前部缺失
+    arr[20:23, 2] = np.nan       # 中间连续缺失
+    arr[[10, 30, 31, 45], 3] = np.nan
+
+    expected = pd.DataFrame(arr).ewm(span=period, adjust=False).mean().to_numpy()
+    np.testing.assert_allclose(_ema(arr, period), expected, rtol=1e-12, equal_nan=True)
+
+
+def test_panel_macd_matches_single_with_missing_close():
+    indicator = TechnicalIndicator()
+    gapped = _bars(120, seed=1)
+    gapped.iloc[60, gapped.columns.get_loc('Close')] = np.nan
+    frames = {'600000': gapped, '600001': _bars(90, seed=2)}
+
+    panel = indicator.calculate_panel_indicators(frames)
+    for code, df in frames.items():
+        expected = indicator.calculate_indicators(df)
+        result = panel.frame(code)
+        for column in ('MACD', 'Signal', 'Histogram'):
+            np.testing.assert_allclose(result[column].to_numpy(float), expected[column].to_numpy(float),
+                                       rtol=1e-9, atol=1e-12, equal_nan=True)
@@ -0,0 +1,105 @@
+"""单个代码分析在盘后优先使用每日评分表"""
+import asyncio
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import services.futures_analyzer_service as futures_analyzer_module
+import services.stock_analyzer_service as stock_analyzer_module
+from services.futures_analyzer_service import FuturesAnalyzerService
+from services.stock_analyzer_service import StockAnalyzerService
+
+
+class FakeScoreTableStore:
+    """只包含指定代码的当前盘后评分表"""
+
+    def __init__(self, rows):
+        self.rows = rows
+
+    def lookup_current(self, market_type, codes, code_field):
+        return {code: {code_field: code, **self.rows[code]} for code in codes if code in self.rows}
+
+
+def _bars(count: int = 120) -> pd.DataFrame:
+    close = 10 + np.sin(np.arange(count) / 5)
+    return pd.DataFrame({
+        'Open': close, 'High': close + 0.1, 'Low': close - 0.1, 'Close': close,
+        'Volume': np.full(count, 1000.0), 'OpenInterest': np.full(count, 500.0),
+    }, index=pd.bdate_range('2024-01-02', periods=count))
+
+
+async def _fake_ai(*args, **kwargs):
+    yield json.dumps({'ai_analysis_chunk': '分析'})
+
+
+def _collect(stream) -> list:
+    async def collect():
+        return [json.loads(message) async for message in stream]
+    return asyncio.run(collect())
+
+
+@pytest.fixture
+def stock_service(monkeypatch):
+    service = StockAnalyzerService()
+    scored = []
+
+    async def get_stock_data(stock_code, market_type):
+        return _bars()
+
+    def calculate_score(df):
+        scored.append(len(df))
+        return 50
+
+    monkeypatch.setattr(service.data_provider, 'get_stock_data', get_stock_data)
+    monkeypatch.setattr(service.scorer, 'calculate_score', calculate_score)
+    monkeypatch.setattr(service.ai_analyzer, 'get_ai_analysis', _fake_ai)
+    service.scored = scored
+    return service
+
+
+def test_analyze_stock_uses_score_table(stock_service, monkeypatch):
+    store = FakeScoreTableStore({'600000': {'score': 88, 'recommendation': '买入', 'price': 10.5}})
+    monkeypatch.setattr(stock_analyzer_module, 'get_score_table_store', lambda: store)
+
+    messages = _collect(stock_service.analyze_stock('600000', 'A'))
+
+    assert messages[0]['stock_code'] == '600000'
+    assert messages[0]['score'] == 88
+    assert messages[0]['market_type'] == 'A'
+    assert stock_service.scored == []
+    assert messages[-1] == {'ai_analysis_chunk': '分析'}
+
+
+def test_analyze_stock_falls_back_to_live_score(stock_service, monkeypatch):
+    store = FakeScoreTableStore({})
+    monkeypatch.setattr(stock_analyzer_module, 'get_score_table_store', lambda: store)
+
+    messages = _collect(stock_service.analyze_stock('600000', 'A'))
+
+    assert messages[0]['score'] == 50
+    assert stock_service.scored == [120]
+    assert len(messages) == 2
+
+
+def test_analyze_futures_uses_score_table(monkeypatch):
+    service = FuturesAnalyzerService()
+
+    async def get_futures_data(futures_code):
+        return _bars()
+
+    def calculate_score(df):
+        raise AssertionError('评分表命中时不应实时评分')
+
+    monkeypatch.setattr(service.data_provider, 'get_futures_data', get_futures_data)
+    monkeypatch.setattr(service.scorer, 'calculate_score', calculate_score)
+    monkeypatch.setattr(service.ai_analyzer, 'get_futures_analysis', _fake_ai)
+    store = FakeScoreTableStore({'CU0': {'score': 72, 'recommendation': '持有'}})
+    monkeypatch.setattr(futures_analyzer_module, 'get_score_table_store', lambda: store)
+
+    messages = _collect(service.analyze_futures('CU0'))
+
+    assert messages[0]['futures_code'] == 'CU0'
+    assert messages[0]['score'] == 72
+    assert 'error' not in messages[-1]
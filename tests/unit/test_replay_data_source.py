@@ -0,0 +1,36 @@
+"""离线回放数据源在多线程下读取录制文件"""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+from services.data_source import ReplayDataSource
+
+
+def test_concurrent_reads_parse_each_file_once(tmp_path, monkeypatch):
+    source = ReplayDataSource(base_dir=str(tmp_path), latency_ms=0, failure_rate=0, synthetic=False)
+    directory = tmp_path / 'stock_zh_a_hist'
+    directory.mkdir()
+    pd.DataFrame({'日期': ['2024-01-02', '2024-01-03'], '收盘': [10.0, 10.5]}).to_parquet(
+        directory / '600000.parquet', index=False)
+
+    parses = []
+    read_parquet = pd.read_parquet
+    barrier = threading.Barrier(8)
+
+    def counting_read_parquet(path, *args, **kwargs):
+        parses.append(path)
+        return read_parquet(path, *args, **kwargs)
+
+    monkeypatch.setattr(pd, 'read_parquet', counting_read_parquet)
+
+    def fetch(_):
+        barrier.wait()
+        return source.stock_zh_a_hist(symbol='600000', start_date='20240101', end_date='20240110')
+
+    with ThreadPoolExecutor(8) as executor:
+        frames = list(executor.map(fetch, range(8)))
+
+    assert len(parses) == 1
+    assert all(len(df) == 2 for df in frames)
+    assert source.stats()['file_hits'] == 8
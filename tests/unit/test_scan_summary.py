@@ -0,0 +1,65 @@
+"""批量扫描的汇总排名消息只在调用方要求时输出"""
+import asyncio
+import json
+
+import pytest
+
+import services.futures_analyzer_service as futures_analyzer_module
+import services.stock_analyzer_service as stock_analyzer_module
+from services.futures_analyzer_service import FuturesAnalyzerService
+from services.stock_analyzer_service import StockAnalyzerService
+
+
+class FakeScoreTableStore:
+    """包含全部扫描代码的盘后评分表，扫描无需获取数据"""
+
+    def __init__(self, rows):
+        self.rows = rows
+
+    def lookup_current(self, market_type, codes, code_field):
+        return {code: {code_field: code, **self.rows[code]} for code in codes if code in self.rows}
+
+
+ROWS = {
+    'A1': {'score': 40, 'recommendation': '观望'},
+    'B2': {'score': 80, 'recommendation': '买入'},
+}
+
+
+def _collect(stream) -> list:
+    async def collect():
+        return [json.loads(message) async for message in stream]
+    return asyncio.run(collect())
+
+
+@pytest.fixture(autouse=True)
+def score_table(monkeypatch):
+    store = FakeScoreTableStore(ROWS)
+    monkeypatch.setattr(stock_analyzer_module, 'get_score_table_store', lambda: store)
+    monkeypatch.setattr(futures_analyzer_module, 'get_score_table_store', lambda: store)
+
+
+def test_stock_scan_omits_summary_by_default():
+    # 最低评分高于全部评分，不触发AI分析
+    messages = _collect(StockAnalyzerService().scan_stocks(list(ROWS), 'A', min_score=100, stream=True))
+
+    assert not any('scan_summary' in message for message in messages)
+    assert messages[-1]['scan_completed']
+
+
+def test_stock_scan_emits_summary_when_requested():
+    messages = _collect(StockAnalyzerService().scan_stocks(list(ROWS), 'A', min_score=100, stream=True, summary=True))
+
+    summary = next(message for message in messages if message.get('scan_summary'))
+    assert [row['stock_code'] for row in summary['ranking']] == ['B2', 'A1']
+
+
+def test_futures_scan_summary_is_opt_in():
+    service = FuturesAnalyzerService()
+
+    default = _collect(service.scan_futures(list(ROWS), min_score=100, stream=True))
+    requested = _collect(service.scan_futures(list(ROWS), min_score=100, stream=True, summary=True))
+
+    assert not any('scan_summary' in message for message in default)
+    summary = next(message for message in requested if message.get('scan_summary'))
+    assert [row['futures_code'] for row in summary['ranking']] == ['B2', 'A1']
@@ -0,0 +1,109 @@
+"""请求合并：并发相同请求只执行一次，异常传给所有等待方"""
+import asyncio
+
+import pytest
+
+from utils.singleflight import SingleFlight
+
+
+def test_concurrent_calls_share_one_execution():
+    flight = SingleFlight('test')
+    calls = []
+
+    async def fetch():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return object()
+
+    async def main():
+        return await asyncio.gather(*(flight.do('600000', fetch) for _ in range(5)))
+
+    results = asyncio.run(main())
+
+    assert len(calls) == 1
+    assert all(result is results[0] for result in results)
+    assert flight.calls == 5
+    assert flight.shared == 4
+    assert flight.inflight == 0
+
+
+def test_different_keys_are_not_merged():
+    flight = SingleFlight('test')
+    calls = []
+
+    async def fetch(key):
+        calls.append(key)
+        await asyncio.sleep(0.01)
+        return key
+
+    async def main():
+        return await asyncio.gather(*(flight.do(key, lambda key=key: fetch(key)) for key in ('a', 'b', 'a')))
+
+    assert asyncio.run(main()) == ['a', 'b', 'a']
+    assert sorted(calls) == ['a', 'b']
+
+
+def test_error_is_propagated_to_every_waiter_and_not_cached():
+    flight = SingleFlight('test')
+    calls = []
+
+    async def broken():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        raise ValueError('upstream error')
+
+    async def main():
+        results = await asyncio.gather(*(flight.do('key', broken) for _ in range(3)), return_exceptions=True)
+        # 失败不缓存，之后的调用重新执行
+        with pytest.raises(ValueError):
+            await flight.do('key', broken)
+        return results
+
+    results = asyncio.run(main())
+
+    assert all(isinstance(result, ValueError) for result in results)
+    assert len(calls) == 2
+    assert flight.inflight == 0
+
+
+def test_cancelling_one_waiter_keeps_shared_call_running():
+    flight = SingleFlight('test')
+
+    async def fetch():
+        await asyncio.sleep(0.05)
+        return 'ok'
+
+    async def main():
+        first = asyncio.ensure_future(flight.do('key', fetch))
+        second = asyncio.ensure_future(flight.do('key', fetch))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        return await second
+
+    assert asyncio.run(main()) == 'ok'
+    assert flight.cancelled == 0
+
+
+def test_cancelling_all_waiters_cancels_shared_call():
+    flight = SingleFlight('test')
+    finished = []
+
+    async def fetch():
+        await asyncio.sleep(0.05)
+        finished.append(1)
+
+    async def main():
+        waiters = [asyncio.ensure_future(flight.do('key', fetch)) for _ in range(2)]
+        await asyncio.sleep(0.01)
+        for waiter in waiters:
+            waiter.cancel()
+        await asyncio.gather(*waiters, return_exceptions=True)
+        await asyncio.sleep(0.06)
+
+    asyncio.run(main())
+
+    assert finished == []
+    assert flight.cancelled == 1
+    assert flight.inflight == 0
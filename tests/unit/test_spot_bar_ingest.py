@@ -0,0 +1,41 @@
+"""收盘后当日K线写入：快照代码与本地存储代码的对应"""
+from datetime import date
+
+import pandas as pd
+
+from services.ohlcv_store import OHLCVStore
+from services.spot_bar_ingest import SpotBarIngestor
+
+
+def _stored_bars(closes) -> pd.DataFrame:
+    index = pd.DatetimeIndex(pd.bdate_range('2024-01-02', periods=len(closes)), name='Date')
+    return pd.DataFrame({
+        'Open': closes, 'High': closes, 'Low': closes, 'Close': closes,
+        'Volume': [1000.0] * len(closes), 'Amount': [1e4] * len(closes),
+    }, index=index)
+
+
+def _fund_spot(code: str, prev_close: float) -> pd.DataFrame:
+    return pd.DataFrame({
+        '代码': [code], '最新价': [prev_close + 0.01], '今开': [prev_close], '最高': [prev_close + 0.02],
+        '最低': [prev_close - 0.01], '昨收': [prev_close], '成交量': [50], '成交额': [5000.0], '涨跌幅': [0.3],
+    })
+
+
+def test_prefixed_etf_codes_match_unprefixed_spot_codes(tmp_path, gateway, fake_akshare):
+    store = OHLCVStore(base_dir=str(tmp_path))
+    stored = _stored_bars([3.0, 3.1])
+    store.save('ETF', 'sh510050', 'none', stored, {'start': '20240101'})
+    fake_akshare.fund_etf_spot_em = lambda: _fund_spot('510050', 3.1)
+
+    session = date(2024, 1, 4)
+    stats = SpotBarIngestor(store)._ingest_sync('ETF', session)
+
+    assert stats['quoted'] == 1
+    assert stats['appended'] == 1
+    df, meta = store.load('ETF', 'sh510050', 'none')
+    assert df.index[-1] == pd.Timestamp(session)
+    assert df['Close'].iat[-1] == 3.11
+    # 基金快照成交量单位为手
+    assert df['Volume'].iat[-1] == 5000
+    assert meta['final_date'] == '20240104'
@@ -0,0 +1,60 @@
+"""SSE增量解码：事件在任意位置被网络分块切开时结果不变"""
+import asyncio
+import json
+
+from utils.sse_decoder import EVENT_CONTENT, EVENT_ERROR, SSEDecoder, iter_chat_stream
+
+
+def _event(content: str) -> str:
+    chunk = {'choices': [{'index': 0, 'delta': {'content': content}, 'finish_reason': None}]}
+    return f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n"
+
+
+BODY = (': keep-alive\n\n' + _event('均线多头排列，') + 'event: message\n' + _event('MACD金叉')
+        + 'data: [DONE]\n\n').encode('utf-8')
+
+
+def _decode(chunks) -> list:
+    decoder = SSEDecoder()
+    payloads = []
+    for chunk in chunks:
+        payloads.extend(decoder.feed(chunk))
+    return payloads + decoder.flush()
+
+
+def test_every_split_point_gives_same_payloads():
+    expected = _decode([BODY])
+    assert len(expected) == 3
+    assert expected[-1] == b'[DONE]'
+
+    # 包括一行中间和UTF-8多字节字符中间的所有切分位置
+    for position in range(1, len(BODY)):
+        assert _decode([BODY[:position], BODY[position:]]) == expected
+
+
+def test_byte_by_byte_chunks():
+    assert _decode([BODY[i:i + 1] for i in range(len(BODY))]) == _decode([BODY])
+
+
+def test_last_line_without_newline_is_flushed():
+    decoder = SSEDecoder()
+    assert decoder.feed(b'data: {"a": 1}\n\ndata: [DO') == [b'{"a": 1}']
+    assert decoder.feed(b'NE]') == []
+    assert decoder.flush() == [b'[DONE]']
+
+
+def test_iter_chat_stream_yields_content_and_errors():
+    body = BODY[:-len(b'data: [DONE]\n\n')] + b'data: {"error": {"message": "rate limited"}}\n\n'
+
+    async def chunks():
+        for i in range(0, len(body), 7):
+            yield body[i:i + 7]
+
+    async def collect():
+        return [event async for event in iter_chat_stream(chunks())]
+
+    assert asyncio.run(collect()) == [
+        (EVENT_CONTENT, '均线多头排列，'),
+        (EVENT_CONTENT, 'MACD金叉'),
+        (EVENT_ERROR, 'rate limited'),
+    ]
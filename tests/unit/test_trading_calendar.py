@@ -0,0 +1,60 @@
+"""交易日历：节假日不视为盘后时段的交易日"""
+from datetime import date, datetime
+from zoneinfo import ZoneInfo
+
+import pandas as pd
+import pytest
+
+import services.trading_calendar as trading_calendar_module
+from services.score_table import latest_closed_session
+from services.trading_calendar import TradingCalendar
+
+SHANGHAI = ZoneInfo('Asia/Shanghai')
+
+
+@pytest.fixture
+def calendar(gateway, fake_akshare, monkeypatch):
+    """2024年9月至10月的沪深交易日历（国庆节10月1日至7日休市）"""
+    days = pd.bdate_range('2024-09-02', '2024-10-31')
+    days = days[(days < '2024-10-01') | (days > '2024-10-07')]
+    fake_akshare.tool_trade_date_hist_sina = lambda: pd.DataFrame({'trade_date': days.date})
+
+    calendar = TradingCalendar(refresh_hours=24)
+    monkeypatch.setattr(trading_calendar_module, '_trading_calendar', calendar)
+    assert calendar.refresh()
+    return calendar
+
+
+def test_holidays_are_not_trading_days(calendar):
+    assert calendar.is_trading_day('A', date(2024, 9, 30))
+    assert not calendar.is_trading_day('A', date(2024, 10, 2))
+    assert not calendar.is_trading_day('ETF', date(2024, 10, 7))
+    assert calendar.previous_trading_day('A', date(2024, 10, 8)) == date(2024, 9, 30)
+    # 港股、美股不使用沪深交易日历，只排除周末
+    assert calendar.is_trading_day('HK', date(2024, 10, 2))
+    # 超出日历范围时按工作日判断
+    assert calendar.is_trading_day('A', date(2024, 11, 1))
+
+
+def test_latest_closed_session_skips_holidays(calendar):
+    session_date, closed_at = latest_closed_session('A', datetime(2024, 10, 2, 16, 0, tzinfo=SHANGHAI))
+    assert session_date == date(2024, 9, 30)
+    assert closed_at == datetime(2024, 9, 30, 15, 0, tzinfo=SHANGHAI)
+
+    session_date, _ = latest_closed_session('A', datetime(2024, 10, 8, 9, 0, tzinfo=SHANGHAI))
+    assert session_date == date(2024, 9, 30)
+    # 期货节假日没有盘后时段
+    assert latest_closed_session('FUTURES', datetime(2024, 10, 2, 16, 0, tzinfo=SHANGHAI)) is None
+
+
+def test_refresh_failure_falls_back_to_weekdays(gateway, fake_akshare):
+    def broken():
+        raise OSError('connection reset')
+
+    fake_akshare.tool_trade_date_hist_sina = broken
+    gateway.max_retries = 0
+    calendar = TradingCalendar()
+
+    assert not calendar.refresh()
+    assert calendar.is_trading_day('A', date(2024, 10, 2))
+    assert not calendar.is_trading_day('A', date(2024, 10, 5))
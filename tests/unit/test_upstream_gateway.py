@@ -0,0 +1,188 @@
+"""上游网关的超时、重试、备用数据源和对冲请求"""
+import time
+import threading
+
+import pandas as pd
+import pytest
+
+from services.stock_data_provider import StockDataProvider
+from utils.upstream_gateway import SOURCE_EM, SOURCE_SINA
+
+
+def _em_fund_hist(**kwargs) -> pd.DataFrame:
+    return pd.DataFrame({
+        '日期': ['2024-01-02', '2024-01-03'],
+        '开盘': [1.0, 1.1],
+        '收盘': [1.1, 1.2],
+        '最高': [1.2, 1.3],
+        '最低': [0.9, 1.0],
+        '成交量': [10, 20],
+        '成交额': [1000.0, 2000.0],
+        '振幅': [0.0, 0.0],
+    })
+
+
+def test_etf_falls_back_to_em_after_sina_network_error(gateway, fake_akshare):
+    calls = {'sina': 0, 'em': []}
+
+    def fund_etf_hist_sina(**kwargs):
+        calls['sina'] += 1
+        raise OSError('connection reset')
+
+    def fund_etf_hist_em(**kwargs):
+        calls['em'].append(kwargs)
+        return _em_fund_hist(**kwargs)
+
+    fake_akshare.fund_etf_hist_sina = fund_etf_hist_sina
+    fake_akshare.fund_etf_hist_em = fund_etf_hist_em
+
+    df = StockDataProvider()._fetch_stock_data_sync('sh510050', 'ETF', '20240101', '20240110')
+
+    assert not hasattr(df, 'error')
+    assert calls['sina'] == 1
+    assert calls['em'][0]['symbol'] == '510050'
+    assert list(df.columns) == ['Open', 'High', 'Low', 'Close', 'Volume', 'Amount']
+    # 东方财富基金成交量单位为手，转换为股
+    assert df['Volume'].tolist() == [1000, 2000]
+    assert df.index[0] == pd.Timestamp('2024-01-02')
+
+
+def test_retries_network_errors_with_backoff(gateway):
+    attempts = []
+
+    def flaky():
+        attempts.append(time.monotonic())
+        if len(attempts) < 3:
+            raise ConnectionError('reset')
+        return 'ok'
+
+    assert gateway.fetch(SOURCE_EM, flaky) == 'ok'
+    assert len(attempts) == 3
+    assert gateway.stats()['sources'][SOURCE_EM]['retries'] == 2
+
+
+def test_gives_up_after_max_retries(gateway):
+    def broken():
+        raise ConnectionError('down')
+
+    with pytest.raises(ConnectionError):
+        gateway.fetch(SOURCE_EM, broken)
+    assert gateway.stats()['sources'][SOURCE_EM]['calls'] == gateway.max_retries + 1
+
+
+def test_non_retryable_error_is_raised_immediately(gateway):
+    calls = []
+
+    def bad_symbol():
+        calls.append(1)
+        raise KeyError('date')
+
+    with pytest.raises(KeyError):
+        gateway.fetch(SOURCE_EM, bad_symbol)
+    assert len(calls) == 1
+
+
+def test_alternate_error_does_not_abort_fetch(gateway):
+    primary_calls = []
+
+    def primary():
+        primary_calls.append(1)
+        if len(primary_calls) == 1:
+            raise OSError('reset')
+        return 'primary'
+
+    def alternate():
+        raise AttributeError('not available')
+
+    assert gateway.fetch(SOURCE_SINA, primary, alternate=(SOURCE_EM, alternate)) == 'primary'
+    assert len(primary_calls) == 2
+
+
+def test_timeout_is_retried(gateway):
+    gateway.call_timeout = 0.2
+    release = threading.Event()
+    calls = []
+
+    def hangs_once():
+        calls.append(1)
+        if len(calls) == 1:
+            release.wait(5)
+        return 'ok'
+
+    try:
+        assert gateway.fetch(SOURCE_EM, hangs_once) == 'ok'
+    finally:
+        release.set()
+    assert gateway.stats()['sources'][SOURCE_EM]['timeouts'] == 1
+
+
+def test_hedge_wins_when_first_request_is_slow(gateway):
+    gateway.hedge_enabled = True
+    gateway.hedge_min_delay = 0.05
+    for _ in range(30):
+        gateway.fetch(SOURCE_EM, lambda: None)
+
+    release = threading.Event()
+    calls = []
+
+    def slow_first():
+        calls.append(1)
+        if len(calls) == 1:
+            release.wait(5)
+            return 'slow'
+        return 'hedged'
+
+    started = time.monotonic()
+    try:
+        assert gateway.fetch(SOURCE_EM, slow_first) == 'hedged'
+    finally:
+        release.set()
+    assert time.monotonic() - started < 1.0
+    stats = gateway.stats()['sources'][SOURCE_EM]
+    assert stats['hedges'] == 1
+    assert stats['hedge_wins'] == 1
+
+
+def test_rate_limit_wait_does_not_count_against_deadline(gateway, monkeypatch):
+    gateway.call_timeout = 0.3
+    gateway.max_retries = 0
+    # 令牌桶每秒5个、容量1：第4个请求要排队约0.6秒，超过单次超时
+    from utils.upstream_gateway import TokenBucket
+    monkeypatch.setitem(gateway._buckets, SOURCE_EM, TokenBucket(5, 1))
+
+    results = [gateway.fetch(SOURCE_EM, lambda i=i: i) for i in range(4)]
+
+    assert results == [0, 1, 2, 3]
+    stats = gateway.stats()['sources'][SOURCE_EM]
+    assert stats['timeouts'] == 0
+    assert stats['concurrency_decreases'] == 0
+    # 耗时样本不含限流等待
+    assert stats['p99_latency_seconds'] < 0.1
+
+
+def test_abandoned_calls_are_capped(gateway):
+    gateway.call_timeout = 0.05
+    gateway.max_retries = 0
+    gateway.max_abandoned = 2
+    release = threading.Event()
+    calls = []
+
+    def hangs():
+        calls.append(1)
+        release.wait(5)
+
+    try:
+        for _ in range(2):
+            with pytest.raises(TimeoutError):
+                gateway.fetch(SOURCE_EM, hangs)
+        assert gateway.abandoned == 2
+        # 达到上限后不再占用新线程
+        with pytest.raises(TimeoutError):
+            gateway.fetch(SOURCE_EM, hangs)
+        assert len(calls) == 2
+    finally:
+        release.set()
+    deadline = time.monotonic() + 2
+    while gateway.abandoned and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert gateway.abandoned == 0
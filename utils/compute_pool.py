@@ -0,0 +1,166 @@
+import os
+import sys
+import asyncio
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Optional
+from utils.logger import get_logger
+
+# 获取日志器
+logger = get_logger()
+
+# 进程池连续损坏达到该次数后不再重建，改在线程池中计算
+MAX_CONSECUTIVE_BREAKS = 3
+
+
+def _spawn_supported() -> bool:
+    """
+    spawn方式的子进程会重新导入主模块，主程序来自标准输入或交互式解释器（__file__不是实际文件）时
+    子进程启动即失败，只能在线程池中计算
+    """
+    main_path = getattr(sys.modules.get('__main__'), '__file__', None)
+    return main_path is None or os.path.exists(main_path)
+
+
+class ComputePool:
+    """
+    CPU密集计算的进程池
+    技术指标和评分等计算在子进程中执行，不阻塞事件循环，批量扫描可以利用多核；
+    参数和结果只传递NumPy数组，避免序列化DataFrame的开销。
+    未启用进程池或任务较小时改在线程池中执行
+    """
+
+    def __init__(self, max_workers: Optional[int] = None, min_batch: Optional[int] = None):
+        """
+        初始化计算进程池（子进程在首次使用时才启动）
+
+        Args:
+            max_workers: 子进程数，默认为环境变量COMPUTE_POOL_WORKERS（默认CPU核数），0表示不使用进程池
+            min_batch: 批量任务使用进程池的最小标的数，默认为环境变量COMPUTE_POOL_MIN_BATCH（默认50），
+                       更小的批量在线程池中执行，避免进程间传输的开销超过计算本身
+        """
+        if max_workers is None:
+            max_workers = int(os.getenv('COMPUTE_POOL_WORKERS') or os.cpu_count() or 1)
+        if min_batch is None:
+            min_batch = int(os.getenv('COMPUTE_POOL_MIN_BATCH', 50))
+
+        self.max_workers = max_workers
+        self.min_batch = min_batch
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+
+        # 统计计数
+        self.process_tasks = 0
+        self.thread_tasks = 0
+        # 已提交到进程池尚未完成的任务数（含排队）
+        self.in_flight = 0
+        self.broken = 0
+        self._consecutive_breaks = 0
+        # 不使用进程池的原因，None表示可用
+        self._disabled_reason: Optional[str] = None
+
+        logger.debug(f"初始化ComputePool: 进程数={max_workers}, 批量阈值={min_batch}")
+
+    @property
+    def enabled(self) -> bool:
+        """是否使用进程池"""
+        if self.max_workers <= 0 or self._disabled_reason is not None:
+            return False
+        if not _spawn_supported():
+            self._disabled_reason = '主模块不是可导入的文件，spawn子进程无法启动'
+            logger.warning(f"计算进程池不可用，改为在线程池中计算: {self._disabled_reason}")
+            return False
+        return True
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        """获取进程池，不存在时创建（使用spawn方式，避免在多线程进程中fork）"""
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ProcessPoolExecutor(
+                        max_workers=self.max_workers,
+                        mp_context=multiprocessing.get_context('spawn')
+                    )
+                    logger.info(f"计算进程池已启动, 进程数: {self.max_workers}")
+        return self._executor
+
+    async def run(self, func: Callable[..., Any], *args: Any, size: Optional[int] = None) -> Any:
+        """
+        在进程池中执行计算
+
+        Args:
+            func: 模块级函数（需可被pickle），参数和返回值应为NumPy数组或基本类型
+            *args: 函数参数
+            size: 任务包含的标的数，小于min_batch时在线程池中执行；None表示单个完整计算，总是使用进程池
+
+        Returns:
+            函数的返回值
+        """
+        if not self.enabled or (size is not None and size < self.min_batch):
+            self.thread_tasks += 1
+            return await asyncio.to_thread(func, *args)
+
+        loop = asyncio.get_running_loop()
+        self.in_flight += 1
+        try:
+            result = await loop.run_in_executor(self._get_executor(), func, *args)
+        except BrokenProcessPool as e:
+            # 子进程异常退出（如被OOM终止）时重建进程池，本次改在线程池中执行；
+            # 连续损坏说明子进程无法正常启动，不再重建，避免每个任务都启动一批注定失败的进程
+            self.broken += 1
+            self._consecutive_breaks += 1
+            self._reset()
+            if self._consecutive_breaks >= MAX_CONSECUTIVE_BREAKS:
+                self._disabled_reason = str(e)
+                logger.error(f"计算进程池连续损坏 {self._consecutive_breaks} 次，改为在线程池中计算: {str(e)}")
+            else:
+                logger.error(f"计算进程池已损坏，将重新创建: {str(e)}")
+            self.thread_tasks += 1
+            return await asyncio.to_thread(func, *args)
+        finally:
+            self.in_flight -= 1
+
+        self._consecutive_breaks = 0
+        self.process_tasks += 1
+        return result
+
+    def _reset(self) -> None:
+        """丢弃已损坏的进程池"""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def shutdown(self) -> None:
+        """关闭进程池"""
+        self._reset()
+
+    def stats(self) -> dict:
+        """获取统计信息"""
+        return {
+            'workers': self.max_workers,
+            'min_batch': self.min_batch,
+            'process_tasks': self.process_tasks,
+            'thread_tasks': self.thread_tasks,
+            'in_flight': self.in_flight,
+            'broken': self.broken,
+            'disabled': self._disabled_reason is not None
+        }
+
+
+# 进程级单例
+_compute_pool: Optional[ComputePool] = None
+_compute_pool_guard = threading.Lock()
+
+
+def get_compute_pool() -> ComputePool:
+    """获取进程级计算进程池"""
+    global _compute_pool
+
+    if _compute_pool is None:
+        with _compute_pool_guard:
+            if _compute_pool is None:
+                _compute_pool = ComputePool()
+    return _compute_pool
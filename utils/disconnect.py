@@ -0,0 +1,92 @@
+import asyncio
+from typing import AsyncGenerator, List
+from starlette.requests import Request
+from utils.logger import get_logger
+from utils.metrics import get_metrics
+
+# 获取日志器
+logger = get_logger()
+
+# 管道正常结束和客户端断开的标记
+_PIPELINE_DONE = object()
+_DISCONNECTED = object()
+
+
+async def wait_for_disconnect(request: Request) -> None:
+    """
+    等待客户端断开连接
+
+    请求体已读取完毕后，receive只会在连接断开时返回http.disconnect，因此无需轮询
+    """
+    while True:
+        message = await request.receive()
+        if message['type'] == 'http.disconnect':
+            return
+
+
+async def cancel_on_disconnect(request: Request, stream: AsyncGenerator[str, None], work: str,
+                               queue_size: int = 64) -> AsyncGenerator[str, None]:
+    """
+    在独立任务中运行流式分析管道，客户端断开时立即取消
+
+    取消会沿管道传递：尚未开始的上游请求从网关队列中移除、正在进行的LLM流式请求被中断，
+    不再等到下一次向客户端写出数据时才发现连接已断开
+
+    Args:
+        request: 当前请求
+        stream: 生成响应内容的异步生成器
+        work: 工作类型，用于取消计数和日志，如'analyze'
+        queue_size: 管道与响应之间的缓冲长度，客户端读取变慢时对管道形成背压
+
+    Returns:
+        异步生成器，逐块转发管道的输出
+    """
+    queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+    errors: List[Exception] = []
+
+    async def pump() -> None:
+        try:
+            async for item in stream:
+                await queue.put(item)
+        except Exception as e:
+            errors.append(e)
+        finally:
+            # 在等待写入队列时被取消，管道停在yield处，需显式关闭以执行各层的清理
+            await stream.aclose()
+        await queue.put(_PIPELINE_DONE)
+
+    async def watch() -> None:
+        await wait_for_disconnect(request)
+        if pipeline.done():
+            return
+        pipeline.cancel()
+        # 管道已取消，不会再写入队列，清空后放入断开标记唤醒响应
+        while not queue.empty():
+            queue.get_nowait()
+        queue.put_nowait(_DISCONNECTED)
+
+    pipeline = asyncio.ensure_future(pump())
+    watcher = asyncio.ensure_future(watch())
+    finished = False
+    try:
+        while True:
+            item = await queue.get()
+            if item is _PIPELINE_DONE:
+                finished = True
+                break
+            if item is _DISCONNECTED:
+                break
+            yield item
+
+        if errors:
+            raise errors[0]
+    finally:
+        if not finished:
+            get_metrics().count_cancelled(work)
+            logger.info(f"客户端已断开，取消{work}流式处理")
+        for task in (pipeline, watcher):
+            if not task.done():
+                task.cancel()
+        # 不用gather等待：响应任务所在的取消域会反复取消当前任务，gather会把每次取消再传给管道，
+        # 打断管道中正在进行的清理（如关闭LLM连接），wait不会向被等待的任务传递取消
+        await asyncio.wait((pipeline, watcher))
@@ -0,0 +1,121 @@
+import os
+import asyncio
+import threading
+import httpx
+from typing import Dict, Optional, Tuple
+from urllib.parse import urlsplit
+from utils.logger import get_logger
+
+# 获取日志器
+logger = get_logger()
+
+
+class HTTPClientPool:
+    """
+    共享HTTP客户端池
+    按基础URL（协议+主机+端口）复用httpx.AsyncClient，保持长连接，避免每次请求重新建立TCP/TLS连接
+    """
+
+    def __init__(self, max_connections: Optional[int] = None, max_keepalive: Optional[int] = None,
+                 keepalive_expiry: Optional[float] = None, http2: Optional[bool] = None):
+        """
+        初始化HTTP客户端池
+
+        Args:
+            max_connections: 每个基础URL的最大连接数，默认为环境变量HTTP_MAX_CONNECTIONS（默认100）
+            max_keepalive: 每个基础URL保持的空闲长连接数，默认为环境变量HTTP_MAX_KEEPALIVE（默认20）
+            keepalive_expiry: 空闲长连接的保持时间（秒），默认为环境变量HTTP_KEEPALIVE_EXPIRY（默认30秒）
+            http2: 是否启用HTTP/2，默认为环境变量HTTP_ENABLE_HTTP2（默认false，需要安装h2）
+        """
+        if max_connections is None:
+            max_connections = int(os.getenv('HTTP_MAX_CONNECTIONS', 100))
+        if max_keepalive is None:
+            max_keepalive = int(os.getenv('HTTP_MAX_KEEPALIVE', 20))
+        if keepalive_expiry is None:
+            keepalive_expiry = float(os.getenv('HTTP_KEEPALIVE_EXPIRY', 30))
+        if http2 is None:
+            http2 = os.getenv('HTTP_ENABLE_HTTP2', 'false').lower() == 'true'
+
+        if http2:
+            try:
+                import h2  # noqa: F401
+            except ImportError:
+                logger.warning("未安装h2，HTTP/2已禁用")
+                http2 = False
+
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive,
+            keepalive_expiry=keepalive_expiry
+        )
+        self.http2 = http2
+
+        # (事件循环id, 基础URL) -> (事件循环, 客户端)
+        self._clients: Dict[Tuple[int, str], Tuple[asyncio.AbstractEventLoop, httpx.AsyncClient]] = {}
+        self._lock = threading.Lock()
+
+        logger.debug(f"初始化HTTPClientPool: limits={self.limits}, http2={self.http2}")
+
+    @staticmethod
+    def base_url(url: str) -> str:
+        """提取URL中的协议、主机和端口作为连接复用的键"""
+        parts = urlsplit(url)
+        return f"{parts.scheme}://{parts.netloc}".lower()
+
+    def get_client(self, url: str) -> httpx.AsyncClient:
+        """
+        获取指定URL对应的共享客户端
+
+        客户端不设置默认超时，调用方应在每次请求时传入timeout；
+        客户端与创建时的事件循环绑定，不同事件循环各自持有独立的客户端
+
+        Args:
+            url: 请求URL
+
+        Returns:
+            共享的httpx.AsyncClient，调用方不应关闭
+        """
+        loop = asyncio.get_running_loop()
+        key = (id(loop), self.base_url(url))
+
+        with self._lock:
+            entry = self._clients.get(key)
+            if entry is not None and entry[0] is loop and not entry[1].is_closed:
+                return entry[1]
+
+            client = httpx.AsyncClient(limits=self.limits, http2=self.http2, timeout=None)
+            self._clients[key] = (loop, client)
+            logger.debug(f"创建共享HTTP客户端: {key[1]}")
+            return client
+
+    async def aclose(self) -> None:
+        """关闭当前事件循环下的所有客户端"""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            keys = [key for key, (client_loop, _) in self._clients.items() if client_loop is loop]
+            clients = [self._clients.pop(key)[1] for key in keys]
+
+        for client in clients:
+            try:
+                await client.aclose()
+            except Exception as e:
+                logger.warning(f"关闭HTTP客户端时出错: {str(e)}")
+
+        if clients:
+            logger.info(f"已关闭 {len(clients)} 个共享HTTP客户端")
+
+
+# 进程级单例
+_http_client_pool: Optional[HTTPClientPool] = None
+_http_client_pool_guard = threading.Lock()
+
+
+def get_http_client_pool() -> HTTPClientPool:
+    """获取进程级共享HTTP客户端池"""
+    global _http_client_pool
+
+    if _http_client_pool is None:
+        with _http_client_pool_guard:
+            if _http_client_pool is None:
+                _http_client_pool = HTTPClientPool()
+    return _http_client_pool
@@ -0,0 +1,258 @@
+import math
+import time
+import threading
+from contextlib import contextmanager
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, List, Optional, Tuple
+from utils.logger import get_logger
+
+# 获取日志器
+logger = get_logger()
+
+# 指标名前缀
+METRIC_PREFIX = 'stock_scanner'
+
+# 阶段耗时直方图的默认分桶（秒）
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# 请求处理的各个阶段
+STAGE_UPSTREAM_FETCH = 'upstream_fetch'   # 上游行情请求
+STAGE_NORMALIZATION = 'normalization'     # 行情数据标准化
+STAGE_INDICATORS = 'indicators'           # 技术指标计算
+STAGE_SCORING = 'scoring'                 # 评分
+STAGE_LLM_TTFT = 'llm_ttft'               # LLM首个内容块
+STAGE_LLM_TOTAL = 'llm_total'             # LLM完整响应
+STAGE_STREAM_WRITE = 'stream_write'       # 向客户端写出一个数据块
+
+
+def _escape(value: Any) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(labels: Dict[str, Any]) -> str:
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{key}="{_escape(value)}"' for key, value in labels.items()) + '}'
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return '+Inf' if value > 0 else '-Inf'
+    return repr(float(value))
+
+
+class Histogram:
+    """带标签的累积分桶直方图（线程安全）"""
+
+    def __init__(self, name: str, help_text: str, label_names: Tuple[str, ...],
+                 buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.buckets = tuple(buckets) + (math.inf,)
+        # 标签值 -> [各分桶计数, 总和, 总数]
+        self._series: Dict[Tuple[str, ...], list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *label_values: str) -> None:
+        index = next(i for i, bound in enumerate(self.buckets) if value <= bound)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = [[0] * len(self.buckets), 0.0, 0]
+                self._series[label_values] = series
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = [(key, list(series[0]), series[1], series[2]) for key, series in self._series.items()]
+        for label_values, counts, total, count in sorted(items):
+            labels = dict(zip(self.label_names, label_values))
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                lines.append(f"{self.name}_bucket{_format_labels({**labels, 'le': _format_value(bound)})} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(labels)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(labels)} {count}")
+        return lines
+
+
+class Gauge:
+    """带标签的瞬时值（线程安全）"""
+
+    def __init__(self, name: str, help_text: str, label_names: Tuple[str, ...]):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float, *label_values: str) -> None:
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0.0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} gauge"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for label_values, value in items:
+            lines.append(f"{self.name}{_format_labels(dict(zip(self.label_names, label_values)))} {_format_value(value)}")
+        return lines
+
+
+class Counter(Gauge):
+    """带标签的单调递增计数"""
+
+    def render(self) -> List[str]:
+        lines = super().render()
+        lines[1] = f"# TYPE {self.name} counter"
+        return lines
+
+
+class InFlight:
+    """进入时计数加一、退出时减一的上下文管理器"""
+
+    def __init__(self, gauge: Gauge, kind: str):
+        self.gauge = gauge
+        self.kind = kind
+
+    def __enter__(self) -> 'InFlight':
+        self.gauge.inc(1, self.kind)
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.gauge.inc(-1, self.kind)
+
+    async def __aenter__(self) -> 'InFlight':
+        return self.__enter__()
+
+    async def __aexit__(self, *exc_info) -> None:
+        self.__exit__(*exc_info)
+
+
+class Metrics:
+    """
+    进程内指标注册表
+    记录各阶段耗时直方图和进行中的任务数，并在导出时从已注册的组件（缓存、线程池、进程池等）
+    读取统计信息，以Prometheus文本格式输出
+    """
+
+    def __init__(self):
+        self.stage_seconds = Histogram(
+            f'{METRIC_PREFIX}_stage_seconds', '各处理阶段耗时（秒）', ('stage', 'market'))
+        self.in_flight = Gauge(
+            f'{METRIC_PREFIX}_in_flight', '进行中的任务数', ('kind',))
+        self.cancelled = Counter(
+            f'{METRIC_PREFIX}_cancelled_total', '客户端断开后取消的工作数', ('work',))
+        # 名称 -> (统计函数, 标签名)
+        self._collectors: Dict[str, Tuple[Callable[[], Dict[str, Any]], Optional[str]]] = {}
+        self._lock = threading.Lock()
+
+    def observe_stage(self, stage: str, seconds: float, market: str = '') -> None:
+        """记录一次阶段耗时"""
+        self.stage_seconds.observe(seconds, stage, market or '')
+
+    @contextmanager
+    def time_stage(self, stage: str, market: str = '') -> Iterator[None]:
+        """统计代码块的耗时（异常时也记录）"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe_stage(stage, time.perf_counter() - started, market)
+
+    def track_in_flight(self, kind: str) -> 'InFlight':
+        """统计代码块执行期间的进行中任务数，可用于with和async with"""
+        return InFlight(self.in_flight, kind)
+
+    def count_cancelled(self, work: str, amount: int = 1) -> None:
+        """记录因客户端断开而取消的工作，如流式响应、LLM流"""
+        self.cancelled.inc(amount, work)
+
+    def register_collector(self, name: str, func: Callable[[], Dict[str, Any]], label: Optional[str] = None) -> None:
+        """
+        注册组件统计信息，导出时调用func并把其中的数值输出为 stock_scanner_<name>_<键> 指标
+
+        Args:
+            name: 组件名
+            func: 返回统计字典的函数
+            label: 不为None时func返回 {标签值: 统计字典}，标签值以该标签名输出
+        """
+        with self._lock:
+            self._collectors[name] = (func, label)
+
+    def _render_collectors(self) -> List[str]:
+        with self._lock:
+            collectors = list(self._collectors.items())
+
+        # 指标名 -> [(标签, 数值)]
+        samples: Dict[str, List[Tuple[Dict[str, Any], float]]] = {}
+        for name, (func, label) in collectors:
+            try:
+                stats = func()
+            except Exception as e:
+                logger.warning(f"读取组件[{name}]统计信息失败: {str(e)}")
+                continue
+            if not stats:
+                continue
+
+            groups = stats.items() if label else [(None, stats)]
+            for label_value, group in groups:
+                labels = {label: label_value} if label else {}
+                for key, value in group.items():
+                    if isinstance(value, bool):
+                        value = int(value)
+                    if not isinstance(value, (int, float)):
+                        continue
+                    samples.setdefault(f'{METRIC_PREFIX}_{name}_{key}', []).append((labels, value))
+
+        lines = []
+        for metric_name in sorted(samples):
+            lines.append(f"# TYPE {metric_name} gauge")
+            for labels, value in samples[metric_name]:
+                lines.append(f"{metric_name}{_format_labels(labels)} {_format_value(value)}")
+        return lines
+
+    def render(self) -> str:
+        """以Prometheus文本格式导出所有指标"""
+        lines = (self.stage_seconds.render() + self.in_flight.render() + self.cancelled.render()
+                 + self._render_collectors())
+        return '\n'.join(lines) + '\n'
+
+
+# 进程级单例
+_metrics: Optional[Metrics] = None
+_metrics_guard = threading.Lock()
+
+
+def get_metrics() -> Metrics:
+    """获取进程级指标注册表"""
+    global _metrics
+
+    if _metrics is None:
+        with _metrics_guard:
+            if _metrics is None:
+                _metrics = Metrics()
+    return _metrics
+
+
+async def instrument_stream(stream: AsyncIterator[str], kind: str, market: str = '') -> AsyncIterator[str]:
+    """
+    包装流式响应的生成器：统计进行中的响应数，以及每个数据块交给服务器写出到客户端的耗时
+
+    Args:
+        stream: 原始的异步生成器
+        kind: 进行中任务的类型，如'analyze'
+        market: 市场类型
+
+    Returns:
+        逐块转发原始内容的异步生成器
+    """
+    metrics = get_metrics()
+    with metrics.track_in_flight(kind):
+        async for chunk in stream:
+            started = time.perf_counter()
+            yield chunk
+            metrics.observe_stage(STAGE_STREAM_WRITE, time.perf_counter() - started, market)
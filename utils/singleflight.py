@@ -0,0 +1,83 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable
+from utils.logger import get_logger
+
+# 获取日志器
+logger = get_logger()
+
+
+class SingleFlight:
+    """
+    请求合并（single-flight）
+    同一键的并发调用共享同一个进行中的任务，任务完成后立即移除，不做结果缓存
+    """
+
+    def __init__(self, name: str = "default"):
+        """
+        初始化请求合并器
+
+        Args:
+            name: 名称，用于日志
+        """
+        self.name = name
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+        # 共享任务 -> 仍在等待的调用方数
+        self._waiters: Dict[asyncio.Future, int] = {}
+
+        # 统计计数
+        self.calls = 0
+        self.shared = 0
+        self.cancelled = 0
+
+    async def do(self, key: Hashable, func: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        执行调用，若同一键已有进行中的调用则等待其结果
+
+        单个等待方被取消不会取消共享任务，其余等待方仍可拿到结果；所有等待方都取消时共享任务随之取消
+
+        Args:
+            key: 合并键
+            func: 无参协程函数，仅在没有进行中的调用时执行
+
+        Returns:
+            调用结果
+        """
+        self.calls += 1
+        task = self._inflight.get(key)
+
+        if task is None:
+            task = asyncio.ensure_future(func())
+            self._inflight[key] = task
+            self._waiters[task] = 0
+            task.add_done_callback(lambda t: self._on_done(key, t))
+        else:
+            self.shared += 1
+            logger.debug(f"[{self.name}] 合并并发请求: {key}")
+
+        self._waiters[task] += 1
+        try:
+            return await asyncio.shield(task)
+        except asyncio.CancelledError:
+            # 所有等待方都已取消时取消共享任务，尚未开始的上游请求不再执行
+            if task in self._waiters:
+                self._waiters[task] -= 1
+                if self._waiters[task] == 0 and not task.done():
+                    # 立即移除，之后的同键调用重新发起而不是等待已取消的任务
+                    if self._inflight.get(key) is task:
+                        del self._inflight[key]
+                    task.cancel()
+                    self.cancelled += 1
+            raise
+
+    def _on_done(self, key: Hashable, task: asyncio.Future) -> None:
+        """任务完成后移除，并取走异常避免所有等待方都已取消时产生未处理异常告警"""
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        self._waiters.pop(task, None)
+        if not task.cancelled():
+            task.exception()
+
+    @property
+    def inflight(self) -> int:
+        """进行中的调用数"""
+        return len(self._inflight)
@@ -0,0 +1,122 @@
+import orjson
+from typing import AsyncIterator, List, Optional, Tuple
+from utils.logger import get_logger
+
+# 获取日志器
+logger = get_logger()
+
+# 解析出的事件类型
+EVENT_CONTENT = 'content'   # 增量内容
+EVENT_ERROR = 'error'       # 流中返回的错误
+
+# 不参与解析的SSE字段
+_IGNORED_FIELDS = (b'event:', b'id:', b'retry:')
+
+
+class SSEDecoder:
+    """
+    SSE字节流的增量解码器
+
+    网络分块可能在任意位置断开（包括一行的中间和UTF-8多字节字符的中间），
+    未以换行结束的尾部会缓存到下一次feed时拼接，只有完整的行才会被解析
+    """
+
+    def __init__(self):
+        self._pending = b''
+
+    def feed(self, data: bytes) -> List[bytes]:
+        """
+        输入一个网络分块，返回其中已完整的data负载
+
+        Args:
+            data: 原始字节
+
+        Returns:
+            data字段内容列表（已去除"data:"前缀）
+        """
+        if self._pending:
+            data = self._pending + data
+        lines = data.split(b'\n')
+        self._pending = lines.pop()
+        return [payload for payload in map(self._payload, lines) if payload is not None]
+
+    def flush(self) -> List[bytes]:
+        """流结束时处理缓存中没有换行结尾的最后一行"""
+        line, self._pending = self._pending, b''
+        payload = self._payload(line)
+        return [payload] if payload is not None else []
+
+    @staticmethod
+    def _payload(line: bytes) -> Optional[bytes]:
+        line = line.strip()
+        if not line or line.startswith(b':'):
+            return None
+        if line.startswith(b'data:'):
+            return line[5:].lstrip()
+        if line.startswith(_IGNORED_FIELDS):
+            return None
+        # 部分兼容接口不带data:前缀，直接逐行输出JSON
+        return line
+
+
+def parse_chat_payload(payload: bytes) -> Optional[Tuple[str, str]]:
+    """
+    解析OpenAI兼容接口的一条流式负载，只提取choices[0].delta.content和错误信息
+
+    Args:
+        payload: data字段内容
+
+    Returns:
+        (EVENT_CONTENT, 内容) 或 (EVENT_ERROR, 错误信息)，结束标记、空delta和无法识别的负载返回None
+    """
+    if payload == b'[DONE]':
+        return None
+
+    try:
+        data = orjson.loads(payload)
+    except orjson.JSONDecodeError:
+        logger.error(f"流式响应解析错误，块内容: {payload[:200].decode('utf-8', 'replace')}")
+        if b'streaming failed after retries' in payload.lower():
+            return EVENT_ERROR, '流式传输失败，请稍后重试'
+        return None
+
+    if not isinstance(data, dict):
+        return None
+
+    error = data.get('error')
+    if error:
+        message = error.get('message', error) if isinstance(error, dict) else error
+        return EVENT_ERROR, str(message)
+
+    choices = data.get('choices')
+    if not choices or not isinstance(choices, list):
+        return None
+    delta = choices[0].get('delta') if isinstance(choices[0], dict) else None
+    if not delta:
+        return None
+    content = delta.get('content')
+    if not content:
+        return None
+    return EVENT_CONTENT, content
+
+
+async def iter_chat_stream(chunks: AsyncIterator[bytes]) -> AsyncIterator[Tuple[str, str]]:
+    """
+    把OpenAI兼容接口的SSE字节流解码为内容和错误事件
+
+    Args:
+        chunks: 原始字节分块，通常为 response.aiter_bytes()
+
+    Returns:
+        异步生成器，依次产出 (事件类型, 文本)
+    """
+    decoder = SSEDecoder()
+    async for data in chunks:
+        for payload in decoder.feed(data):
+            event = parse_chat_payload(payload)
+            if event is not None:
+                yield event
+    for payload in decoder.flush():
+        event = parse_chat_payload(payload)
+        if event is not None:
+            yield event
@@ -0,0 +1,116 @@
+import asyncio
+from typing import Any, AsyncGenerator, AsyncIterator, Callable, List
+from utils.logger import get_logger
+
+# 获取日志器
+logger = get_logger()
+
+# 单个流结束的标记
+_STREAM_DONE = object()
+
+
+async def merge_async_streams(factories: List[Callable[[], AsyncIterator[Any]]], max_concurrency: int,
+                              queue_size: int = 256) -> AsyncGenerator[Any, None]:
+    """
+    以有限并发同时消费多个异步流，按到达顺序合并输出
+
+    同一个流内部的顺序保持不变，不同流的元素交错输出；
+    合并生成器被关闭或取消时，所有仍在运行的流都会被取消
+
+    Args:
+        factories: 无参函数列表，每个函数返回一个异步迭代器，仅在获得并发名额后调用
+        max_concurrency: 最大同时运行的流数量
+        queue_size: 合并队列长度，消费方变慢时对生产方形成背压
+
+    Returns:
+        异步生成器，依次产出各个流的元素
+    """
+    if not factories:
+        return
+
+    queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+    semaphore = asyncio.Semaphore(max(1, max_concurrency))
+
+    async def pump(factory: Callable[[], AsyncIterator[Any]]) -> None:
+        try:
+            async with semaphore:
+                stream = factory()
+                try:
+                    async for item in stream:
+                        await queue.put(item)
+                finally:
+                    # 及时关闭子流，使其内部持有的连接等资源立即释放
+                    if hasattr(stream, 'aclose'):
+                        await stream.aclose()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"合并流中的子流出错: {str(e)}")
+            logger.exception(e)
+
+        await queue.put(_STREAM_DONE)
+
+    tasks = [asyncio.ensure_future(pump(factory)) for factory in factories]
+    remaining = len(tasks)
+
+    try:
+        while remaining:
+            item = await queue.get()
+            if item is _STREAM_DONE:
+                remaining -= 1
+                continue
+            yield item
+    finally:
+        for task in tasks:
+            if not task.done():
+                task.cancel()
+        # 用wait而不是gather，外层被反复取消时不会再次打断子流的清理
+        await asyncio.wait(tasks)
+
+
+async def iter_ready_batches(stream: AsyncIterator[Any]) -> AsyncGenerator[List[Any], None]:
+    """
+    在后台持续消费异步流，每次产出自上一批以来已经到达的全部元素
+
+    消费方处理一批的同时新的元素继续到达：元素到达稀疏时逐个产出，第一个元素到达后立即可用；
+    到达密集时自动合并成较大的批次，便于向量化处理。生成器被关闭或取消时后台消费随之取消
+
+    Args:
+        stream: 源异步迭代器
+
+    Returns:
+        异步生成器，依次产出元素列表（不为空）
+    """
+    queue: asyncio.Queue = asyncio.Queue()
+    errors: List[Exception] = []
+
+    async def pump() -> None:
+        try:
+            async for item in stream:
+                queue.put_nowait(item)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            errors.append(e)
+        finally:
+            queue.put_nowait(_STREAM_DONE)
+
+    task = asyncio.ensure_future(pump())
+    try:
+        finished = False
+        while not finished:
+            batch = [await queue.get()]
+            while not queue.empty():
+                batch.append(queue.get_nowait())
+            if batch[-1] is _STREAM_DONE:
+                batch.pop()
+                finished = True
+            if batch:
+                yield batch
+
+        if errors:
+            raise errors[0]
+    finally:
+        if not task.done():
+            task.cancel()
+        await asyncio.wait((task,))
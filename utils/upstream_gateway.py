@@ -0,0 +1,617 @@
+import os
+import json
+import time
+import random
+import asyncio
+import threading
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait as wait_futures
+from typing import Any, Callable, Dict, Optional, Tuple
+from utils.logger import get_logger
+
+# 获取日志器
+logger = get_logger()
+
+# 上游数据源
+SOURCE_EM = 'em'      # 东方财富：A股历史与行情、港股行情、ETF/LOF行情、美股行情
+SOURCE_SINA = 'sina'  # 新浪：期货、ETF历史
+SOURCE_HK = 'hk'      # 港股历史
+SOURCE_US = 'us'      # 美股历史
+
+# 各数据源默认的 (每秒请求数, 突发容量)
+DEFAULT_LIMITS: Dict[str, Tuple[float, float]] = {
+    SOURCE_EM: (5.0, 10.0),
+    SOURCE_SINA: (3.0, 5.0),
+    SOURCE_HK: (2.0, 4.0),
+    SOURCE_US: (2.0, 4.0),
+}
+
+
+# 可重试的上游错误：网络错误（requests的异常均为OSError子类）、超时以及被限流时返回非JSON内容导致的解析错误
+RETRYABLE_ERRORS = (OSError, json.JSONDecodeError)
+
+# 计算对冲延迟所需的最少耗时样本数
+HEDGE_MIN_SAMPLES = 20
+
+
+def _percentile(values, q: float) -> float:
+    """计算分位数，无数据时为0"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class TokenBucket:
+    """
+    令牌桶限流（线程安全）
+    取令牌时先预占，令牌不足时按欠缺量计算需要等待的时间，等待在锁外进行，先到先得
+    """
+
+    def __init__(self, rate: float, burst: float):
+        """
+        Args:
+            rate: 每秒补充的令牌数
+            burst: 桶容量（允许的突发请求数）
+        """
+        self.rate = rate
+        self.burst = burst
+        self._tokens = burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> float:
+        """
+        取一个令牌，必要时阻塞等待
+
+        Returns:
+            等待的秒数
+        """
+        if self.rate <= 0:
+            return 0.0
+
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+
+class AdaptiveLimiter:
+    """
+    按AIMD调整的并发上限（加性增、乘性减）
+    上游调用成功且耗时正常时每轮（约limit次调用）上限加一；出错或耗时超过阈值时上限减半，
+    减半后在此之前发起的调用再失败不会重复减半。
+    获取和释放名额在事件循环中进行，调用结果可以在任意线程中反馈
+    """
+
+    def __init__(self, name: str, initial: float, min_limit: float, max_limit: float,
+                 slow_call_seconds: float, backoff: float = 0.5):
+        """
+        Args:
+            name: 名称（数据源），用于日志
+            initial: 初始并发上限
+            min_limit: 并发上限的下限
+            max_limit: 并发上限的上限
+            slow_call_seconds: 单次上游调用耗时超过该值视为上游过载，0表示不按耗时判断
+            backoff: 出错时上限乘以的系数
+        """
+        self.name = name
+        self.min_limit = max(1.0, min_limit)
+        self.max_limit = max(self.min_limit, max_limit)
+        self.limit = min(self.max_limit, max(self.min_limit, initial))
+        self.slow_call_seconds = slow_call_seconds
+        self.backoff = backoff
+        self.in_flight = 0
+        self.increases = 0
+        self.decreases = 0
+        self._last_decrease = 0.0
+        self._waiters: deque = deque()
+        self._lock = threading.Lock()
+
+    async def acquire(self) -> None:
+        """获取一个并发名额，超过上限时按先后顺序排队"""
+        with self._lock:
+            if not self._waiters and self.in_flight < int(self.limit):
+                self.in_flight += 1
+                return
+            waiter = asyncio.get_running_loop().create_future()
+            self._waiters.append(waiter)
+
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            with self._lock:
+                granted = waiter.done() and not waiter.cancelled()
+                if waiter in self._waiters:
+                    self._waiters.remove(waiter)
+            if granted:
+                # 名额已转交给本调用方，退还给下一个等待方
+                self.release()
+            raise
+
+    def release(self) -> None:
+        """释放一个并发名额，并按当前上限唤醒等待方"""
+        with self._lock:
+            self.in_flight -= 1
+            self._wake()
+
+    async def __aenter__(self) -> 'AdaptiveLimiter':
+        await self.acquire()
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        self.release()
+
+    def _wake(self) -> None:
+        """在锁内把空闲名额直接转交给排队的等待方"""
+        while self._waiters and self.in_flight < int(self.limit):
+            waiter = self._waiters.popleft()
+            if waiter.done():
+                continue
+            try:
+                waiter.get_loop().call_soon_threadsafe(self._grant, waiter)
+            except RuntimeError:
+                # 等待方所在的事件循环已关闭
+                continue
+            self.in_flight += 1
+
+    def _grant(self, waiter: asyncio.Future) -> None:
+        if waiter.done():
+            # 等待方已取消，名额交还
+            self.release()
+        else:
+            waiter.set_result(None)
+
+    def on_success(self, latency: float, started: float) -> None:
+        """
+        反馈一次成功的上游调用
+
+        Args:
+            latency: 调用耗时（秒，不含限流等待）
+            started: 调用开始的time.monotonic()
+        """
+        if self.slow_call_seconds > 0 and latency > self.slow_call_seconds:
+            self.on_failure(started)
+            return
+        with self._lock:
+            if self.limit < self.max_limit:
+                self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+                self.increases += 1
+            self._wake()
+
+    def on_failure(self, started: float) -> None:
+        """
+        反馈一次失败（出错或过慢）的上游调用
+
+        Args:
+            started: 调用开始的time.monotonic()
+        """
+        with self._lock:
+            if started < self._last_decrease or self.limit <= self.min_limit:
+                return
+            previous = self.limit
+            self.limit = max(self.min_limit, self.limit * self.backoff)
+            self.decreases += 1
+            self._last_decrease = time.monotonic()
+        logger.info(f"上游[{self.name}]调用失败或过慢，并发上限 {previous:.1f} -> {self.limit:.1f}")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'concurrency_limit': int(self.limit),
+                'concurrency_in_use': self.in_flight,
+                'concurrency_waiting': len(self._waiters),
+                'concurrency_increases': self.increases,
+                'concurrency_decreases': self.decreases
+            }
+
+
+class SourceStats:
+    """单个数据源的调用统计"""
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.waiting = 0
+        self.in_flight = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.recent_waits: deque = deque(maxlen=1000)
+        # 成功调用的耗时（不含限流等待），用于计算对冲延迟
+        self.recent_latencies: deque = deque(maxlen=1000)
+        self.timeouts = 0
+        self.retries = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+
+    def to_dict(self) -> Dict[str, Any]:
+        waits = list(self.recent_waits)
+        latencies = list(self.recent_latencies)
+        return {
+            'calls': self.calls,
+            'errors': self.errors,
+            'waiting': self.waiting,
+            'in_flight': self.in_flight,
+            'avg_wait_seconds': self.total_wait / self.calls if self.calls else 0.0,
+            'p95_wait_seconds': _percentile(waits, 0.95),
+            'max_wait_seconds': self.max_wait,
+            'p95_latency_seconds': _percentile(latencies, 0.95),
+            'p99_latency_seconds': _percentile(latencies, 0.99),
+            'timeouts': self.timeouts,
+            'retries': self.retries,
+            'hedges': self.hedges,
+            'hedge_wins': self.hedge_wins
+        }
+
+
+class UpstreamGateway:
+    """
+    上游数据网关
+    所有akshare调用都在网关专用的有界线程池中执行，不占用默认线程池；
+    每次上游请求按数据源经过令牌桶限流，多个用户的并发批量请求共享同一个限额，避免触发上游封禁；
+    批量请求的并发数由各数据源的自适应并发上限控制，上游健康时逐步放开，出错或变慢时迅速收紧
+    """
+
+    def __init__(self, max_workers: Optional[int] = None, limits: Optional[Dict[str, Tuple[float, float]]] = None):
+        """
+        初始化上游数据网关
+
+        Args:
+            max_workers: 线程池大小，默认为环境变量UPSTREAM_MAX_WORKERS（默认16）
+            limits: 数据源 -> (每秒请求数, 突发容量)，默认读取环境变量UPSTREAM_RATE_<数据源>和UPSTREAM_BURST_<数据源>，
+                    每秒请求数为0表示不限流
+        """
+        if max_workers is None:
+            max_workers = int(os.getenv('UPSTREAM_MAX_WORKERS', 16))
+        if limits is None:
+            limits = self._limits_from_env()
+
+        self.max_workers = max_workers
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='upstream')
+        self._buckets = {source: TokenBucket(rate, burst) for source, (rate, burst) in limits.items()}
+        self._source_stats = {source: SourceStats() for source in limits}
+
+        # 各数据源批量请求的自适应并发上限
+        self._concurrency = (
+            float(os.getenv('UPSTREAM_CONCURRENCY_INITIAL', 5)),
+            float(os.getenv('UPSTREAM_CONCURRENCY_MIN', 1)),
+            float(os.getenv('UPSTREAM_CONCURRENCY_MAX') or max_workers),
+            float(os.getenv('UPSTREAM_SLOW_CALL_SECONDS', 10))
+        )
+        self._limiters = {source: AdaptiveLimiter(source, *self._concurrency) for source in limits}
+
+        # fetch的单次调用超时、重试和对冲配置
+        self.call_timeout = float(os.getenv('UPSTREAM_CALL_TIMEOUT', 20))
+        self.max_retries = int(os.getenv('UPSTREAM_MAX_RETRIES', 2))
+        self.retry_base_delay = float(os.getenv('UPSTREAM_RETRY_BASE_SECONDS', 0.5))
+        self.retry_max_delay = float(os.getenv('UPSTREAM_RETRY_MAX_SECONDS', 5))
+        self.hedge_enabled = os.getenv('UPSTREAM_HEDGE_ENABLED', 'false').lower() == 'true'
+        self.hedge_min_delay = float(os.getenv('UPSTREAM_HEDGE_MIN_DELAY_SECONDS', 0.2))
+        # 单次调用在独立线程中执行，超时后调用方不再等待；akshare请求无法中断，超时的调用在该线程池中自然结束。
+        # 被放弃的调用最多占用max_abandoned个线程，其余线程保证够每个网关线程同时发出首个请求和对冲请求
+        self.max_abandoned = int(os.getenv('UPSTREAM_MAX_ABANDONED_CALLS') or max_workers)
+        self.abandoned = 0
+        self._attempt_executor = ThreadPoolExecutor(max_workers=max_workers * 2 + self.max_abandoned,
+                                                    thread_name_prefix='upstream-attempt')
+        self._lock = threading.Lock()
+
+        # 线程池排队统计
+        self.queued = 0
+        self.running = 0
+        self.submitted = 0
+        self.cancelled = 0
+        self.total_queue_wait = 0.0
+        self.max_queue_wait = 0.0
+        self._recent_queue_waits: deque = deque(maxlen=1000)
+
+        logger.debug(f"初始化UpstreamGateway: 线程数={max_workers}, 限流={limits}")
+
+    @staticmethod
+    def _limits_from_env() -> Dict[str, Tuple[float, float]]:
+        """从环境变量读取各数据源的限流配置"""
+        limits = {}
+        for source, (rate, burst) in DEFAULT_LIMITS.items():
+            limits[source] = (
+                float(os.getenv(f'UPSTREAM_RATE_{source.upper()}', rate)),
+                float(os.getenv(f'UPSTREAM_BURST_{source.upper()}', burst))
+            )
+        return limits
+
+    async def run(self, func: Callable[..., Any], *args: Any) -> Any:
+        """
+        在网关线程池中执行同步函数（函数内的上游请求应通过call限流）
+
+        Args:
+            func: 同步函数
+            *args: 函数参数
+
+        Returns:
+            函数的返回值
+        """
+        submitted_at = time.monotonic()
+        with self._lock:
+            self.queued += 1
+            self.submitted += 1
+
+        def task():
+            queue_wait = time.monotonic() - submitted_at
+            with self._lock:
+                self.queued -= 1
+                self.running += 1
+                self.total_queue_wait += queue_wait
+                self.max_queue_wait = max(self.max_queue_wait, queue_wait)
+                self._recent_queue_waits.append(queue_wait)
+            try:
+                return func(*args)
+            finally:
+                with self._lock:
+                    self.running -= 1
+
+        future = self._executor.submit(task)
+        try:
+            return await asyncio.wrap_future(future)
+        except asyncio.CancelledError:
+            # 调用方已取消时，尚未开始的任务不再执行
+            if future.cancel():
+                with self._lock:
+                    self.queued -= 1
+                    self.cancelled += 1
+            raise
+
+    def call(self, source: str, func: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        """
+        经过数据源限流后发起一次上游请求（在网关线程中同步调用）
+
+        Args:
+            source: 数据源，如SOURCE_EM
+            func: akshare函数
+            *args, **kwargs: 函数参数
+
+        Returns:
+            函数的返回值
+        """
+        return self._call(source, func, args, kwargs)
+
+    def _call(self, source: str, func: Callable[..., Any], args: tuple, kwargs: Dict[str, Any],
+              on_start: Optional[Callable[[float], None]] = None) -> Any:
+        """call的实现，on_start在限流等待结束、真正发起请求时以开始时间调用"""
+        stats = self._source_stats.setdefault(source, SourceStats())
+        bucket = self._buckets.get(source)
+        limiter = self.limiter(source)
+
+        with self._lock:
+            stats.waiting += 1
+        wait = bucket.acquire() if bucket is not None else 0.0
+        with self._lock:
+            stats.waiting -= 1
+            stats.in_flight += 1
+            stats.calls += 1
+            stats.total_wait += wait
+            stats.max_wait = max(stats.max_wait, wait)
+            stats.recent_waits.append(wait)
+
+        if wait > 1:
+            logger.debug(f"上游[{source}]限流等待 {wait:.2f}秒: {getattr(func, '__name__', func)}")
+
+        started = time.monotonic()
+        if on_start is not None:
+            on_start(started)
+        try:
+            result = func(*args, **kwargs)
+        except Exception:
+            with self._lock:
+                stats.errors += 1
+            limiter.on_failure(started)
+            raise
+        finally:
+            with self._lock:
+                stats.in_flight -= 1
+        latency = time.monotonic() - started
+        with self._lock:
+            stats.recent_latencies.append(latency)
+        limiter.on_success(latency, started)
+        return result
+
+    def fetch(self, source: str, func: Callable[..., Any], *args: Any,
+              alternate: Optional[Tuple[str, Callable[[], Any]]] = None, **kwargs: Any) -> Any:
+        """
+        带单次调用超时、抖动指数退避重试和对冲请求的上游请求（在网关线程中同步调用）
+
+        每次尝试都经过call的限流和统计。单次尝试超过UPSTREAM_CALL_TIMEOUT秒未返回视为超时，不再等待；
+        网络错误和超时按 [0, min(上限, 基数×2^n)) 的随机间隔重试，出现其他错误（如代码不存在）立即抛出。
+        启用对冲时，尝试在该数据源近期p95耗时内未返回则再发一次请求（有备用数据源时发往备用数据源），
+        取先成功的结果；有备用数据源时，重试也在主、备数据源之间交替
+
+        Args:
+            source: 数据源，如SOURCE_EM
+            func: akshare函数
+            *args, **kwargs: 函数参数
+            alternate: 备用的 (数据源, 无参函数)，返回值须与func相同结构
+
+        Returns:
+            函数的返回值
+        """
+        primary = (source, lambda: func(*args, **kwargs))
+        if self.call_timeout <= 0 and self.max_retries <= 0 and not self.hedge_enabled:
+            return self.call(*primary)
+
+        error: Optional[BaseException] = None
+        for attempt in range(self.max_retries + 1):
+            if attempt > 0:
+                delay = random.uniform(0, min(self.retry_max_delay, self.retry_base_delay * 2 ** (attempt - 1)))
+                with self._lock:
+                    self._source_stats.setdefault(source, SourceStats()).retries += 1
+                logger.debug(f"上游[{source}]第{attempt}次重试，{delay:.2f}秒后发起: {str(error)}")
+                time.sleep(delay)
+
+            # 有备用数据源时重试在主、备之间交替，对冲请求发往另一个
+            first, second = (alternate, primary) if alternate and attempt % 2 == 1 else (primary, alternate or primary)
+            try:
+                return self._attempt(first, second)
+            except RETRYABLE_ERRORS as e:
+                error = e
+            except Exception as e:
+                # 备用数据源的任何错误都不代表主数据源不可用，继续重试主数据源
+                if first is not alternate:
+                    raise
+                logger.warning(f"上游备用数据源[{alternate[0]}]调用失败: {str(e)}")
+                error = e
+        raise error
+
+    def _attempt(self, first: Tuple[str, Callable[[], Any]], hedge: Tuple[str, Callable[[], Any]]) -> Any:
+        """
+        执行一次带超时的尝试，必要时发出对冲请求
+
+        Args:
+            first: 首个请求的 (数据源, 无参函数)
+            hedge: 对冲请求的 (数据源, 无参函数)
+
+        Returns:
+            先成功返回的结果
+        """
+        stats = self._source_stats.setdefault(first[0], SourceStats())
+        with self._lock:
+            if self.abandoned >= self.max_abandoned:
+                # 已有过多超时仍未结束的调用，上游很可能整体卡住，不再占用新线程
+                raise TimeoutError(f"已放弃的上游调用过多({self.abandoned})，暂不发起新请求")
+            latencies = list(stats.recent_latencies) if self.hedge_enabled else []
+        hedge_delay = None
+        if len(latencies) >= HEDGE_MIN_SAMPLES:
+            hedge_delay = max(self.hedge_min_delay, _percentile(latencies, 0.95))
+
+        # 请求 -> 真正发起的时间（限流等待和线程池排队不计入超时和对冲延迟）
+        started_at: Dict[Future, Dict[str, float]] = {}
+
+        def submit(target: Tuple[str, Callable[[], Any]]) -> Future:
+            box: Dict[str, float] = {}
+            future = self._attempt_executor.submit(self._call, target[0], target[1], (), {},
+                                                   lambda t: box.setdefault('started', t))
+            started_at[future] = box
+            return future
+
+        original = submit(first)
+        pending = {original}
+        error: Optional[BaseException] = None
+        while pending:
+            now = time.monotonic()
+            expired = {future for future in pending if self._deadline(started_at[future]) <= now}
+            if expired:
+                self._abandon(expired, first[0], stats, started_at)
+                pending -= expired
+                error = TimeoutError(f"上游[{first[0]}]请求超过{self.call_timeout:g}秒未返回")
+                if not pending:
+                    break
+
+            hedge_at = None
+            if hedge_delay is not None and 'started' in started_at[original]:
+                hedge_at = started_at[original]['started'] + hedge_delay
+                if hedge_at <= now and pending:
+                    hedge_delay = None
+                    with self._lock:
+                        stats.hedges += 1
+                    logger.debug(f"上游[{first[0]}]请求超过p95耗时未返回，向[{hedge[0]}]发出对冲请求")
+                    pending.add(submit(hedge))
+                    continue
+
+            # 尚未发起的请求（限流等待中）开始时间未知，短间隔轮询
+            wake_at = min([self._deadline(started_at[future]) for future in pending]
+                          + ([hedge_at] if hedge_at is not None and hedge_delay is not None else []))
+            if any('started' not in started_at[future] for future in pending):
+                wake_at = min(wake_at, now + 0.05)
+            done, pending = wait_futures(pending, timeout=None if wake_at == float('inf') else max(0.0, wake_at - now),
+                                         return_when=FIRST_COMPLETED)
+            for future in done:
+                try:
+                    result = future.result()
+                except Exception as e:
+                    error = e
+                    continue
+                for other in pending:
+                    other.cancel()
+                if future is not original:
+                    with self._lock:
+                        stats.hedge_wins += 1
+                return result
+        raise error
+
+    def _deadline(self, box: Dict[str, float]) -> float:
+        """请求的超时时刻，尚未发起或不限制超时时为无穷大"""
+        if self.call_timeout <= 0 or 'started' not in box:
+            return float('inf')
+        return box['started'] + self.call_timeout
+
+    def _abandon(self, futures, source: str, stats: SourceStats, started_at: Dict[Future, Dict[str, float]]) -> None:
+        """放弃超时的请求：不再等待（无法中断，在线程中自然结束），按过载反馈给并发上限"""
+        def finished(_future: Future) -> None:
+            with self._lock:
+                self.abandoned -= 1
+
+        for future in futures:
+            with self._lock:
+                stats.timeouts += 1
+                self.abandoned += 1
+            future.add_done_callback(finished)
+            self.limiter(source).on_failure(started_at[future]['started'])
+
+    def limiter(self, source: str) -> AdaptiveLimiter:
+        """
+        获取数据源的自适应并发上限，批量请求时每个代码占用一个名额
+
+        Args:
+            source: 数据源，如SOURCE_EM
+
+        Returns:
+            该数据源的AdaptiveLimiter，由call中的上游调用结果反馈调整
+        """
+        limiter = self._limiters.get(source)
+        if limiter is None:
+            with self._lock:
+                limiter = self._limiters.setdefault(source, AdaptiveLimiter(source, *self._concurrency))
+        return limiter
+
+    def stats(self) -> Dict[str, Any]:
+        """获取网关统计信息：线程池排队深度、排队等待时间以及各数据源的限流等待时间"""
+        with self._lock:
+            queue_waits = list(self._recent_queue_waits)
+            started = self.submitted - self.queued - self.cancelled
+            return {
+                'max_workers': self.max_workers,
+                'queue_depth': self.queued,
+                'running': self.running,
+                'submitted': self.submitted,
+                'cancelled': self.cancelled,
+                'avg_queue_wait_seconds': self.total_queue_wait / started if started else 0.0,
+                'p95_queue_wait_seconds': _percentile(queue_waits, 0.95),
+                'max_queue_wait_seconds': self.max_queue_wait,
+                'sources': {
+                    source: {**stats.to_dict(), **(self._limiters[source].stats() if source in self._limiters else {})}
+                    for source, stats in self._source_stats.items()
+                }
+            }
+
+    def shutdown(self) -> None:
+        """关闭线程池，不等待进行中的上游请求"""
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        self._attempt_executor.shutdown(wait=False, cancel_futures=True)
+
+
+# 进程级单例
+_upstream_gateway: Optional[UpstreamGateway] = None
+_upstream_gateway_guard = threading.Lock()
+
+
+def get_upstream_gateway() -> UpstreamGateway:
+    """获取进程级上游数据网关"""
+    global _upstream_gateway
+
+    if _upstream_gateway is None:
+        with _upstream_gateway_guard:
+            if _upstream_gateway is None:
+                _upstream_gateway = UpstreamGateway()
+    return _upstream_gateway
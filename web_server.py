@@ -12,10 +12,23 @@ import os
 import httpx
 from utils.logger import get_logger
 from utils.api_utils import APIUtils
+from utils.http_client import get_http_client_pool
+from services.post_close_scheduler import get_post_close_scheduler
+from utils.compute_pool import get_compute_pool
+from utils.upstream_gateway import get_upstream_gateway
+from services.data_source import get_data_source
+from services.indicator_cache import get_indicator_cache
+from services.incremental_indicator import get_incremental_indicator_engine
+from services.llm_result_cache import get_llm_result_cache
+from services.snapshot_cache import get_snapshot_cache_stats
+from utils.metrics import get_metrics, instrument_stream
+from utils.disconnect import cancel_on_disconnect
+from contextlib import asynccontextmanager
 from dotenv import load_dotenv
 import uvicorn
 import json
 import secrets
+import ipaddress
 from datetime import datetime, timedelta
 from jose import JWTError, jwt
 
@@ -35,11 +48,62 @@ print(LOGIN_PASSWORD)
 # 是否需要登录
 REQUIRE_LOGIN = bool(LOGIN_PASSWORD.strip())
 
+# /metrics 接口的访问令牌，为空时只允许本机访问
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
+
+
+def _is_loopback(host: Optional[str]) -> bool:
+    """判断客户端地址是否为本机回环地址"""
+    try:
+        return host is not None and ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+
+def _register_metric_collectors():
+    """把各共享组件的统计信息注册到指标导出中"""
+    metrics = get_metrics()
+    metrics.register_collector('upstream', lambda: get_upstream_gateway().stats())
+    metrics.register_collector('upstream_source', lambda: get_upstream_gateway().stats()['sources'], label='source')
+    metrics.register_collector('compute_pool', lambda: get_compute_pool().stats())
+    metrics.register_collector('indicator_cache', lambda: get_indicator_cache().stats())
+    metrics.register_collector('snapshot_cache', get_snapshot_cache_stats, label='name')
+    metrics.register_collector('data_source', lambda: get_data_source().stats())
+
+    def incremental_stats():
+        engine = get_incremental_indicator_engine()
+        return engine.stats() if engine is not None else {}
+
+    def llm_cache_stats():
+        cache = get_llm_result_cache()
+        return cache.stats() if cache is not None else {}
+
+    metrics.register_collector('incremental_indicator', incremental_stats)
+    metrics.register_collector('llm_cache', llm_cache_stats)
+
+
+_register_metric_collectors()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """应用生命周期：启动收盘后评分调度器，关闭时停止调度器、释放共享的HTTP连接并关闭计算进程池和上游网关线程池"""
+    scheduler = get_post_close_scheduler()
+    if scheduler is not None:
+        scheduler.start()
+    yield
+    if scheduler is not None:
+        await scheduler.stop()
+    await get_http_client_pool().aclose()
+    get_compute_pool().shutdown()
+    get_upstream_gateway().shutdown()
+
 
 app = FastAPI(
     title="Stock Scanner API",
     description="异步股票和期货分析API",
-    version="1.1.0"
+    version="1.1.0",
+    lifespan=lifespan
 )
 
 # 添加CORS中间件
@@ -63,6 +127,14 @@ class AnalyzeRequest(BaseModel):
     api_key: Optional[str] = None
     api_model: Optional[str] = None
     api_timeout: Optional[str] = None
+    # 批量分析时是否在流末尾输出汇总排名消息
+    scan_summary: bool = False
+
+class ScanMarketRequest(BaseModel):
+    market_type: str = "A"
+    top_k: int = 20
+    min_score: int = 0
+    chunk_size: Optional[int] = None
 
 class TestAPIRequest(BaseModel):
     api_url: str
@@ -173,7 +245,7 @@ async def get_config():
 
 # AI分析股票
 @app.post("/api/analyze")
-async def analyze(request: AnalyzeRequest, username: str = Depends(verify_token)):
+async def analyze(request: AnalyzeRequest, http_request: Request, username: str = Depends(verify_token)):
     try:
         logger.info("开始处理分析请求")
         stock_codes = request.stock_codes
@@ -243,7 +315,8 @@ async def analyze(request: AnalyzeRequest, username: str = Depends(verify_token)
                     [code.strip() for code in stock_codes], 
                     min_score=0, 
                     market_type=market_type,
-                    stream=True
+                    stream=True,
+                    summary=request.scan_summary
                 ):
                     chunk_count += 1
                     yield chunk + '\n'
@@ -251,7 +324,7 @@ async def analyze(request: AnalyzeRequest, username: str = Depends(verify_token)
                 logger.info(f"批量流式分析完成，共发送 {chunk_count} 个块")
         
         logger.info("成功创建流式响应生成器")
-        return StreamingResponse(generate_stream(), media_type='application/json')
+        return StreamingResponse(instrument_stream(cancel_on_disconnect(http_request, generate_stream(), 'analyze'), 'analyze', market_type), media_type='application/json')
             
     except Exception as e:
         error_msg = f"分析时出错: {str(e)}"
@@ -259,6 +332,26 @@ async def analyze(request: AnalyzeRequest, username: str = Depends(verify_token)
         logger.exception(e)
         raise HTTPException(status_code=500, detail=error_msg)
 
+# 全市场扫描
+@app.post("/api/scan_market")
+async def scan_market(request: ScanMarketRequest, http_request: Request, username: str = Depends(verify_token)):
+    market_type = request.market_type
+    if market_type not in ('A', 'ETF', 'LOF'):
+        raise HTTPException(status_code=400, detail=f"不支持全市场扫描的市场类型: {market_type}")
+    
+    # 限制结果数量和分块大小，避免单次请求占用过多内存
+    top_k = max(1, min(request.top_k, 200))
+    chunk_size = max(10, min(request.chunk_size, 500)) if request.chunk_size else None
+    
+    logger.info(f"开始全市场扫描请求: market_type={market_type}, top_k={top_k}, min_score={request.min_score}")
+    analyzer = StockAnalyzerService()
+    
+    async def generate_stream():
+        async for chunk in analyzer.scan_market(market_type, top_k=top_k, min_score=request.min_score, chunk_size=chunk_size):
+            yield chunk + '\n'
+    
+    return StreamingResponse(instrument_stream(cancel_on_disconnect(http_request, generate_stream(), 'scan_market'), 'scan_market', market_type), media_type='application/json')
+
 # 搜索美股代码
 @app.get("/api/search_us_stocks")
 async def search_us_stocks(keyword: str = "", username: str = Depends(verify_token)):
@@ -345,21 +438,22 @@ async def test_api_connection(request: TestAPIRequest, username: str = Depends(v
         logger.debug(f"完整API测试URL: {test_url}")
         
         # 使用异步HTTP客户端发送测试请求
-        async with httpx.AsyncClient(timeout=float(api_timeout)) as client:
-            response = await client.post(
-                test_url,
-                headers={
-                    "Authorization": f"Bearer {api_key}",
-                    "Content-Type": "application/json"
-                },
-                json={
-                    "model": api_model or "",
-                    "messages": [
-                        {"role": "user", "content": "Hello, this is a test message. Please respond with 'API connection successful'."}
-                    ],
-                    "max_tokens": 20
-                }
-            )
+        client = get_http_client_pool().get_client(test_url)
+        response = await client.post(
+            test_url,
+            headers={
+                "Authorization": f"Bearer {api_key}",
+                "Content-Type": "application/json"
+            },
+            json={
+                "model": api_model or "",
+                "messages": [
+                    {"role": "user", "content": "Hello, this is a test message. Please respond with 'API connection successful'."}
+                ],
+                "max_tokens": 20
+            },
+            timeout=float(api_timeout)
+        )
         
         # 检查响应
         if response.status_code == 200:
@@ -388,6 +482,25 @@ async def test_api_connection(request: TestAPIRequest, username: str = Depends(v
             content={"success": False, "message": f"API 测试连接时出错: {str(e)}"}
         )
 
+# 上游数据网关统计：线程池排队深度、排队等待时间和各数据源的限流等待时间
+@app.get("/api/upstream_stats")
+async def upstream_stats(username: str = Depends(verify_token)):
+    stats = get_upstream_gateway().stats()
+    stats['data_source'] = get_data_source().stats()
+    return stats
+
+# Prometheus指标：各阶段耗时直方图、进行中的任务数以及缓存、线程池、进程池的统计
+@app.get("/metrics")
+async def metrics(request: Request):
+    if METRICS_TOKEN:
+        authorization = request.headers.get("Authorization", "")
+        if not secrets.compare_digest(authorization, f"Bearer {METRICS_TOKEN}"):
+            raise HTTPException(status_code=401, detail="无效的指标访问令牌")
+    elif not _is_loopback(request.client.host if request.client else None):
+        # 未配置令牌时指标（含上游、缓存等内部状态）不对外暴露
+        raise HTTPException(status_code=403, detail="未配置METRICS_TOKEN时只允许本机访问指标接口")
+    return Response(get_metrics().render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
 # 检查是否需要登录
 @app.get("/api/need_login")
 async def need_login():